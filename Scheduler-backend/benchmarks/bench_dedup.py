@@ -0,0 +1,78 @@
+"""
+Benchmark for MinHash/LSH flashcard deduplication on synthetic cards.
+
+Builds decks of random question/answer cards where a share of the cards is
+repeated with small edits (the repeated slides and boilerplate of lecture
+PDFs), then times ``dedupe_flashcards`` and reports how many cards it drops.
+For decks up to ``--exact-limit`` cards it also compares against an exact
+all-pairs Jaccard pass, reporting its time and the cards both approaches drop.
+
+Usage (from Scheduler-backend):
+    python benchmarks/bench_dedup.py --cards 1000 10000 50000 --duplicate-rate 0.3
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from card_dedup import card_text, dedupe_flashcards, shingles
+
+
+def synthetic_deck(rng, cards, duplicate_rate, vocabulary=5000):
+    words = [f"term{i}" for i in range(vocabulary)]
+    deck = []
+    while len(deck) < cards:
+        if deck and rng.random() < duplicate_rate:
+            # Near-duplicate of an earlier card: one word of the answer edited
+            card = rng.choice(deck)
+            answer = card['answer'].split()
+            answer[rng.randrange(len(answer))] = rng.choice(words)
+            deck.append({'question': card['question'], 'answer': ' '.join(answer)})
+        else:
+            deck.append({'question': ' '.join(rng.choices(words, k=rng.randint(6, 14))) + '?',
+                         'answer': ' '.join(rng.choices(words, k=rng.randint(10, 40))) + '.'})
+    return deck
+
+
+def exact_dedupe(cards, threshold):
+    # Every card against every kept card, on the exact Jaccard similarity
+    kept = []
+    for card in cards:
+        current = shingles(card_text(card))
+        if all(len(current & other) < threshold * len(current | other) for other in kept):
+            kept.append(current)
+    return len(cards) - len(kept)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cards', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--duplicate-rate', type=float, default=0.3)
+    parser.add_argument('--threshold', type=float, default=0.8)
+    parser.add_argument('--exact-limit', type=int, default=5000,
+                        help='Largest deck also deduplicated with the exact all-pairs pass')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"{'cards':>7} {'lsh ms':>9} {'cards/sec':>10} {'dropped':>8} {'exact ms':>9} {'exact dropped':>14}")
+    for cards in args.cards:
+        deck = synthetic_deck(rng, cards, args.duplicate_rate)
+        start = time.perf_counter()
+        _, dropped = dedupe_flashcards(deck, threshold=args.threshold)
+        seconds = time.perf_counter() - start
+
+        exact_ms, exact_dropped = '-', '-'
+        if cards <= args.exact_limit:
+            start = time.perf_counter()
+            exact_dropped = exact_dedupe(deck, args.threshold)
+            exact_ms = f"{(time.perf_counter() - start) * 1000:.0f}"
+        print(f"{cards:>7} {seconds * 1000:>9.0f} {cards / seconds:>10.0f} {dropped:>8} {exact_ms:>9} {exact_dropped:>14}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""
+Overhead benchmark for the request instrumentation.
+
+Serves --requests requests through a Flask test client to an endpoint that
+runs --queries small SQL SELECTs against a temporary SQLite database, and
+reports requests per second and the time added per request:
+
+  plain       no instrumentation
+  metrics     instrumentation.Instrumentation: latency histograms and
+              per-request SQL counts through SQLAlchemy engine events
+  profiler    the same with PROFILE_SLOW_REQUESTS on (every request is
+              sampled; the threshold is high enough that nothing is written)
+
+Each configuration runs --repeat times, each in a fresh interpreter since
+the SQL event listeners stay on for every engine in a process once added,
+and the median is reported. The time to render /metrics afterwards is
+reported too.
+
+Usage (from Scheduler-backend):
+    python benchmarks/bench_instrumentation.py --requests 5000 --queries 5 --repeat 3
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+CONFIGS = ('plain', 'metrics', 'profiler')
+
+
+def make_app(url, queries, config, profile_dir):
+    from flask import Flask, jsonify
+    from sqlalchemy import select
+
+    from database import db, User
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = url
+    db.init_app(app)
+
+    @app.route('/users/<int:user_id>')
+    def user(user_id):
+        names = [db.session.scalar(select(User.name).where(User.id == user_id)) for _ in range(queries)]
+        return jsonify({'name': names[0]})
+
+    if config != 'plain':
+        from instrumentation import Instrumentation
+
+        app.config['PROFILE_SLOW_REQUESTS'] = config == 'profiler'
+        app.config['PROFILE_THRESHOLD_MS'] = 60000
+        app.config['PROFILE_DIR'] = profile_dir
+        Instrumentation(app)
+
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(id=1, name='bench', email='bench@example.com', password='x'))
+        db.session.commit()
+    return app
+
+
+def run_config(config, requests, queries):
+    with tempfile.TemporaryDirectory() as tmp:
+        # The /metrics collectors read the extraction cache; keep it out of the real one
+        os.environ['EXTRACTION_CACHE_DIR'] = os.path.join(tmp, 'cache')
+        app = make_app(f"sqlite:///{os.path.join(tmp, 'bench.db')}", queries, config, os.path.join(tmp, 'profiles'))
+        client = app.test_client()
+        for _ in range(200):
+            client.get('/users/1')
+        started = time.perf_counter()
+        for _ in range(requests):
+            client.get('/users/1')
+        result = {'us_per_request': (time.perf_counter() - started) / requests * 1e6}
+        if config != 'plain':
+            started = time.perf_counter()
+            result['metrics_bytes'] = len(client.get('/metrics').data)
+            result['metrics_ms'] = (time.perf_counter() - started) * 1000
+    return result
+
+
+def measure(config, requests, queries, repeat):
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.check_output(
+            [sys.executable, os.path.abspath(__file__), '--config', config,
+             '--requests', str(requests), '--queries', str(queries)],
+            cwd=BACKEND_DIR
+        )
+        runs.append(json.loads(output.decode().strip().splitlines()[-1]))
+    return {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--queries', type=int, default=5, help='SQL statements per request')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--config', choices=CONFIGS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.config:
+        # One measurement in this interpreter, run by measure()
+        print(json.dumps(run_config(args.config, args.requests, args.queries)))
+        return
+
+    print(f"{args.requests} requests, {args.queries} queries each, median of {args.repeat}")
+    print(f"{'config':<10} {'req/s':>8} {'us/request':>11} {'overhead us':>12} {'/metrics ms':>12}")
+    baseline = None
+    for config in CONFIGS:
+        result = measure(config, args.requests, args.queries, args.repeat)
+        per_request = result['us_per_request']
+        baseline = per_request if baseline is None else baseline
+        render = f"{result['metrics_ms']:>12.1f}" if 'metrics_ms' in result else f"{'-':>12}"
+        print(f"{config:<10} {1e6 / per_request:>8.0f} {per_request:>11.1f} {per_request - baseline:>12.1f} {render}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Benchmark for the page-parallel PDF text extraction engine.
+
+Runs ``iter_page_text`` over a PDF once per worker count, each in a fresh
+subprocess so peak RSS is measured independently, and reports pages/sec and
+peak RSS (parent + worker processes).
+
+Usage (from Scheduler-backend):
+    python benchmarks/bench_pdf_extraction.py lecture.pdf --workers 1 2 4 8
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def run_once(file_path, workers):
+    from pdf_extraction import iter_page_text
+
+    start = time.perf_counter()
+    pages = 0
+    for _ in iter_page_text(file_path, workers=workers):
+        pages += 1
+    elapsed = time.perf_counter() - start
+
+    # ru_maxrss is in KiB on Linux
+    self_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return {
+        'workers': workers,
+        'pages': pages,
+        'seconds': elapsed,
+        'pages_per_sec': pages / elapsed if elapsed else 0.0,
+        'peak_rss_mb': self_rss / 1024,
+        'peak_worker_rss_mb': children_rss / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('pdf', help='Path to the PDF to extract')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, os.cpu_count() or 1])
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_once(args.pdf, args.workers[0])))
+        return
+
+    print(f"{'workers':>8} {'pages':>7} {'seconds':>9} {'pages/sec':>10} {'peak RSS MB':>12} {'worker RSS MB':>14}")
+    for workers in sorted(set(args.workers)):
+        output = subprocess.check_output(
+            [sys.executable, os.path.abspath(__file__), args.pdf, '--workers', str(workers), '--child']
+        )
+        row = json.loads(output)
+        print(f"{row['workers']:>8} {row['pages']:>7} {row['seconds']:>9.2f} {row['pages_per_sec']:>10.1f} "
+              f"{row['peak_rss_mb']:>12.1f} {row['peak_worker_rss_mb']:>14.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""
+Accuracy vs latency of the exported ONNX runtimes against the fp32 PyTorch model.
+
+Generates flashcards for a fixed set of contexts with the fp32 model and with
+every given export (see t5_qa_trainer/export.py), then prints, per runtime:
+batch-1 latency, batched throughput, graph size, and how closely the outputs
+match the fp32 model (exact matches, token F1 and parseable question/answer
+pairs).
+
+Usage (from Scheduler-backend):
+    python t5_qa_trainer/export.py --model-dir T5_QA/model --tokenizer-dir T5_QA/tokenizer --output-dir T5_QA/onnx
+    python t5_qa_trainer/export.py --model-dir T5_QA/model --tokenizer-dir T5_QA/tokenizer \\
+        --output-dir T5_QA/onnx-fp32 --no-quantize
+    python benchmarks/bench_quantized_inference.py --onnx T5_QA/onnx-fp32 T5_QA/onnx
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from collections import Counter
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.join(BACKEND_DIR, 't5_qa_trainer'))
+
+import torch
+from transformers import T5Tokenizer
+
+from bench_t5_batching import SAMPLE_CONTEXTS
+from export import ONNX_FILES, load_trained_model
+from inference_server import parse_flashcard
+from onnx_generator import OnnxSeq2SeqGenerator
+
+
+def generate(model, tokenizer, contexts, max_length):
+    tensor_type = getattr(model, 'tensor_type', 'pt')
+    inputs = tokenizer(contexts, return_tensors=tensor_type, padding=True, truncation=True, max_length=512)
+    with torch.inference_mode():
+        outputs = model.generate(**inputs, max_length=max_length)
+    return tokenizer.batch_decode(outputs, skip_special_tokens=False)
+
+
+def token_f1(prediction, reference):
+    prediction, reference = prediction.split(), reference.split()
+    common = sum((Counter(prediction) & Counter(reference)).values())
+    if not prediction or not reference or not common:
+        return float(prediction == reference)
+    precision, recall = common / len(prediction), common / len(reference)
+    return 2 * precision * recall / (precision + recall)
+
+
+def measure(model, tokenizer, contexts, max_length, repeats):
+    # Warm up so one-off allocations and graph optimizations aren't timed
+    generate(model, tokenizer, contexts[:1], max_length)
+
+    latencies = []
+    outputs = []
+    for _ in range(repeats):
+        outputs = []
+        for context in contexts:
+            start = time.perf_counter()
+            outputs.extend(generate(model, tokenizer, [context], max_length))
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        generate(model, tokenizer, contexts, max_length)
+    batched = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'outputs': outputs,
+        'p50_ms': statistics.median(latencies) * 1000,
+        'p95_ms': latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))] * 1000,
+        'batched_per_sec': repeats * len(contexts) / batched,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', default=os.path.join(BACKEND_DIR, 'T5_QA', 'model'),
+                        help='fp32 reference (save_pretrained or save_custom_model directory)')
+    parser.add_argument('--tokenizer', default=os.path.join(BACKEND_DIR, 'T5_QA', 'tokenizer'))
+    parser.add_argument('--onnx', nargs='+', default=[os.path.join(BACKEND_DIR, 'T5_QA', 'onnx')],
+                        help='Export directories to compare')
+    parser.add_argument('--contexts', default=None, help='Text file with one context per line')
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--max-length', type=int, default=128)
+    parser.add_argument('--threads', type=int, default=None, help='torch and ONNX Runtime intra-op threads')
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    contexts = SAMPLE_CONTEXTS
+    if args.contexts:
+        with open(args.contexts) as f:
+            contexts = [line.strip() for line in f if line.strip()]
+
+    tokenizer = T5Tokenizer.from_pretrained(args.tokenizer)
+    runtimes = [('torch-fp32', load_trained_model(args.model), None)]
+    for path in args.onnx:
+        generator = OnnxSeq2SeqGenerator(path, num_threads=args.threads)
+        kind = 'int8' if generator.config['quantized'] else 'fp32'
+        size = sum(os.path.getsize(os.path.join(path, name)) for name in ONNX_FILES.values())
+        runtimes.append((f"onnx-{kind} ({os.path.basename(os.path.normpath(path))})", generator, size))
+
+    reference = None
+    print(f"{len(contexts)} contexts x {args.repeats} repeats")
+    print(f"{'runtime':<28} {'p50 ms':>8} {'p95 ms':>8} {'batched/s':>10} {'MiB':>7} "
+          f"{'exact':>6} {'tok F1':>7} {'parsed':>7}")
+    for name, model, size in runtimes:
+        result = measure(model, tokenizer, contexts, args.max_length, args.repeats)
+        outputs = result['outputs']
+        reference = reference or outputs
+        exact = sum(o == r for o, r in zip(outputs, reference)) / len(outputs)
+        f1 = statistics.mean(token_f1(o, r) for o, r in zip(outputs, reference))
+        parsed = 0
+        for output in outputs:
+            try:
+                parse_flashcard(output, tokenizer)
+                parsed += 1
+            except ValueError:
+                pass
+        size_text = f"{size / 2 ** 20:>7.1f}" if size is not None else f"{'-':>7}"
+        print(f"{name:<28} {result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f} {result['batched_per_sec']:>10.1f} "
+              f"{size_text} {exact:>6.0%} {f1:>7.3f} {parsed / len(outputs):>7.0%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Benchmark for the streaming sentence segmenter against the old split('.') splitter.
+
+Extracts the PDF's page text once, then times, over the same pages:
+  - split('.'):  the old per-page ``text.split('.')`` with adjacent sentences paired
+  - sentences:   ``iter_sentences`` with adjacent sentences paired (app.py's generator)
+  - windows:     ``iter_sentences`` packed by ``iter_context_windows`` into
+                 512-token windows (generate_flashcards.py's T5 input)
+and reports MB/sec, output counts and peak traced Python memory for each.
+
+Usage (from Scheduler-backend):
+    python benchmarks/bench_segmentation.py lecture.pdf --repeat 10 --overlap 64
+    python benchmarks/bench_segmentation.py lecture.pdf --tokenizer T5_QA/tokenizer
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from pdf_extraction import iter_page_text
+from text_segmentation import approx_token_count, iter_context_windows, iter_sentences
+
+
+def split_pairs(pages):
+    # The splitter generate_flashcards_from_pdf used before iter_sentences
+    flashcards = []
+    for text in pages:
+        sentences = text.split('.')
+        for i in range(0, len(sentences), 2):
+            if i + 1 < len(sentences):
+                question = sentences[i].strip()
+                answer = sentences[i + 1].strip()
+                if question and answer:
+                    flashcards.append({"question": question, "answer": answer})
+    return len(flashcards)
+
+
+def sentence_pairs(pages):
+    flashcards = []
+    sentences = iter_sentences(pages)
+    for question in sentences:
+        answer = next(sentences, None)
+        if answer is None:
+            break
+        flashcards.append({"question": question, "answer": answer})
+    return len(flashcards)
+
+
+def windows(pages, count_tokens, overlap):
+    return sum(1 for _ in iter_context_windows(iter_sentences(pages), count_tokens=count_tokens,
+                                               max_tokens=511, overlap_tokens=overlap))
+
+
+def measure(fn, pages, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = fn(pages)
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    fn(pages)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return count, best, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('pdf', help='Path to the PDF to segment')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per splitter; the fastest is reported')
+    parser.add_argument('--overlap', type=int, default=64, help='Window overlap in tokens')
+    parser.add_argument('--tokenizer', default=None,
+                        help='Count window tokens with this T5 tokenizer instead of the character estimate')
+    args = parser.parse_args()
+
+    pages = list(iter_page_text(args.pdf))
+    megabytes = sum(len(page.encode()) for page in pages) / 2 ** 20
+    print(f"{len(pages)} pages, {megabytes:.2f} MB of text")
+
+    count_tokens = approx_token_count
+    if args.tokenizer:
+        from transformers import T5Tokenizer
+
+        tokenizer = T5Tokenizer.from_pretrained(args.tokenizer)
+        count_tokens = lambda text: len(tokenizer(text, add_special_tokens=False)['input_ids'])
+
+    splitters = [
+        ("split('.')", split_pairs, 'pairs'),
+        ('sentences', sentence_pairs, 'pairs'),
+        ('windows', lambda p: windows(p, count_tokens, args.overlap), 'windows'),
+    ]
+    print(f"{'splitter':<12} {'output':>14} {'seconds':>9} {'MB/sec':>8} {'peak KiB':>10}")
+    for name, fn, unit in splitters:
+        count, seconds, peak = measure(fn, pages, args.repeat)
+        print(f"{name:<12} {count:>8} {unit:<5} {seconds:>9.3f} {megabytes / seconds:>8.1f} {peak / 1024:>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Throughput benchmark of the development server against gunicorn.
+
+Starts the API under each server in turn, runs the load test of
+load_test.py against it (same clients, mix and duration) and reports
+requests per second and latency per endpoint:
+
+  dev       ``flask --app app run``: werkzeug's development server, one
+            thread per request in a single process
+  gunicorn  ``gunicorn -c gunicorn.conf.py wsgi:app`` with --workers
+            preloaded gthread workers of --threads threads
+
+Both servers use the database in DATABASE_URL (the app's default when
+unset), which has to hold the users in --credentials. --mix defaults to
+the load test's mix without add_subject.
+
+Seed users first, e.g.:
+    flask --app app seed-data --users 500 --credentials /tmp/logins.csv
+
+Usage (from Scheduler-backend):
+    python benchmarks/bench_serving.py --credentials /tmp/logins.csv --clients 16 --duration 30
+    python benchmarks/bench_serving.py --credentials /tmp/logins.csv --workers 4 --threads 8
+"""
+import argparse
+import http.client
+import os
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+from load_test import DEFAULT_MIX, parse_mix, read_credentials, run_load
+
+
+def wait_until_up(port, process, timeout=120.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with status {process.returncode}")
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            connection.request('GET', '/metrics')
+            connection.getresponse().read()
+            connection.close()
+            return
+        except OSError:
+            time.sleep(0.5)
+    raise RuntimeError(f"Server did not start within {timeout:.0f}s")
+
+
+def serve(command, env, port, credentials, mix, clients, duration):
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        started = time.perf_counter()
+        wait_until_up(port, process)
+        startup = time.perf_counter() - started
+        return startup, run_load(f"http://127.0.0.1:{port}", credentials, mix, clients, duration)
+    finally:
+        process.terminate()
+        process.wait(timeout=60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--credentials', required=True, help='CSV written by flask seed-data --credentials')
+    parser.add_argument('--clients', type=int, default=16, help='Concurrent clients')
+    parser.add_argument('--duration', type=float, default=20.0, help='Seconds of load per server')
+    parser.add_argument('--mix', default=DEFAULT_MIX.replace(',add_subject=5', ''))
+    parser.add_argument('--workers', type=int, default=2 * (os.cpu_count() or 1) + 1, help='gunicorn workers')
+    parser.add_argument('--threads', type=int, default=4, help='Threads per gunicorn worker')
+    parser.add_argument('--port', type=int, default=5077)
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    credentials = read_credentials(args.credentials)
+    # Models are not needed to serve these endpoints; preloading them would only slow down startup
+    env = dict(os.environ, PRELOAD_MODELS=os.environ.get('PRELOAD_MODELS', ''))
+    servers = [
+        ('dev', [sys.executable, '-m', 'flask', '--app', 'app', 'run', '--port', str(args.port)], env),
+        ('gunicorn', [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'],
+         dict(env, GUNICORN_BIND=f"127.0.0.1:{args.port}", WEB_CONCURRENCY=str(args.workers),
+              GUNICORN_THREADS=str(args.threads))),
+    ]
+
+    print(f"{args.clients} clients for {args.duration:.0f}s per server, {len(credentials)} users, "
+          f"gunicorn {args.workers} workers x {args.threads} threads")
+    print(f"{'server':<9} {'endpoint':<16} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for name, command, server_env in servers:
+        startup, results = serve(command, server_env, args.port, credentials, mix, args.clients, args.duration)
+        for endpoint, result in results.items():
+            print(f"{name:<9} {endpoint:<16} {result['rps']:>8.1f} {result['p50']:>8.1f} {result['p95']:>8.1f} "
+                  f"{result['p99']:>8.1f} {result['errors']:>7}")
+        print(f"{name:<9} {'total':<16} {sum(r['rps'] for r in results.values()):>8.1f}  "
+              f"(started in {startup:.1f}s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Startup-time benchmark for the backend modules.
+
+Each measurement runs in a fresh interpreter. It reports the time to import
+``app`` and ``generate_flashcards`` (which no longer load the T5 model), the
+time for the first ``registry.get`` that actually loads it, and peak RSS
+after each step. As a baseline it also times the eager startup the server
+had before lazy loading: importing ``app`` and then loading every model in
+the registry. The "startup s" column compares the two directly.
+
+Usage (from Scheduler-backend):
+    python benchmarks/bench_startup.py --repeat 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = r"""
+import json, resource, sys, time
+sys.path.insert(0, {backend!r})
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+result = {{'import_seconds': elapsed}}
+if {load_model!r} == 'first':
+    from generate_flashcards import MODEL_NAME
+    from model_registry import registry
+    started = time.perf_counter()
+    registry.get(MODEL_NAME)
+    result['model_load_seconds'] = time.perf_counter() - started
+elif {load_model!r} == 'all':
+    from model_registry import registry
+    started = time.perf_counter()
+    for name in registry.stats():
+        registry.get(name)
+    result['model_load_seconds'] = time.perf_counter() - started
+result['peak_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+print(json.dumps(result))
+"""
+
+
+def measure(module, load_model, repeat):
+    """
+    Median timings of ``repeat`` fresh interpreters importing ``module``.
+
+    ``load_model`` is None, 'first' (the flashcard model) or 'all' (every
+    registered model, as an eager startup would).
+    """
+    runs = []
+    for _ in range(repeat):
+        code = PROBE.format(backend=BACKEND_DIR, module=module, load_model=load_model)
+        output = subprocess.check_output([sys.executable, '-c', code], cwd=BACKEND_DIR)
+        runs.append(json.loads(output.decode().strip().splitlines()[-1]))
+    return {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--skip-model', action='store_true', help="Don't measure the first model load")
+    args = parser.parse_args()
+
+    rows = [
+        ('import app (lazy)', measure('app', None, args.repeat)),
+        ('import generate_flashcards', measure('generate_flashcards', None, args.repeat)),
+    ]
+    if not args.skip_model:
+        rows.append(('generate_flashcards + first load', measure('generate_flashcards', 'first', args.repeat)))
+        rows.append(('import app + load all (eager)', measure('app', 'all', args.repeat)))
+
+    print(f"{'step':<34} {'import s':>9} {'load s':>8} {'startup s':>10} {'peak RSS MB':>12}")
+    for name, row in rows:
+        load = row.get('model_load_seconds')
+        startup = row['import_seconds'] + (load or 0.0)
+        print(f"{name:<34} {row['import_seconds']:>9.3f} {load if load is not None else float('nan'):>8.3f} "
+              f"{startup:>10.3f} {row['peak_rss_mb']:>12.1f}")
+
+    if not args.skip_model:
+        lazy, eager = rows[0][1], rows[-1][1]
+        eager_startup = eager['import_seconds'] + eager['model_load_seconds']
+        print(f"\nstartup: eager {eager_startup:.3f}s, lazy {lazy['import_seconds']:.3f}s "
+              f"({eager_startup - lazy['import_seconds']:.3f}s saved)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Benchmark for the weekly study planner on synthetic users.
+
+For each subject count it builds a user with random allocated days, card
+backlogs and deadlines, then times a full plan, a re-plan after changing one
+subject, and a no-op re-plan. Times are the median over ``--repeat`` users.
+Each user's incremental plan after changes on two different days is also
+checked against a full plan of a fresh planner.
+
+Usage (from Scheduler-backend):
+    python benchmarks/bench_study_planner.py --subjects 100 500 1000 5000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import date
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from study_planner import WeeklyPlanner
+
+
+def synthetic_user(rng, subjects, start_date):
+    planner = WeeklyPlanner(start_date, study_hours=rng.choice([2, 4, 6, 8]), study_time='09:00')
+    for subject_id in range(subjects):
+        cards = int(rng.lognormvariate(3.5, 1.0))
+        deadline_day = rng.randrange(0, 14) if rng.random() < 0.3 else None
+        planner.set_subject(subject_id, f"Subject {subject_id}", rng.randrange(7),
+                            planner.blocks_for(cards, 1), deadline_day)
+    return planner
+
+
+def replanned_from_scratch(planner):
+    fresh = WeeklyPlanner(planner.start_date, 0, '00:00', planner.block_minutes, planner.max_session_blocks)
+    fresh.capacity, fresh.day_start = planner.capacity, planner.day_start
+    for subject_id, (name, day, blocks, deadline_day) in planner._subjects.items():
+        fresh.set_subject(subject_id, name, day, blocks, deadline_day)
+    return fresh.plan()
+
+
+def timed(func):
+    start = time.perf_counter()
+    func()
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--subjects', type=int, nargs='+', default=[10, 100, 500, 1000, 5000])
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    start_date = date.today()
+    print(f"{'subjects':>9} {'full ms':>9} {'one change ms':>14} {'days replanned':>15} {'no-op ms':>9}")
+    for subjects in args.subjects:
+        full, change, noop, replanned = [], [], [], []
+        for _ in range(args.repeat):
+            planner = synthetic_user(rng, subjects, start_date)
+            full.append(timed(planner.plan))
+
+            subject_id = rng.randrange(subjects)
+            name, day, blocks, deadline_day = planner._subjects[subject_id]
+            before = planner.days_replanned
+            planner.set_subject(subject_id, name, day, blocks + 2, deadline_day)
+            change.append(timed(planner.plan))
+            replanned.append(planner.days_replanned - before)
+
+            noop.append(timed(planner.plan))
+
+            # Changes on two separate days must give the same plan as planning from scratch
+            first, second = rng.sample(range(subjects), 2) if subjects > 1 else (0, 0)
+            for subject_id, day in ((first, 1), (second, 4)):
+                name, _, blocks, deadline_day = planner._subjects[subject_id]
+                planner.set_subject(subject_id, name, day, blocks + 3, deadline_day)
+            if planner.plan() != replanned_from_scratch(planner):
+                raise SystemExit(f"Incremental plan differs from a full re-plan ({subjects} subjects)")
+        print(f"{subjects:>9} {statistics.median(full):>9.2f} {statistics.median(change):>14.2f} "
+              f"{statistics.mean(replanned):>15.1f} {statistics.median(noop):>9.3f}")
+
+
+if __name__ == '__main__':
+    main()
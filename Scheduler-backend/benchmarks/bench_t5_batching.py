@@ -0,0 +1,81 @@
+"""
+CPU benchmark for batched vs unbatched T5 flashcard generation.
+
+Drives a BatchedGenerator from several client threads, first with
+max_batch_size=1 (equivalent to the old one-context-per-generate path) and
+then with dynamic batching, and prints throughput and latency for each.
+
+Usage (from Scheduler-backend):
+    python benchmarks/bench_t5_batching.py --requests 64 --clients 16 --batch-sizes 1 4 16
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import torch
+from transformers import T5Tokenizer, T5ForConditionalGeneration
+
+from inference_server import BatchedGenerator
+
+SAMPLE_CONTEXTS = [
+    "The Eiffel Tower is a wrought-iron lattice tower on the Champ de Mars in Paris, France. "
+    "It is named after the engineer Gustave Eiffel, whose company designed and built the tower.",
+    "Photosynthesis is the process by which green plants use sunlight to synthesise nutrients "
+    "from carbon dioxide and water. It generally involves the green pigment chlorophyll.",
+    "Barry lives in tripoli, which is the capital of Libya. The neighbourhood in which he lives "
+    "is called 'Hay demashq'.",
+    "The mitochondrion is an organelle found in most eukaryotic cells. It generates most of the "
+    "cell's supply of adenosine triphosphate, which is used as a source of chemical energy.",
+]
+
+
+def run(generator, contexts, clients):
+    def request(context):
+        try:
+            generator.generate(context)
+        except ValueError:
+            # An unparseable output still costs a full generate
+            pass
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(request, contexts))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', default=os.path.join(BACKEND_DIR, 'T5_QA', 'model'))
+    parser.add_argument('--tokenizer', default=os.path.join(BACKEND_DIR, 'T5_QA', 'tokenizer'))
+    parser.add_argument('--requests', type=int, default=64)
+    parser.add_argument('--clients', type=int, default=16, help='Concurrent client threads')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--max-wait-ms', type=float, default=10)
+    parser.add_argument('--threads', type=int, default=None, help='torch intra-op threads')
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    tokenizer = T5Tokenizer.from_pretrained(args.tokenizer)
+    model = T5ForConditionalGeneration.from_pretrained(args.model).to('cpu').eval()
+    contexts = [SAMPLE_CONTEXTS[i % len(SAMPLE_CONTEXTS)] for i in range(args.requests)]
+
+    # Warm up so the first configuration doesn't pay one-off costs
+    BatchedGenerator(tokenizer, model, max_batch_size=1)._generate_batch(contexts[:1])
+
+    print(f"{'batch':>6} {'seconds':>8} {'req/sec':>8} {'avg batch':>10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for batch_size in args.batch_sizes:
+        generator = BatchedGenerator(tokenizer, model, max_batch_size=batch_size, max_wait_ms=args.max_wait_ms)
+        elapsed = run(generator, contexts, args.clients)
+        stats = generator.stats()
+        print(f"{batch_size:>6} {elapsed:>8.2f} {args.requests / elapsed:>8.1f} {stats['avg_batch_size']:>10.1f} "
+              f"{stats['latency_p50_ms']:>8.1f} {stats['latency_p95_ms']:>8.1f} {stats['latency_p99_ms']:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Benchmark for the T5 trainer's dataset classes.
+
+Compares iterating a DataLoader over ``PreprocessDataset`` (tokenizes and pads
+to max_length on every access) with ``MemmapDataset`` (tokenized once, padded
+per batch). Reports one-off tokenization time, samples/sec per epoch and the
+share of pad tokens fed to the model.
+
+Usage (from Scheduler-backend):
+    python benchmarks/bench_training_dataset.py --tokenizer t5-small --samples 5000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BACKEND_DIR, 't5_qa_trainer'))
+
+from torch.utils.data import DataLoader
+from transformers import T5Tokenizer
+
+from dataset import PreprocessDataset, PadCollator, tokenize_to_memmap
+
+WORDS = ("the of and to in is was for on that with as by at from his he it an were are which this be or "
+         "first also new after city university school war century government population").split()
+
+
+def synthetic_squad(n, rng):
+    records = []
+    for _ in range(n):
+        context = ' '.join(rng.choice(WORDS) for _ in range(int(rng.lognormvariate(4.8, 0.4))))
+        question = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(6, 15))) + '?'
+        answer = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 4)))
+        records.append({'context': context, 'question': question, 'answers': {'text': [answer]}})
+    return records
+
+
+def run_epoch(loader):
+    samples = tokens = pads = 0
+    start = time.perf_counter()
+    for batch in loader:
+        samples += batch['input_ids'].shape[0]
+        tokens += batch['input_ids'].numel()
+        pads += int((batch['attention_mask'] == 0).sum())
+    return time.perf_counter() - start, samples, pads / tokens if tokens else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tokenizer', required=True, help='Tokenizer name or path')
+    parser.add_argument('--samples', type=int, default=5000)
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--max-length', type=int, default=512)
+    parser.add_argument('--tokenize-workers', type=int, default=os.cpu_count())
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    tokenizer = T5Tokenizer.from_pretrained(args.tokenizer)
+    records = synthetic_squad(args.samples, random.Random(args.seed))
+
+    baseline = DataLoader(PreprocessDataset(records, tokenizer, args.max_length), batch_size=args.batch_size)
+    seconds, samples, pad_share = run_epoch(baseline)
+    print(f"PreprocessDataset: {samples / seconds:10.1f} samples/sec  pad share {pad_share:6.1%}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        memmap = tokenize_to_memmap(records, tokenizer, tmp, args.max_length, num_workers=args.tokenize_workers)
+        print(f"tokenize_to_memmap: {time.perf_counter() - start:9.2f} s once ({args.tokenize_workers} workers)")
+
+        loader = DataLoader(memmap, batch_size=args.batch_size, collate_fn=PadCollator(tokenizer.pad_token_id))
+        seconds, samples, pad_share = run_epoch(loader)
+        print(f"MemmapDataset:     {samples / seconds:10.1f} samples/sec  pad share {pad_share:6.1%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+"""
+Throughput and memory benchmark for PDF uploads.
+
+Sends a file of random bytes through a Flask test client three ways and
+reports MB/s and the peak Python memory allocated while the request runs
+(tracemalloc):
+
+  buffered   werkzeug's default file handling (a spooled temporary file)
+             followed by a hashing copy into the upload folder, which is
+             how /add_subject stored files before uploads streamed
+  streaming  uploads.StreamingRequest, which writes and hashes the file
+             once while the multipart body is parsed
+  chunked    ResumableUploads: init, raw chunks of --chunk-mb, finalize
+
+Usage (from Scheduler-backend):
+    python benchmarks/bench_upload.py --size-mb 64 256 --chunk-mb 8
+"""
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from flask import Flask, Request, jsonify, request
+
+from extraction_cache import save_and_hash
+from uploads import ResumableUploads, StreamingRequest
+
+
+def make_app(request_class, upload_dir):
+    app = Flask(__name__)
+    app.request_class = request_class
+    app.config['UPLOAD_FOLDER'] = upload_dir
+    app.config['MAX_UPLOAD_BYTES'] = None
+    uploads = ResumableUploads(os.path.join(upload_dir, 'incoming'))
+
+    @app.route('/buffered', methods=['POST'])
+    def buffered():
+        file = request.files['file']
+        tmp_path = os.path.join(upload_dir, 'buffered.part')
+        content_hash, _ = save_and_hash(file.stream, tmp_path)
+        os.replace(tmp_path, os.path.join(upload_dir, f"{content_hash}.pdf"))
+        return jsonify({'hash': content_hash})
+
+    @app.route('/streaming', methods=['POST'])
+    def streaming():
+        file = request.files['file']
+        content_hash = file.stream.hexdigest()
+        file.stream.commit(os.path.join(upload_dir, f"{content_hash}.pdf"))
+        return jsonify({'hash': content_hash})
+
+    @app.route('/uploads', methods=['POST'])
+    def start():
+        return jsonify(uploads.create(1, 'bench.pdf'))
+
+    @app.route('/uploads/<upload_id>/chunks', methods=['POST'])
+    def chunk(upload_id):
+        return jsonify({'offset': uploads.append(upload_id, 1, request.args.get('offset', type=int), request.stream)})
+
+    @app.route('/uploads/<upload_id>/finalize', methods=['POST'])
+    def finalize(upload_id):
+        content_hash, _ = uploads.finalize(upload_id, 1, upload_dir)
+        return jsonify({'hash': content_hash})
+
+    return app
+
+
+def send_multipart(client, path, endpoint):
+    with open(path, 'rb') as f:
+        return client.post(endpoint, data={'file': (f, 'bench.pdf')}).json['hash']
+
+
+def send_chunked(client, path, chunk_bytes):
+    upload_id = client.post('/uploads').json['id']
+    offset = 0
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_bytes)
+            if not chunk:
+                break
+            # The test client's request objects hold their body in reference cycles until collected
+            gc.collect()
+            offset = client.post(f"/uploads/{upload_id}/chunks?offset={offset}", data=chunk,
+                                 content_type='application/octet-stream').json['offset']
+    return client.post(f"/uploads/{upload_id}/finalize").json['hash']
+
+
+def measure(send):
+    tracemalloc.start()
+    started = time.perf_counter()
+    content_hash = send()
+    seconds = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return content_hash, seconds, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size-mb', type=int, nargs='+', default=[64, 256])
+    parser.add_argument('--chunk-mb', type=int, default=8, help='Chunk size of the resumable upload')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        upload_dir = os.path.join(tmp, 'uploads')
+        os.makedirs(upload_dir)
+        clients = {
+            'buffered': make_app(Request, upload_dir).test_client(),
+            'streaming': make_app(StreamingRequest, upload_dir).test_client(),
+        }
+        # The chunked peak includes the chunk bytes the client sends from
+        print(f"{'size MB':>8} {'path':<10} {'MB/s':>8} {'peak MiB':>9}")
+        for size_mb in args.size_mb:
+            path = os.path.join(tmp, 'upload.bin')
+            with open(path, 'wb') as f:
+                for _ in range(size_mb):
+                    f.write(os.urandom(1024 * 1024))
+            hashes = set()
+            runs = [
+                ('buffered', lambda: send_multipart(clients['buffered'], path, '/buffered')),
+                ('streaming', lambda: send_multipart(clients['streaming'], path, '/streaming')),
+                ('chunked', lambda: send_chunked(clients['streaming'], path, args.chunk_mb * 1024 * 1024)),
+            ]
+            for name, send in runs:
+                content_hash, seconds, peak = measure(send)
+                hashes.add(content_hash)
+                print(f"{size_mb:>8} {name:<10} {size_mb / seconds:>8.0f} {peak / 2 ** 20:>9.1f}")
+            assert len(hashes) == 1, "paths stored different content"
+
+
+if __name__ == '__main__':
+    main()
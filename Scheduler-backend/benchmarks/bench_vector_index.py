@@ -0,0 +1,156 @@
+"""
+Build and query benchmark for the card vector index behind /similar_cards.
+
+Adds synthetic embeddings (clustered, like cards on shared topics) to an
+``IVFIndex`` in subject-sized batches, the way embedding jobs do, and
+reports build time and memory. Then, for each ``--nprobe``, it reports
+p50/p99 query latency and recall@k against an exact scan, for searches over
+the whole index and for searches restricted to one user's cards.
+
+Finally it saves the first ``--store-subjects`` subjects to a
+``ShardedVectorStore`` and times loading them in a second store, and
+re-embedding one subject (new card ids) in one store until the other has
+applied it; the subject's old ids must be gone from both.
+
+Usage (from Scheduler-backend):
+    python benchmarks/bench_vector_index.py --cards 1000000 --dim 384 --nprobe 4 16 64
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import numpy as np
+
+from vector_index import IVFIndex, ShardedVectorStore, normalize
+
+
+def synthetic_vectors(rng, centers, count, spread):
+    topics = rng.integers(0, len(centers), size=count)
+    return (centers[topics] + spread * rng.standard_normal((count, centers.shape[1]), dtype=np.float32)).astype(
+        np.float32)
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return [samples[min(len(samples) - 1, int(q * len(samples)))] * 1000 for q in (0.5, 0.99)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cards', type=int, default=1000000)
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--topics', type=int, default=2000, help='Cluster centres of the synthetic embeddings')
+    parser.add_argument('--spread', type=float, default=0.05, help='Noise added around each centre, per dimension')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--batch', type=int, default=200, help='Cards per add call (one subject)')
+    parser.add_argument('--nlist', type=int, default=None, help='Cells (default sqrt(cards))')
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[4, 16, 64])
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('-k', type=int, default=10)
+    parser.add_argument('--store-subjects', type=int, default=500, help='Subjects saved to the sharded store')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    centers = normalize(rng.standard_normal((args.topics, args.dim), dtype=np.float32))
+    index = IVFIndex(nlist=args.nlist, exact_limit=0)
+
+    # Generated in large chunks, added one subject at a time
+    add_seconds = 0.0
+    chunk = 100000
+    for start in range(0, args.cards, chunk):
+        vectors = synthetic_vectors(rng, centers, min(chunk, args.cards - start), args.spread)
+        for offset in range(0, len(vectors), args.batch):
+            ids = np.arange(start + offset, start + min(offset + args.batch, len(vectors)))
+            started = time.perf_counter()
+            index.add(ids, (ids // args.batch) % args.users, vectors[offset:offset + args.batch])
+            add_seconds += time.perf_counter() - started
+    vector_mb = index.size * args.dim * 2 / 2 ** 20
+    print(f"built {index.size} x {args.dim} vectors in {add_seconds:.1f}s ({len(index.centroids)} cells), "
+          f"{vector_mb:.0f} MiB of float16 vectors ({2 * vector_mb:.0f} MiB as float32)")
+
+    started = time.perf_counter()
+    index.train()
+    print(f"retrain on the full index: {time.perf_counter() - started:.1f}s")
+
+    queries = synthetic_vectors(rng, centers, args.queries, args.spread)
+    # The first search after an add groups the vectors by cell and by owner
+    started = time.perf_counter()
+    index.search(queries[0], k=args.k, owner=0)
+    print(f"first search after the build: {(time.perf_counter() - started) * 1000:.0f} ms")
+    owners = rng.integers(0, args.users, size=args.queries)
+    vectors = index._vectors[:index.size].astype(np.float32)
+    all_owners = index._owners[:index.size]
+    exact, exact_owner, exact_seconds = [], [], []
+    for query, owner in zip(normalize(queries), owners):
+        started = time.perf_counter()
+        scores = vectors @ query
+        exact.append(set(np.argpartition(-scores, args.k)[:args.k].tolist()))
+        exact_seconds.append(time.perf_counter() - started)
+        mine = np.flatnonzero(all_owners == owner)
+        exact_owner.append(set(mine[np.argsort(-scores[mine])[:args.k]].tolist()))
+    del vectors
+    p50, p99 = percentiles(exact_seconds)
+    print(f"{'search':<10} {'nprobe':>6} {'p50 ms':>8} {'p99 ms':>8} {'recall@' + str(args.k):>10}")
+    print(f"{'exact':<10} {'-':>6} {p50:>8.2f} {p99:>8.2f} {1:>10.3f}")
+
+    for scope in ('all', 'user'):
+        for nprobe in args.nprobe:
+            latencies, recall = [], 0.0
+            for query, owner, truth, truth_owner in zip(queries, owners, exact, exact_owner):
+                started = time.perf_counter()
+                results = index.search(query, k=args.k, nprobe=nprobe, owner=owner if scope == 'user' else None)
+                latencies.append(time.perf_counter() - started)
+                expected = truth if scope == 'all' else truth_owner
+                recall += len({id_ for id_, _ in results} & expected) / max(1, len(expected))
+            p50, p99 = percentiles(latencies)
+            print(f"{scope:<10} {nprobe:>6} {p50:>8.2f} {p99:>8.2f} {recall / len(queries):>10.3f}")
+
+    # Per-user searches as /similar_cards runs them: exact over the user's cards
+    index.exact_limit = 20000
+    latencies = []
+    for query, owner in zip(queries, owners):
+        started = time.perf_counter()
+        index.search(query, k=args.k, owner=owner)
+        latencies.append(time.perf_counter() - started)
+    p50, p99 = percentiles(latencies)
+    print(f"{'user, exact scan of their cards':<32} {p50:>8.2f} {p99:>8.2f}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        writer = ShardedVectorStore(directory)
+        subjects = min(args.store_subjects, index.size // args.batch)
+        started = time.perf_counter()
+        for subject in range(subjects):
+            ids = np.arange(subject * args.batch, (subject + 1) * args.batch)
+            writer.replace(subject, ids, (ids // args.batch) % args.users, index._vectors[ids])
+        print(f"sharded store: wrote {subjects} subjects in {time.perf_counter() - started:.1f}s")
+        reader = ShardedVectorStore(directory)
+        started = time.perf_counter()
+        reader.refresh()
+        print(f"sharded store: loaded {len(reader.index)} vectors in {time.perf_counter() - started:.1f}s")
+
+        # Re-embedding subject 0 replaces its cards with new ids
+        old_ids = np.arange(args.batch)
+        new_ids = old_ids + index.size
+        started = time.perf_counter()
+        writer.replace(0, new_ids, np.zeros(args.batch, dtype=np.int64), index._vectors[old_ids])
+        written = time.perf_counter() - started
+        started = time.perf_counter()
+        reader.refresh()
+        print(f"sharded store: one subject re-embedded in {written * 1000:.1f} ms, "
+              f"applied by another process in {(time.perf_counter() - started) * 1000:.1f} ms")
+        for store in (writer, reader):
+            if any(store.index.get(id_) is not None for id_ in old_ids) or len(store.index) != subjects * args.batch:
+                raise SystemExit("Vectors of the replaced cards are still in the index")
+            results = store.index.search(index._vectors[0], k=args.k, owner=0)
+            if {id_ for id_, _ in results} & set(old_ids.tolist()):
+                raise SystemExit("Search returned replaced cards")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,250 @@
+"""
+HTTP load test for the API.
+
+Concurrent clients log in as seeded users and then send a weighted mix of
+requests to a running server until --duration has passed:
+
+  login           POST /login as a randomly chosen seeded user, who the
+                  client then acts as
+  test_user_data  GET /test_user_data/<id>, revalidating with the ETag of
+                  the previous response the way a polling dashboard does
+  verify_token    POST /verify_token
+  add_subject     POST /add_subject with --pdf (left out without one)
+
+Throughput and p50/p95/p99 latency are reported per endpoint, along with the
+status codes seen. The clients are threads with one keep-alive connection
+each, so on one machine they share the CPU with the server; leave it some.
+
+Seed users and start a server first, e.g.:
+    flask --app app seed-data --users 1000 --credentials /tmp/logins.csv
+    flask --app app run
+
+Usage (from Scheduler-backend):
+    python benchmarks/load_test.py --credentials /tmp/logins.csv --clients 16 --duration 30
+    python benchmarks/load_test.py --credentials /tmp/logins.csv --pdf lecture.pdf --mix test_user_data=10,add_subject=1
+"""
+import argparse
+import csv
+import http.client
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from urllib.parse import urlsplit
+
+ENDPOINTS = ('login', 'test_user_data', 'verify_token', 'add_subject')
+
+DEFAULT_MIX = 'login=10,test_user_data=60,verify_token=25,add_subject=5'
+
+
+def parse_mix(text):
+    """Parses "endpoint=weight,..." into a dictionary of weights."""
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if name.strip() not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint {name!r}; expected one of {', '.join(ENDPOINTS)}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def read_credentials(path):
+    """Reads the CSV written by ``flask seed-data --credentials``."""
+    with open(path, newline='') as f:
+        return [(int(row['user_id']), row['email'], row['password']) for row in csv.DictReader(f)]
+
+
+def multipart_body(fields, file_field, filename, data):
+    boundary = uuid.uuid4().hex
+    parts = [
+        f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+        for name, value in fields.items()
+    ]
+    parts.append(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="{file_field}"; filename="{filename}"\r\n'
+        f'Content-Type: application/pdf\r\n\r\n'.encode() + data + b'\r\n'
+    )
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+class Client:
+    """
+    One simulated user on its own keep-alive connection.
+
+    Args:
+        url (str): Base URL of the server.
+        credentials (tuple): (user id, email, password) of a seeded user.
+        pdf (bytes): PDF sent to /add_subject, or None.
+        timeout (float): Socket timeout in seconds.
+    """
+
+    def __init__(self, url, credentials, pdf=None, timeout=30.0):
+        parts = urlsplit(url)
+        self.connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=timeout)
+        self.pdf = pdf
+        self.switch_user(credentials)
+
+    def switch_user(self, credentials):
+        """Starts acting as another user; the next request should be a login."""
+        self.user_id, self.email, self.password = credentials
+        self.token = None
+        self.etag = None
+
+    def _send(self, method, path, body=None, headers=None):
+        try:
+            self.connection.request(method, path, body=body, headers=headers or {})
+            response = self.connection.getresponse()
+            return response.status, response.getheader('ETag'), response.read()
+        except (http.client.HTTPException, OSError):
+            # Reconnect on the next request
+            self.connection.close()
+            raise
+
+    def _auth(self):
+        return {'Authorization': f"Bearer {self.token}"}
+
+    def login(self):
+        status, _, body = self._send('POST', '/login', json.dumps({'email': self.email, 'password': self.password}),
+                                     {'Content-Type': 'application/json'})
+        if status == 200:
+            self.token = json.loads(body)['token']
+        return status
+
+    def test_user_data(self):
+        headers = {'If-None-Match': self.etag} if self.etag else {}
+        status, etag, _ = self._send('GET', f'/test_user_data/{self.user_id}', headers=headers)
+        if etag:
+            self.etag = etag
+        return status
+
+    def verify_token(self):
+        return self._send('POST', '/verify_token', headers=self._auth())[0]
+
+    def add_subject(self):
+        body, content_type = multipart_body(
+            {'name': f"Load test {uuid.uuid4().hex[:8]}", 'allocatedDay': 'Monday'}, 'file', 'lecture.pdf', self.pdf
+        )
+        return self._send('POST', '/add_subject', body, dict(self._auth(), **{'Content-Type': content_type}))[0]
+
+
+def percentile(sorted_samples, q):
+    return sorted_samples[min(len(sorted_samples) - 1, int(q * len(sorted_samples)))]
+
+
+def run_load(url, credentials, mix, clients=8, duration=30.0, pdf=None, seed=0):
+    """
+    Runs the load test and returns per-endpoint results.
+
+    :param url: Base URL of the server
+    :param credentials: List of (user id, email, password) tuples
+    :param mix: Dictionary of endpoint weights
+    :param clients: Number of concurrent clients
+    :param duration: Seconds to keep sending requests
+    :param pdf: Bytes sent to /add_subject; required if it has a weight
+    :param seed: Seed for the choice of users and requests
+    :return: Dictionary of endpoint -> {"requests", "errors", "rps", "p50", "p95", "p99", "statuses"}
+    """
+    names = [name for name, weight in mix.items() if weight > 0]
+    weights = [mix[name] for name in names]
+    samples = defaultdict(list)
+    statuses = defaultdict(Counter)
+    lock = threading.Lock()
+    started = time.perf_counter()
+    deadline = started + duration
+
+    def worker(index):
+        rng = random.Random(seed * 100003 + index)
+        client = Client(url, rng.choice(credentials), pdf)
+        local = []
+        name = 'login'
+        while True:
+            if name == 'login' and client.token:
+                client.switch_user(rng.choice(credentials))
+            request_started = time.perf_counter()
+            try:
+                status = getattr(client, name)()
+            except (http.client.HTTPException, OSError) as e:
+                status = type(e).__name__
+            local.append((name, status, time.perf_counter() - request_started))
+            if time.perf_counter() >= deadline:
+                break
+            # Requests other than login need a token, so a failed login is retried first
+            name = rng.choices(names, weights)[0] if client.token else 'login'
+        with lock:
+            for name, status, seconds in local:
+                samples[name].append(seconds)
+                statuses[name][status] += 1
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    results = {}
+    for name in ENDPOINTS:
+        if not samples[name]:
+            continue
+        latencies = sorted(samples[name])
+        errors = sum(count for status, count in statuses[name].items()
+                     if not isinstance(status, int) or status >= 400)
+        results[name] = {
+            'requests': len(latencies),
+            'errors': errors,
+            'rps': len(latencies) / elapsed,
+            'p50': percentile(latencies, 0.50) * 1000,
+            'p95': percentile(latencies, 0.95) * 1000,
+            'p99': percentile(latencies, 0.99) * 1000,
+            'statuses': dict(statuses[name]),
+        }
+    return results
+
+
+def print_results(results):
+    print(f"{'endpoint':<16} {'requests':>9} {'errors':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+          f"  statuses")
+    for name, result in results.items():
+        statuses = ' '.join(f"{status}:{count}" for status, count in sorted(result['statuses'].items(), key=str))
+        print(f"{name:<16} {result['requests']:>9} {result['errors']:>7} {result['rps']:>8.1f} {result['p50']:>8.1f} "
+              f"{result['p95']:>8.1f} {result['p99']:>8.1f}  {statuses}")
+    print(f"{'total':<16} {sum(r['requests'] for r in results.values()):>9} "
+          f"{sum(r['errors'] for r in results.values()):>7} {sum(r['rps'] for r in results.values()):>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--credentials', required=True, help='CSV written by flask seed-data --credentials')
+    parser.add_argument('--clients', type=int, default=8, help='Concurrent clients')
+    parser.add_argument('--duration', type=float, default=30.0, help='Seconds to send requests for')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='Weights of the endpoints, e.g. "test_user_data=3,login=1"')
+    parser.add_argument('--pdf', default=None, help='PDF sent to /add_subject (without it add_subject is skipped)')
+    parser.add_argument('--json', default=None, help='Also write the results to this JSON file')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    pdf = None
+    if args.pdf:
+        with open(args.pdf, 'rb') as f:
+            pdf = f.read()
+    else:
+        mix.pop('add_subject', None)
+
+    credentials = read_credentials(args.credentials)
+    print(f"{args.clients} clients for {args.duration:.0f}s against {args.url} as {len(credentials)} users")
+    results = run_load(args.url, credentials, mix, args.clients, args.duration, pdf, args.seed)
+    print_results(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {os.path.abspath(args.json)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+import csv
+import io
+import json
+import os
+import uuid
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+from extraction_cache import save_and_hash
+from metrics import record_stage, run_instrumented
+from study_planner import DAYS_OF_WEEK
+
+# Manifest files looked for at the root of an archive
+MANIFEST_NAMES = ('manifest.csv', 'manifest.json')
+
+# Longest subject name the subjects table holds
+MAX_NAME_LENGTH = 100
+
+
+def parse_manifest(filename, stream):
+    """
+    Reads the rows of an import manifest.
+
+    A CSV manifest has a header row; a JSON manifest is a list of objects.
+    Each row names a ``file`` and may give its ``name``, ``allocated_day``
+    and ``deadline`` (YYYY-MM-DD).
+
+    :param filename: Name of the manifest, whose extension picks the format
+    :param stream: Readable binary stream of the manifest
+    :return: List of row dictionaries
+    """
+    if filename.lower().endswith('.json'):
+        rows = json.load(stream)
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            raise ValueError("A JSON manifest must be a list of objects")
+        return rows
+    return list(csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')))
+
+
+def _entry(row, allocated_day):
+    file = str(row.get('file') or '').strip()
+    entry = {
+        'file': file,
+        'name': str(row.get('name') or '').strip() or os.path.splitext(os.path.basename(file))[0],
+        'allocated_day': str(row.get('allocated_day') or '').strip() or allocated_day,
+        'deadline': str(row.get('deadline') or '').strip() or None,
+        'content_hash': None,
+        'file_path': None,
+        'flashcards': None,
+        'error': None,
+    }
+    if not file:
+        entry['error'] = "Missing file"
+    elif not entry['name'] or len(entry['name']) > MAX_NAME_LENGTH:
+        entry['error'] = f"name must be 1 to {MAX_NAME_LENGTH} characters"
+    elif entry['allocated_day'] not in DAYS_OF_WEEK:
+        entry['error'] = f"allocated_day must be one of {', '.join(DAYS_OF_WEEK)}"
+    elif entry['deadline'] is not None:
+        try:
+            date.fromisoformat(entry['deadline'])
+        except ValueError:
+            entry['error'] = "deadline must be a date in YYYY-MM-DD format"
+    return entry
+
+
+def _store(stream, upload_folder):
+    # Same layout as /add_subject: the PDF is stored by content hash
+    tmp_path = os.path.join(upload_folder, f"{uuid.uuid4().hex}.part")
+    try:
+        content_hash, _ = save_and_hash(stream, tmp_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    file_path = os.path.join(upload_folder, f"{content_hash}.pdf")
+    os.replace(tmp_path, file_path)
+    return content_hash, file_path
+
+
+def read_import(path, upload_folder, allocated_day=None, max_bytes=None):
+    """
+    Collects the PDFs of a bulk import and stores each one in the upload
+    folder under its content hash.
+
+    ``path`` is either a zip archive or a manifest (see ``parse_manifest``).
+    An archive may carry a manifest at its root; without one every PDF in it
+    is imported, named after its file. Files in a manifest on disk are
+    relative to the manifest's folder. Rows that fail validation or whose
+    file is missing or too large get an ``error`` and are not stored.
+
+    :param path: Zip archive or manifest file
+    :param upload_folder: Folder the PDFs are stored in
+    :param allocated_day: Day used for rows that do not give one
+    :param max_bytes: Largest accepted PDF; None for no limit
+    :return: List of entry dictionaries, one per file, in manifest order
+    """
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            names = set(archive.namelist())
+            manifest = next((name for name in MANIFEST_NAMES if name in names), None)
+            if manifest is not None:
+                with archive.open(manifest) as stream:
+                    rows = parse_manifest(manifest, stream)
+            else:
+                rows = [
+                    {'file': name} for name in sorted(names)
+                    if name.lower().endswith('.pdf') and not name.startswith('__MACOSX/')
+                ]
+            entries = [_entry(row, allocated_day) for row in rows]
+            for entry in entries:
+                if entry['error'] is not None:
+                    continue
+                if entry['file'] not in names:
+                    entry['error'] = "File not found in archive"
+                elif max_bytes is not None and archive.getinfo(entry['file']).file_size > max_bytes:
+                    entry['error'] = f"File is larger than {max_bytes} bytes"
+                else:
+                    # Members are streamed out by content hash, never extracted under their own names
+                    with archive.open(entry['file']) as stream:
+                        entry['content_hash'], entry['file_path'] = _store(stream, upload_folder)
+        return entries
+
+    with open(path, 'rb') as stream:
+        rows = parse_manifest(path, stream)
+    base_dir = os.path.dirname(os.path.abspath(path))
+    entries = [_entry(row, allocated_day) for row in rows]
+    for entry in entries:
+        if entry['error'] is not None:
+            continue
+        source = os.path.join(base_dir, entry['file'])
+        if not os.path.isfile(source):
+            entry['error'] = "File not found"
+        elif max_bytes is not None and os.path.getsize(source) > max_bytes:
+            entry['error'] = f"File is larger than {max_bytes} bytes"
+        else:
+            with open(source, 'rb') as stream:
+                entry['content_hash'], entry['file_path'] = _store(stream, upload_folder)
+    return entries
+
+
+def extract_entries(entries, generate, workers=None):
+    """
+    Generates the flashcards of every stored entry that has none yet,
+    one file per worker process.
+
+    Identical PDFs are extracted once. A file whose extraction fails gets
+    the exception message as its ``error``; the other files are unaffected.
+
+    :param entries: Entries returned by ``read_import``
+    :param generate: Picklable top-level function ``(file_path, workers,
+        content_hash)`` returning a list of flashcards
+    :param workers: Number of worker processes
+    :return: The entries, with ``flashcards`` or ``error`` filled in
+    """
+    pending = {}
+    for entry in entries:
+        if entry['error'] is None and entry['flashcards'] is None:
+            pending.setdefault(entry['content_hash'], []).append(entry)
+    if not pending:
+        return entries
+
+    with ProcessPoolExecutor(max_workers=min(workers or os.cpu_count() or 1, len(pending))) as pool:
+        # Each file is extracted on one process, so pages are not split across workers again
+        futures = {
+            content_hash: pool.submit(run_instrumented, generate,
+                                      {'file_path': same[0]['file_path'], 'workers': 1, 'content_hash': content_hash})
+            for content_hash, same in pending.items()
+        }
+        for content_hash, future in futures.items():
+            try:
+                (flashcards, stages), error = future.result(), None
+            except Exception as e:
+                flashcards, stages, error = None, {}, str(e) or type(e).__name__
+            for stage, seconds in stages.items():
+                record_stage(stage, seconds)
+            for entry in pending[content_hash]:
+                entry['flashcards'], entry['error'] = flashcards, error
+    return entries
@@ -0,0 +1,165 @@
+import re
+
+import numpy as np
+
+_WORD = re.compile(r'\w+')
+
+# Cards are hashed in chunks so the (cards x shingles x permutations) work
+# array stays small
+_SIGNATURE_CHUNK = 1024
+
+
+def shingles(text, size=3):
+    """
+    Returns the set of word n-grams of a text, hashed to integers.
+
+    Text is lower-cased and reduced to its words, so punctuation and spacing
+    differences don't matter. Texts shorter than ``size`` words give a
+    single shingle of all their words. Python's string hashing is salted per
+    process, so signatures are only comparable within one process.
+    """
+    words = _WORD.findall(text.lower())
+    if len(words) < size:
+        return {hash(tuple(words))}
+    return {hash(shingle) for shingle in zip(*(words[i:] for i in range(size)))}
+
+
+def card_text(card):
+    return f"{card['question']} {card['answer']}"
+
+
+class MinHashLSH:
+    """
+    MinHash signatures with an LSH band index for near-duplicate lookup.
+
+    A signature holds, for each of ``num_perm`` hash functions, the minimum
+    hash over a text's shingles; the share of positions two signatures agree
+    on estimates the Jaccard similarity of their shingle sets. Signatures are
+    cut into ``bands`` bands, and each band is a key into its own hash
+    table, so a lookup only compares against texts that share at least one
+    whole band instead of every text in the index. Pairs with similarity s
+    become candidates with probability 1 - (1 - s^r)^b for r rows per band;
+    with the defaults (16 bands of 8 rows) that is over 99% at s = 0.8 and
+    under 5% at s = 0.5.
+
+    Args:
+        threshold (float): Estimated Jaccard similarity at or above which two texts are duplicates.
+        num_perm (int): Number of hash functions per signature.
+        bands (int): Number of LSH bands; must divide ``num_perm``.
+        seed (int): Seed for the hash functions.
+    """
+
+    def __init__(self, threshold=0.8, num_perm=128, bands=16, seed=1):
+        if num_perm % bands:
+            raise ValueError(f"bands ({bands}) must divide num_perm ({num_perm})")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        # Multiply-shift hashing: (a * x + b) mod 2^64, keeping the top 32 bits
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 2 ** 63, size=(num_perm, 1), dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2 ** 63, size=(num_perm, 1), dtype=np.uint64)
+        # Mixes the rows of a band into one key
+        self._band_mix = rng.integers(1, 2 ** 63, size=self.rows, dtype=np.uint64) | np.uint64(1)
+        self._tables = [{} for _ in range(bands)]
+        self._signatures = []
+
+    def __len__(self):
+        return len(self._signatures)
+
+    def signatures(self, texts):
+        """
+        Computes the MinHash signatures of many texts.
+
+        :param texts: List of strings
+        :return: uint32 array of shape (len(texts), num_perm)
+        """
+        result = np.empty((len(texts), self.num_perm), dtype=np.uint32)
+        for start in range(0, len(texts), _SIGNATURE_CHUNK):
+            hashed = [shingles(text) for text in texts[start:start + _SIGNATURE_CHUNK]]
+            counts = np.fromiter((len(h) for h in hashed), dtype=np.int64, count=len(hashed))
+            values = np.fromiter((v for h in hashed for v in h), dtype=np.int64, count=int(counts.sum()))
+            # One column of permuted hashes per shingle, reduced to a column per text
+            permuted = self._a * values.view(np.uint64)
+            permuted += self._b
+            permuted >>= np.uint64(32)
+            offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+            result[start:start + len(hashed)] = np.minimum.reduceat(permuted, offsets, axis=1).T
+        return result
+
+    def band_keys(self, signatures):
+        """
+        Hashes each band of many signatures to one integer.
+
+        :param signatures: Array from ``signatures``
+        :return: List with a list of ``bands`` keys per signature
+        """
+        bands = signatures.reshape(len(signatures), self.bands, self.rows).astype(np.uint64)
+        return (bands * self._band_mix).sum(axis=2).tolist()
+
+    def add(self, signature, keys):
+        """Adds a signature and its band keys to the index and returns its id."""
+        key = len(self._signatures)
+        self._signatures.append(signature)
+        for table, band in zip(self._tables, keys):
+            bucket = table.get(band)
+            if bucket is None:
+                table[band] = [key]
+            else:
+                bucket.append(key)
+        return key
+
+    def find_duplicate(self, signature, keys):
+        """
+        Returns the id of an indexed signature at or above the threshold, or
+        None. Only signatures sharing a band key with ``signature`` are
+        compared, and a shared key is always confirmed on the signatures.
+        """
+        checked = set()
+        for table, band in zip(self._tables, keys):
+            for key in table.get(band, ()):
+                if key in checked:
+                    continue
+                checked.add(key)
+                if np.count_nonzero(self._signatures[key] == signature) >= self.threshold * self.num_perm:
+                    return key
+        return None
+
+
+def dedupe_flashcards(cards, existing=(), threshold=0.8, num_perm=128, bands=16, index=None):
+    """
+    Drops flashcards that are near-duplicates of an earlier card.
+
+    Cards are compared on their question and answer together. The first
+    card of each group of near-duplicates is kept and order is preserved.
+
+    :param cards: List of dictionaries with "question" and "answer" keys
+    :param existing: Cards already stored elsewhere (e.g. the user's other
+        subjects); new cards that duplicate one of them are dropped too
+    :param threshold: Estimated Jaccard similarity of word 3-grams at or
+        above which two cards are duplicates
+    :param num_perm: MinHash signature length
+    :param bands: Number of LSH bands
+    :param index: MinHashLSH shared between calls, e.g. to dedupe several
+        subjects against each other; the kept cards are added to it. When
+        given, threshold, num_perm and bands are taken from it.
+    :return: Tuple of (kept cards, number of cards dropped)
+    """
+    if index is None:
+        index = MinHashLSH(threshold=threshold, num_perm=num_perm, bands=bands)
+    existing = [card_text(card) for card in existing]
+    if existing:
+        signatures = index.signatures(existing)
+        for signature, keys in zip(signatures, index.band_keys(signatures)):
+            index.add(signature, keys)
+    if not cards:
+        return [], 0
+
+    kept = []
+    signatures = index.signatures([card_text(card) for card in cards])
+    for card, signature, keys in zip(cards, signatures, index.band_keys(signatures)):
+        if index.find_duplicate(signature, keys) is None:
+            index.add(signature, keys)
+            kept.append(card)
+    return kept, len(cards) - len(kept)
@@ -0,0 +1,70 @@
+import os
+
+import numpy as np
+
+from metrics import timed_stage
+from model_registry import registry
+
+# Small sentence-embedding model run on CPU (384-dimensional, ~90 MB)
+EMBEDDING_MODEL_PATH = os.environ.get("EMBEDDING_MODEL_PATH", "sentence-transformers/all-MiniLM-L6-v2")
+EMBEDDING_BATCH_SIZE = int(os.environ.get("EMBEDDING_BATCH_SIZE", 64))
+
+EMBEDDER_NAME = "card_embedder"
+
+
+def load_embedder():
+    """
+    Loads the embedding model and its tokenizer.
+
+    transformers (and torch) are imported here so that importing this module
+    stays cheap; the model is only loaded in the processes that embed cards.
+    """
+    from transformers import AutoModel, AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(EMBEDDING_MODEL_PATH)
+    model = AutoModel.from_pretrained(EMBEDDING_MODEL_PATH)
+    model.eval()
+    return tokenizer, model
+
+
+registry.register(EMBEDDER_NAME, load_embedder)
+
+
+def embed_texts(texts, batch_size=EMBEDDING_BATCH_SIZE):
+    """
+    Embeds texts with the sentence-embedding model.
+
+    Texts are sorted by length before batching so each batch pads to a
+    similar length, and the token embeddings are mean-pooled over the
+    attention mask.
+
+    :param texts: List of strings
+    :param batch_size: Texts per forward pass
+    :return: float16 array of unit-length vectors, one row per text
+    """
+    import torch
+
+    tokenizer, model = registry.get(EMBEDDER_NAME)
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    vectors = np.empty((len(texts), model.config.hidden_size), dtype=np.float16)
+    for start in range(0, len(texts), batch_size):
+        batch = order[start:start + batch_size]
+        inputs = tokenizer([texts[i] for i in batch], padding=True, truncation=True, max_length=256,
+                           return_tensors="pt")
+        with torch.inference_mode(), timed_stage('embedding_inference'):
+            hidden = model(**inputs).last_hidden_state
+        mask = inputs["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+        pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1)
+        vectors[batch] = torch.nn.functional.normalize(pooled, dim=1).numpy()
+    return vectors
+
+
+def embed_cards(card_ids, texts):
+    """
+    Embeds a subject's cards (read by the embedding job, see app.py).
+
+    :param card_ids: Flashcard ids, one per text
+    :param texts: Question and answer of each card
+    :return: Dictionary with the card ids and their vectors
+    """
+    return {"card_ids": card_ids, "vectors": embed_texts(texts)}
@@ -18,6 +18,8 @@ class User(db.Model, UserMixin):
     study_hours (int): Number of hours the user prefers to study.
     study_time (str): Preferred study time in HH:MM format.
     subjects (list): List of subjects associated with the user.
+    data_version (int): Incremented whenever the user's dashboard data changes;
+        used to validate cached dashboard payloads and as their ETag.
     created_at (datetime): Timestamp when the user account was created.
     updated_at (datetime): Timestamp when the user account was last updated.
     """
@@ -30,6 +32,7 @@ class User(db.Model, UserMixin):
     study_hours = db.Column(db.Integer)
     study_time = db.Column(db.String(20))
     subjects = db.relationship('Subject', backref='user', lazy=True)
+    data_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     created_at = db.Column(db.DateTime(timezone=True), default=datetime.now(timezone.utc))
     updated_at = db.Column(db.DateTime, onupdate=datetime.utcnow)
 
@@ -41,6 +44,17 @@ class User(db.Model, UserMixin):
         """Verifies if the provided password matches the stored hash."""
         return check_password_hash(self.password, password)
 
+def touch_user_data(user_id):
+    """
+    Marks a user's dashboard data as changed, in the current transaction.
+
+    Works across processes because the version lives in the users table.
+    Call it wherever a subject's name, day, progress or card counts change.
+    """
+    db.session.execute(
+        db.update(User).where(User.id == user_id).values(data_version=User.data_version + 1)
+    )
+
 class Subject(db.Model):
     """
     Represents a subject in the study application.
@@ -50,7 +64,9 @@ class Subject(db.Model):
     name (str): Name of the subject.
     pdf_path (str): File path to the subject's PDF resource.
     allocated_day (str): Day of the week when the subject is allocated.
-    flashcards (list): List of flashcards associated with the subject.
+    deadline (date): Optional date by which the subject must be studied.
+    cards (query): Flashcard rows belonging to the subject, ordered by position.
+    pages (query): Extracted page text of the subject's PDF, for search.
     progress (int): Current study progress as a percentage.
     completed_flashcards (int): Number of flashcards completed.
     total_flashcards (int): Total number of flashcards in the subject.
@@ -64,7 +80,11 @@ class Subject(db.Model):
     name = db.Column(db.String(100), nullable=False)
     # pdf_path = db.Column(db.String(200), nullable=False)  # Path to the uploaded PDF
     allocated_day = db.Column(db.String(10), nullable=False)  # Day of the week (e.g., "Monday")
-    flashcards = db.Column(db.JSON, nullable=True, default=[])  # JSON field to store flashcards
+    deadline = db.Column(db.Date, nullable=True)  # Optional exam/due date used by the planner
+    cards = db.relationship('Flashcard', backref='subject', lazy='dynamic', order_by='Flashcard.position',
+                            cascade='all, delete-orphan', passive_deletes=True)
+    pages = db.relationship('SubjectPage', backref='subject', lazy='dynamic', order_by='SubjectPage.page_number',
+                            cascade='all, delete-orphan', passive_deletes=True)
     progress = db.Column(db.Integer, nullable=False, default=0)  # Study progress in percentage
     completed_flashcards = db.Column(db.Integer, nullable=False, default=0)
     total_flashcards = db.Column(db.Integer, nullable=False, default=0)
@@ -74,10 +94,182 @@ class Subject(db.Model):
 
     # function to add the cards into the subject's database
     def add_cards(self, cards=[]):
-        self.flashcards = cards
+        """
+        Replaces the subject's flashcards with one bulk INSERT.
+
+        The subject must already have an id (flush it first).
+
+        :param cards: List of dictionaries with "question" and "answer" keys
+        """
+        Flashcard.query.filter_by(subject_id=self.id).delete(synchronize_session=False)
+        if cards:
+            # New cards are due straight away
+            now = datetime.now(timezone.utc)
+            db.session.execute(Flashcard.__table__.insert(), [
+                {
+                    'subject_id': self.id,
+                    'user_id': self.user_id,
+                    'due_at': now,
+                    'position': position,
+                    'question': card['question'],
+                    'answer': card['answer'],
+                }
+                for position, card in enumerate(cards)
+            ])
+        self.total_flashcards = len(cards)
+        self.completed_flashcards = 0
+        self.progress = 0
+
+    def add_pages(self, pages):
+        """
+        Replaces the subject's stored page text with one bulk INSERT.
+
+        The subject must already have an id (flush it first).
+
+        :param pages: List of page text strings, in page order
+        """
+        SubjectPage.query.filter_by(subject_id=self.id).delete(synchronize_session=False)
+        rows = [
+            {'subject_id': self.id, 'user_id': self.user_id, 'page_number': number, 'text': text}
+            for number, text in enumerate(pages) if text.strip()
+        ]
+        if rows:
+            db.session.execute(SubjectPage.__table__.insert(), rows)
     
     def get_current_card(self):
         return self.completed_flashcards
 
     def get_total_cards(self):
-        return self.total_flashcards
\ No newline at end of file
+        return self.total_flashcards
+
+class Flashcard(db.Model):
+    """
+    Represents a single flashcard and its review state.
+
+    Attributes:
+    id (int): Unique identifier for the flashcard.
+    subject_id (int): Foreign key referencing the Subject the card belongs to.
+    user_id (int): Owner of the subject, copied here so due cards can be
+        found per user without joining subjects.
+    position (int): Zero-based order of the card within its subject.
+    question (str): Front of the card.
+    answer (str): Back of the card.
+    completed (bool): Whether the user has marked the card as studied.
+    repetitions (int): Number of successful reviews in a row.
+    ease_factor (float): Spaced-repetition ease factor.
+    interval_days (float): Current review interval in days.
+    due_at (datetime): When the card is next due for review.
+    last_reviewed_at (datetime): When the card was last reviewed.
+    """
+
+    __tablename__ = 'flashcards'
+    id = db.Column(db.Integer, primary_key=True)
+    subject_id = db.Column(db.Integer, db.ForeignKey('subjects.id', ondelete='CASCADE'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    position = db.Column(db.Integer, nullable=False)
+    question = db.Column(db.Text, nullable=False)
+    answer = db.Column(db.Text, nullable=False)
+    completed = db.Column(db.Boolean, nullable=False, default=False)
+    repetitions = db.Column(db.Integer, nullable=False, default=0)
+    ease_factor = db.Column(db.Float, nullable=False, default=2.5)
+    interval_days = db.Column(db.Float, nullable=False, default=0)
+    due_at = db.Column(db.DateTime(timezone=True), nullable=False, default=lambda: datetime.now(timezone.utc))
+    last_reviewed_at = db.Column(db.DateTime(timezone=True), nullable=True)
+
+    # Cards are read and updated by (subject, position); due cards are found
+    # with a range scan over (user, due_at)
+    __table_args__ = (
+        db.UniqueConstraint('subject_id', 'position', name='uq_flashcards_subject_id_position'),
+        db.Index('ix_flashcards_user_id_due_at', 'user_id', 'due_at'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'position': self.position,
+            'question': self.question,
+            'answer': self.answer,
+            'subject_id': self.subject_id,
+            'completed': self.completed,
+            'repetitions': self.repetitions,
+            'interval_days': self.interval_days,
+            'due_at': self.due_at.isoformat() if self.due_at else None,
+        }
+
+
+class SubjectPage(db.Model):
+    """
+    Text of one page of a subject's PDF, kept so the material can be searched.
+
+    Attributes:
+    id (int): Unique identifier for the page row.
+    subject_id (int): Foreign key referencing the Subject the page belongs to.
+    user_id (int): Owner of the subject, copied here so searches stay per user.
+    page_number (int): Zero-based page index within the PDF.
+    text (str): Extracted text of the page.
+    """
+
+    __tablename__ = 'subject_pages'
+    id = db.Column(db.Integer, primary_key=True)
+    subject_id = db.Column(db.Integer, db.ForeignKey('subjects.id', ondelete='CASCADE'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    page_number = db.Column(db.Integer, nullable=False)
+    text = db.Column(db.Text, nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint('subject_id', 'page_number', name='uq_subject_pages_subject_id_page_number'),
+    )
+
+
+class Job(db.Model):
+    """
+    Represents a background job in the local job queue.
+
+    Attributes:
+    id (str): Unique identifier (UUID4 hex) for the job.
+    kind (str): Name of the registered handler that processes the job.
+    status (str): One of "queued", "running", "finished" or "failed".
+    payload (dict): Keyword arguments passed to the handler.
+    result (dict): Summary of the handler's result once finished.
+    error (str): Error message if the job failed.
+    user_id (int): Foreign key referencing the User who enqueued the job.
+    subject_id (int): Foreign key referencing the Subject the job populates.
+    created_at (datetime): Timestamp when the job was enqueued.
+    started_at (datetime): Timestamp when a worker picked the job up.
+    finished_at (datetime): Timestamp when the job finished or failed.
+    owner (str): "host:pid" of the dispatcher running the job.
+    heartbeat_at (datetime): Last time the owner confirmed the job is still running.
+    """
+
+    __tablename__ = 'jobs'
+    id = db.Column(db.String(32), primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    payload = db.Column(db.JSON, nullable=False, default={})
+    result = db.Column(db.JSON, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    subject_id = db.Column(db.Integer, db.ForeignKey('subjects.id'), nullable=True)
+    created_at = db.Column(db.DateTime(timezone=True), nullable=False, default=lambda: datetime.now(timezone.utc))
+    started_at = db.Column(db.DateTime(timezone=True), nullable=True)
+    finished_at = db.Column(db.DateTime(timezone=True), nullable=True)
+    owner = db.Column(db.String(255), nullable=True)
+    heartbeat_at = db.Column(db.DateTime(timezone=True), nullable=True)
+
+    # The dispatcher claims work with "status = 'queued' ORDER BY created_at"
+    __table_args__ = (
+        db.Index('ix_jobs_status_created_at', 'status', 'created_at'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'subject_id': self.subject_id,
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
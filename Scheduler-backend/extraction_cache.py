@@ -0,0 +1,189 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache')
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# Size of the blocks read from an upload while it is hashed and written out
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+def hash_bytes(data):
+    """Returns the SHA-256 hex digest of a bytes or str value."""
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    return hashlib.sha256(data).hexdigest()
+
+
+def save_and_hash(stream, file_path, chunk_size=HASH_CHUNK_SIZE):
+    """
+    Copies a file-like stream to disk in chunks while hashing it.
+
+    :param stream: Readable binary stream (e.g. an uploaded FileStorage.stream)
+    :param file_path: Destination path
+    :param chunk_size: Number of bytes read per chunk
+    :return: Tuple of (SHA-256 hex digest, number of bytes written)
+    """
+    digest = hashlib.sha256()
+    size = 0
+    with open(file_path, 'wb') as out:
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+            out.write(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
+
+class ExtractionCache:
+    """
+    Persistent, size-bounded LRU cache for extraction and generation results.
+
+    Entries are JSON values stored in a SQLite file, keyed by a namespace and a
+    content hash, so they survive restarts and are shared by every process that
+    points at the same directory (web workers and job workers alike). When the
+    stored bytes exceed ``max_bytes`` the least recently used entries are
+    evicted. Hit and miss counters are persisted per namespace.
+
+    Args:
+        cache_dir (str): Directory holding the cache database.
+        max_bytes (int): Upper bound on the total size of stored values.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = os.path.join(cache_dir, 'extraction_cache.sqlite3')
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_access REAL NOT NULL,
+                    PRIMARY KEY (namespace, key)
+                );
+                CREATE INDEX IF NOT EXISTS ix_entries_last_access ON entries (last_access);
+                CREATE TABLE IF NOT EXISTS stats (
+                    namespace TEXT PRIMARY KEY,
+                    hits INTEGER NOT NULL DEFAULT 0,
+                    misses INTEGER NOT NULL DEFAULT 0,
+                    evictions INTEGER NOT NULL DEFAULT 0
+                );
+            """)
+
+    def _connect(self):
+        # sqlite3 connections can't be shared across threads or forked processes
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _count(self, conn, namespace, column, amount=1):
+        conn.execute(
+            f"INSERT INTO stats (namespace, {column}) VALUES (?, ?) "
+            f"ON CONFLICT(namespace) DO UPDATE SET {column} = {column} + excluded.{column}",
+            (namespace, amount)
+        )
+
+    def get(self, namespace, key):
+        """
+        Looks up a cached value and marks it as recently used.
+
+        :return: The cached value, or None on a miss
+        """
+        conn = self._connect()
+        row = conn.execute(
+            'SELECT value FROM entries WHERE namespace = ? AND key = ?', (namespace, key)
+        ).fetchone()
+        if row is None:
+            self._count(conn, namespace, 'misses')
+            return None
+        conn.execute(
+            'UPDATE entries SET last_access = ? WHERE namespace = ? AND key = ?',
+            (time.time(), namespace, key)
+        )
+        self._count(conn, namespace, 'hits')
+        return json.loads(row[0])
+
+    def set(self, namespace, key, value):
+        """Stores a JSON-serialisable value and evicts old entries if over budget."""
+        data = json.dumps(value)
+        size = len(data)
+        if size > self.max_bytes:
+            return
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute(
+                'INSERT OR REPLACE INTO entries (namespace, key, value, size, last_access) VALUES (?, ?, ?, ?, ?)',
+                (namespace, key, data, size, time.time())
+            )
+            self._evict(conn)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def _evict(self, conn):
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = {}
+        for namespace, key, size in conn.execute(
+            'SELECT namespace, key, size FROM entries ORDER BY last_access'
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            conn.execute('DELETE FROM entries WHERE namespace = ? AND key = ?', (namespace, key))
+            total -= size
+            evicted[namespace] = evicted.get(namespace, 0) + 1
+        for namespace, count in evicted.items():
+            self._count(conn, namespace, 'evictions', count)
+
+    def stats(self):
+        """
+        Returns hit/miss/eviction counters per namespace plus overall usage.
+
+        :return: Dictionary with "namespaces", "entries" and "bytes" keys
+        """
+        conn = self._connect()
+        entries, used = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries').fetchone()
+        namespaces = {
+            namespace: {'hits': hits, 'misses': misses, 'evictions': evictions}
+            for namespace, hits, misses, evictions in conn.execute(
+                'SELECT namespace, hits, misses, evictions FROM stats'
+            )
+        }
+        return {'namespaces': namespaces, 'entries': entries, 'bytes': used, 'max_bytes': self.max_bytes}
+
+
+_cache = None
+
+
+def get_cache():
+    """
+    Returns the process-wide cache, created on first use.
+
+    Settings come from the EXTRACTION_CACHE_DIR and EXTRACTION_CACHE_MAX_BYTES
+    environment variables so that job worker processes see the same store.
+    """
+    global _cache
+    if _cache is None:
+        _cache = ExtractionCache(
+            os.environ.get('EXTRACTION_CACHE_DIR', DEFAULT_CACHE_DIR),
+            int(os.environ.get('EXTRACTION_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES))
+        )
+    return _cache
@@ -1,26 +1,176 @@
-from transformers import T5Tokenizer, T5ForConditionalGeneration
+import functools
+import itertools
+import logging
+import os
+from pdf_extraction import iter_page_text, iter_page_text_cached
+from extraction_cache import get_cache, hash_bytes
+from inference_server import BatchedGenerator
+from model_registry import registry
+from text_segmentation import iter_context_windows, iter_sentences
 
-# Define the path to your saved model directory
-model_path = "./T5_QA/model"
-tokenizer_path = "./T5_QA/tokenizer"
+logger = logging.getLogger(__name__)
 
-# Load the tokenizer and model
-tokenizer = T5Tokenizer.from_pretrained(tokenizer_path)
-model = T5ForConditionalGeneration.from_pretrained(model_path)
+# Define the path to your saved model directory (e.g. a distilled student
+# written by t5_qa_trainer/distill.py)
+model_path = os.environ.get("FLASHCARD_MODEL_PATH", "./T5_QA/model")
+tokenizer_path = os.environ.get("FLASHCARD_TOKENIZER_PATH", "./T5_QA/tokenizer")
+
+# Inference runtime: "torch" (full-precision PyTorch) or "onnx" (the
+# quantized export written by t5_qa_trainer/export.py, run with ONNX Runtime;
+# its packages are optional: pip install -r requirements-onnx.txt)
+RUNTIME = os.environ.get("FLASHCARD_RUNTIME", "torch")
+onnx_model_path = os.environ.get("ONNX_MODEL_PATH", "./T5_QA/onnx")
+RUNTIMES = ("torch", "onnx")
+if RUNTIME not in RUNTIMES:
+    raise ValueError(f"FLASHCARD_RUNTIME must be one of {RUNTIMES}, not {RUNTIME!r}")
+
+# Cache namespaces for generated cards, keyed by context hash and by PDF hash.
+# They include the model path (and runtime) so a retrained or quantized model
+# doesn't reuse old cards.
+_model_key = model_path if RUNTIME == "torch" else f"{RUNTIME}:{onnx_model_path}"
+CARD_CACHE_NAMESPACE = f"t5-card:{_model_key}"
+
+# Context windows fed to the model: T5 takes at most 512 input tokens, one
+# of which is the end-of-sequence token added by the tokenizer
+CONTEXT_MAX_TOKENS = 511
+CONTEXT_OVERLAP_TOKENS = int(os.environ.get("CONTEXT_OVERLAP_TOKENS", 64))
+# Windows handed to the model at once; enough to keep its batches full
+# without holding every window of a large PDF in memory
+WINDOW_BATCH = 64
+
+PDF_CACHE_NAMESPACE = f"t5-pdf:{_model_key}:windows-{CONTEXT_MAX_TOKENS}-{CONTEXT_OVERLAP_TOKENS}"
+
+MODEL_NAME = "t5_qa"
+
+# Unload the model after this many idle seconds (0 keeps it loaded)
+MODEL_IDLE_TIMEOUT = float(os.environ.get("MODEL_IDLE_TIMEOUT", 0))
+
+def load_t5_qa():
+    """
+    Loads the tokenizer and model and wraps them in the shared batching service.
+
+    transformers (and torch) are imported here rather than at module level so
+    that importing this module stays cheap until a flashcard is generated.
+    With the "onnx" runtime the exported graphs and the tokenizer saved next
+    to them are loaded instead.
+    """
+    from transformers import T5Tokenizer
+
+    if RUNTIME == "onnx":
+        from onnx_generator import OnnxSeq2SeqGenerator
+
+        tokenizer = T5Tokenizer.from_pretrained(onnx_model_path)
+        model = OnnxSeq2SeqGenerator(onnx_model_path)
+    else:
+        from transformers import T5ForConditionalGeneration
+
+        tokenizer = T5Tokenizer.from_pretrained(tokenizer_path)
+        model = T5ForConditionalGeneration.from_pretrained(model_path)
+        model.eval()
+    return BatchedGenerator(tokenizer, model, max_batch_size=16, max_wait_ms=10)
+
+@functools.lru_cache(maxsize=1)
+def load_tokenizer():
+    """
+    Loads the model's tokenizer on its own, to size context windows without
+    loading the model (windows whose cards are cached never reach it).
+    """
+    from transformers import T5Tokenizer
+
+    return T5Tokenizer.from_pretrained(onnx_model_path if RUNTIME == "onnx" else tokenizer_path)
+
+def count_tokens(text):
+    """Number of model input tokens in ``text``, special tokens excluded."""
+    return len(load_tokenizer()(text, add_special_tokens=False)["input_ids"])
+
+registry.register(MODEL_NAME, load_t5_qa, close=lambda batcher: batcher.close())
+if MODEL_IDLE_TIMEOUT:
+    registry.start_reaper(MODEL_IDLE_TIMEOUT)
 
 def generate_flashcard(context):
+    """
+    Generates a single question/answer flashcard from a context passage.
+
+    :param context: Passage of text to generate the flashcard from
+    :return: Dictionary with "question" and "answer" keys
+    """
+    cache = get_cache()
+    key = hash_bytes(context)
+    flashcard = cache.get(CARD_CACHE_NAMESPACE, key)
+    if flashcard is not None:
+        return flashcard
+
+    flashcard = registry.get(MODEL_NAME).generate(context)
+    cache.set(CARD_CACHE_NAMESPACE, key, flashcard)
+    return flashcard
+
+def generate_flashcards(contexts):
+    """
+    Generates flashcards for many contexts, batching the cache misses together.
+
+    Contexts whose output is not a question/answer pair are skipped.
+
+    :param contexts: List of passages
+    :return: List of dictionaries containing flashcard questions and answers
+    """
+    cache = get_cache()
+    keys = [hash_bytes(context) for context in contexts]
+    flashcards = [cache.get(CARD_CACHE_NAMESPACE, key) for key in keys]
+
+    misses = [i for i, flashcard in enumerate(flashcards) if flashcard is None]
+    if not misses:
+        return flashcards
+    futures = registry.get(MODEL_NAME).generate_many([contexts[i] for i in misses])
+    for i, future in zip(misses, futures):
+        try:
+            flashcards[i] = future.result()
+        except ValueError as e:
+            logger.warning(f"Skipping context: {e}")
+            continue
+        cache.set(CARD_CACHE_NAMESPACE, keys[i], flashcards[i])
+
+    return [flashcard for flashcard in flashcards if flashcard is not None]
+
+def generate_flashcards_from_pdf(file_path, workers=None, content_hash=None):
+    """
+    Generates flashcards from a PDF using the T5 model, one per context window.
 
-    # Test the model with an input
-    inputs = tokenizer(context, return_tensors="pt")
-    outputs = model.generate(**inputs, max_length=128)
+    Page text is split into sentences across page breaks and packed into
+    windows of at most CONTEXT_MAX_TOKENS tokens that overlap by
+    CONTEXT_OVERLAP_TOKENS, so no input is truncated by the tokenizer;
+    sentences (and unbroken runs of characters) longer than a window are
+    split until they fit. Windows are generated in batches of WINDOW_BATCH
+    as the text streams in.
 
-    q_a = tokenizer.decode(outputs[0], skip_special_tokens=False)
-    q_a = q_a.replace(tokenizer.pad_token, "").replace(tokenizer.eos_token, "")
+    :param file_path: Path to the PDF file
+    :param workers: Number of processes used to extract page text
+    :param content_hash: SHA-256 of the file; when given, page text and the
+        resulting flashcards are read from and written to the extraction cache
+    :return: List of dictionaries containing flashcard questions and answers
+    """
+    if content_hash:
+        flashcards = get_cache().get(PDF_CACHE_NAMESPACE, content_hash)
+        if flashcards is not None:
+            return flashcards
+        pages = iter_page_text_cached(file_path, content_hash, workers=workers)
+    else:
+        pages = iter_page_text(file_path, workers=workers)
 
-    question, answer = q_a.split(tokenizer.sep_token)
+    windows = iter_context_windows(iter_sentences(pages), count_tokens=count_tokens,
+                                   max_tokens=CONTEXT_MAX_TOKENS, overlap_tokens=CONTEXT_OVERLAP_TOKENS)
+    flashcards = []
+    while True:
+        batch = list(itertools.islice(windows, WINDOW_BATCH))
+        if not batch:
+            break
+        flashcards.extend(generate_flashcards(batch))
 
-    return print("question:", question), print("answer:", answer)
+    if content_hash:
+        get_cache().set(PDF_CACHE_NAMESPACE, content_hash, flashcards)
+    return flashcards
 
 if __name__ == "__main__":
     text = "Barry lives in tripoli, which is the capital of Libya. The neighbourhood in which he lives is called 'Hay demashq'."
-    generate_flashcard(text)
+    flashcard = generate_flashcard(text)
+    print("question:", flashcard["question"])
+    print("answer:", flashcard["answer"])
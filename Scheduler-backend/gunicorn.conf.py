@@ -0,0 +1,57 @@
+"""
+gunicorn settings for serving the API (see wsgi.py):
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Workers and threads are read from the environment (WEB_CONCURRENCY,
+GUNICORN_THREADS) rather than command-line flags, because the per-worker
+database pool below is sized from them before the app is loaded. Each
+worker holds up to DB_POOL_SIZE + DB_MAX_OVERFLOW
+connections, so the database has to accept
+WEB_CONCURRENCY * (DB_POOL_SIZE + DB_MAX_OVERFLOW) of them.
+
+Background jobs run in one worker at a time, the one holding JOB_LOCK_FILE
+(see wsgi.start_job_dispatcher); if it exits another worker takes over. So
+JOB_WORKERS and PDF_EXTRACTION_WORKERS are the machine's totals, not
+per-worker numbers.
+
+Metrics are kept per process, so /metrics shows the worker that answered.
+"""
+import os
+
+cpus = os.cpu_count() or 1
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', 2 * cpus + 1))
+# Requests mostly wait on the database, so each worker serves several at once
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+# Uploads of up to MAX_UPLOAD_BYTES are streamed within one request
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+keepalive = 5
+
+# Import the app (and load its models, see wsgi.py) once in the master, then fork
+preload_app = True
+
+# One connection per request thread plus one for the job dispatcher thread
+os.environ.setdefault('DB_POOL_SIZE', str(threads + 1))
+os.environ.setdefault('DB_MAX_OVERFLOW', str(threads))
+# Only the worker running jobs starts job processes, so these split the CPUs once (see app.py)
+os.environ.setdefault('JOB_WORKERS', str(max(1, cpus // 4)))
+os.environ.setdefault('PDF_EXTRACTION_WORKERS', str(max(1, cpus // int(os.environ['JOB_WORKERS']))))
+
+
+def post_fork(server, worker):
+    from wsgi import reset_after_fork, start_job_dispatcher
+
+    reset_after_fork()
+    # Threads don't survive fork; each worker competes for the dispatcher lock
+    start_job_dispatcher()
+
+
+def when_ready(server):
+    pool = int(os.environ['DB_POOL_SIZE']) + int(os.environ['DB_MAX_OVERFLOW'])
+    server.log.info(f"{server.cfg.workers} workers x {server.cfg.threads} threads; "
+                    f"up to {server.cfg.workers * pool} database connections, "
+                    f"{os.environ['JOB_WORKERS']} job processes in one worker, "
+                    f"{os.environ['PDF_EXTRACTION_WORKERS']} extraction processes per job")
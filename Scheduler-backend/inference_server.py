@@ -0,0 +1,208 @@
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from metrics import record_stage
+
+# Queued by close() to tell a batching thread to exit
+_STOP = object()
+
+
+def parse_flashcard(text, tokenizer):
+    """
+    Splits a decoded "question <sep> answer" sequence into a flashcard.
+
+    :param text: Decoded model output, special tokens included
+    :param tokenizer: Tokenizer that produced the output
+    :return: Dictionary with "question" and "answer" keys
+    :raises ValueError: If the output does not contain exactly one separator
+    """
+    text = text.replace(tokenizer.pad_token, "").replace(tokenizer.eos_token, "")
+    parts = text.split(tokenizer.sep_token)
+    if len(parts) != 2:
+        raise ValueError(f"Model output is not a question/answer pair: {text!r}")
+    question, answer = parts
+    return {"question": question.strip(), "answer": answer.strip()}
+
+
+class BatchedGenerator:
+    """
+    In-process inference service that groups concurrent requests into batches.
+
+    Callers submit single contexts from any thread. A background thread takes
+    the first waiting context, keeps collecting more until ``max_batch_size``
+    is reached or ``max_wait_ms`` has passed, pads them together, runs one
+    ``generate`` call and resolves each caller's future with its own
+    question/answer pair.
+
+    Args:
+        tokenizer (transformers.Tokenizer): Tokenizer for the model.
+        model (transformers.T5ForConditionalGeneration): Model used to generate, or
+            an exported runtime with the same ``generate`` signature (OnnxSeq2SeqGenerator).
+        max_batch_size (int): Largest number of contexts per generate call.
+        max_wait_ms (float): How long to wait for a batch to fill up.
+        max_input_length (int): Inputs are truncated to this many tokens.
+        max_output_length (int): Maximum length of generated sequences.
+    """
+
+    def __init__(self, tokenizer, model, max_batch_size=16, max_wait_ms=10,
+                 max_input_length=512, max_output_length=128):
+        self.tokenizer = tokenizer
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_input_length = max_input_length
+        self.max_output_length = max_output_length
+
+        # Each batching thread has its own queue, so a thread started after close()
+        # never takes the stop marker or the requests left for the old one
+        self._requests = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+        self._stats_lock = threading.Lock()
+        self._started_at = time.perf_counter()
+        self._completed = 0
+        self._batches = 0
+        self._busy_seconds = 0.0
+        self._latencies = deque(maxlen=10000)
+
+    def submit(self, context):
+        """
+        Queues a context for generation.
+
+        :param context: Passage of text to generate a flashcard from
+        :return: concurrent.futures.Future resolving to a flashcard dictionary
+        """
+        future = Future()
+        with self._lock:
+            # Queued under the lock, so close() can't stop the thread between the check and the put
+            if self._thread is None:
+                self._requests = queue.Queue()
+                self._thread = threading.Thread(target=self._run, args=(self._requests,), name='t5-batcher',
+                                                daemon=True)
+                self._thread.start()
+            self._requests.put((context, future, time.perf_counter()))
+        return future
+
+    def generate(self, context):
+        """Generates a flashcard for one context, blocking until its batch has run."""
+        return self.submit(context).result()
+
+    def generate_many(self, contexts):
+        """
+        Submits every context at once so they share batches.
+
+        :param contexts: Iterable of passages
+        :return: List of futures, in the same order as ``contexts``
+        """
+        return [self.submit(context) for context in contexts]
+
+    def close(self):
+        """
+        Stops the batching thread once the requests already queued have run.
+
+        Dropping the last reference afterwards releases the model (once the
+        old thread has finished). Submitting again starts a new thread with a
+        queue of its own, while the old one drains its queue.
+        """
+        with self._lock:
+            if self._thread is not None:
+                self._requests.put(_STOP)
+            self._thread = None
+            self._requests = None
+
+    def _collect_batch(self, requests):
+        item = requests.get()
+        if item is _STOP:
+            return [], True
+        batch = [item]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                item = requests.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self, requests):
+        stopping = False
+        while not stopping:
+            batch, stopping = self._collect_batch(requests)
+            if not batch:
+                continue
+            started = time.perf_counter()
+            try:
+                outputs = self._generate_batch([context for context, _, _ in batch])
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+
+            finished = time.perf_counter()
+            record_stage('model_inference', finished - started)
+            for (_, future, submitted), text in zip(batch, outputs):
+                try:
+                    future.set_result(parse_flashcard(text, self.tokenizer))
+                except ValueError as e:
+                    future.set_exception(e)
+
+            with self._stats_lock:
+                self._batches += 1
+                self._completed += len(batch)
+                self._busy_seconds += finished - started
+                self._latencies.extend(finished - submitted for _, _, submitted in batch)
+
+    def _generate_batch(self, contexts):
+        # PyTorch models take "pt" tensors; exported runtimes declare their own type
+        tensor_type = getattr(self.model, "tensor_type", "pt")
+        inputs = self.tokenizer(
+            contexts,
+            return_tensors=tensor_type,
+            padding=True,
+            truncation=True,
+            max_length=self.max_input_length
+        )
+        if tensor_type != "pt":
+            outputs = self.model.generate(**inputs, max_length=self.max_output_length)
+        else:
+            import torch
+
+            with torch.inference_mode():
+                outputs = self.model.generate(**inputs, max_length=self.max_output_length)
+        return self.tokenizer.batch_decode(outputs, skip_special_tokens=False)
+
+    def stats(self):
+        """
+        Returns throughput and latency statistics since the service was created.
+
+        :return: Dictionary with request/batch counts, throughput and latency percentiles (ms)
+        """
+        with self._stats_lock:
+            latencies = sorted(self._latencies)
+            elapsed = time.perf_counter() - self._started_at
+            completed, batches, busy = self._completed, self._batches, self._busy_seconds
+
+        def percentile(p):
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))] * 1000
+
+        return {
+            'requests': completed,
+            'batches': batches,
+            'avg_batch_size': completed / batches if batches else 0.0,
+            'requests_per_sec': completed / elapsed if elapsed else 0.0,
+            'busy_requests_per_sec': completed / busy if busy else 0.0,
+            'latency_p50_ms': percentile(50),
+            'latency_p95_ms': percentile(95),
+            'latency_p99_ms': percentile(99),
+        }
@@ -0,0 +1,274 @@
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextvars import ContextVar
+
+from flask import Response, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from extraction_cache import get_cache
+from metrics import CONTENT_TYPE, metrics
+from model_registry import registry
+
+logger = logging.getLogger(__name__)
+
+# Bucket upper bounds for single SQL statements (seconds) and statements per request
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250, 1000)
+
+# Statement types given their own label; everything else is "other"
+SQL_OPERATIONS = ('SELECT', 'INSERT', 'UPDATE', 'DELETE')
+
+# Timings of the request being served by the current thread; cheaper to reach from
+# the SQL event listeners than flask.g, and None outside requests (e.g. in the job dispatcher)
+_request_state = ContextVar('request_metrics', default=None)
+
+
+class SlowRequestProfiler:
+    """
+    Sampling profiler for requests that turn out to be slow.
+
+    While a request runs, a background thread samples the stack of the
+    thread serving it every ``interval`` seconds. Requests that take at least
+    ``threshold`` seconds have their samples written to ``directory`` as
+    folded stacks (one ``frame;frame;... count`` line per distinct stack),
+    which flamegraph.pl and speedscope read directly. Samples of faster
+    requests are discarded.
+
+    Args:
+        directory (str): Folder the ``.folded`` files are written to.
+        threshold (float): Duration in seconds from which a request is dumped.
+        interval (float): Seconds between samples.
+        max_depth (int): Innermost frames kept per sample.
+    """
+
+    def __init__(self, directory, threshold=1.0, interval=0.005, max_depth=100):
+        self.directory = directory
+        self.threshold = threshold
+        self.interval = interval
+        self.max_depth = max_depth
+        self._active = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start_request(self):
+        """Starts sampling the calling thread."""
+        with self._lock:
+            self._active[threading.get_ident()] = Counter()
+            if self._thread is None:
+                # Started on first use so it runs in the process serving requests, not a pre-fork parent
+                self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+                self._thread.start()
+
+    def finish_request(self, name, seconds):
+        """
+        Stops sampling the calling thread and dumps its samples if the request was slow.
+
+        :param name: Label for the file name, e.g. "GET /test_user_data/<user_id>"
+        :param seconds: Duration of the request
+        :return: Path of the written file, or None
+        """
+        with self._lock:
+            samples = self._active.pop(threading.get_ident(), None)
+        if not samples or seconds < self.threshold:
+            return None
+
+        os.makedirs(self.directory, exist_ok=True)
+        slug = re.sub(r'[^A-Za-z0-9]+', '_', name).strip('_')
+        path = os.path.join(
+            self.directory,
+            f"{time.strftime('%Y%m%d-%H%M%S')}-{slug}-{seconds * 1000:.0f}ms-{uuid.uuid4().hex[:8]}.folded"
+        )
+        with open(path, 'w') as f:
+            for stack, count in samples.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
+
+    def _fold(self, frame):
+        frames = []
+        while frame is not None and len(frames) < self.max_depth:
+            code = frame.f_code
+            frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return ';'.join(reversed(frames))
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                threads = list(self._active)
+            if not threads:
+                continue
+            frames = sys._current_frames()
+            stacks = {ident: self._fold(frames[ident]) for ident in threads if ident in frames}
+            del frames
+            with self._lock:
+                for ident, stack in stacks.items():
+                    # The request may have finished while its stack was being folded
+                    if ident in self._active:
+                        self._active[ident][stack] += 1
+
+
+def extraction_cache_metrics():
+    stats = get_cache().stats()
+    namespaces = sorted(stats['namespaces'].items())
+    for field in ('hits', 'misses', 'evictions'):
+        yield (f"extraction_cache_{field}_total", 'counter', f"Extraction cache {field} per namespace",
+               [({'namespace': namespace}, counts[field]) for namespace, counts in namespaces])
+    yield 'extraction_cache_entries', 'gauge', 'Entries in the extraction cache', [({}, stats['entries'])]
+    yield 'extraction_cache_bytes', 'gauge', 'Bytes stored in the extraction cache', [({}, stats['bytes'])]
+    yield 'extraction_cache_max_bytes', 'gauge', 'Size limit of the extraction cache', [({}, stats['max_bytes'])]
+
+
+def model_registry_metrics():
+    stats = sorted(registry.stats().items())
+    yield ('model_loaded', 'gauge', 'Whether a model is loaded in this process',
+           [({'model': name}, int(entry['loaded'])) for name, entry in stats])
+    yield ('model_load_seconds', 'gauge', 'Seconds the last load of a model took',
+           [({'model': name}, entry['load_seconds']) for name, entry in stats])
+    yield ('model_idle_seconds', 'gauge', 'Seconds since a loaded model was last used',
+           [({'model': name}, entry['idle_seconds']) for name, entry in stats])
+
+    # Models served through a BatchedGenerator report its batching statistics
+    batchers = []
+    for name, _ in stats:
+        model = registry.peek(name)
+        if model is not None and callable(getattr(model, 'stats', None)):
+            batchers.append((name, model.stats()))
+    for field, kind in (('requests', 'counter'), ('batches', 'counter'), ('avg_batch_size', 'gauge'),
+                        ('latency_p50_ms', 'gauge'), ('latency_p95_ms', 'gauge'), ('latency_p99_ms', 'gauge')):
+        suffix = '_total' if kind == 'counter' else ''
+        yield (f"inference_batcher_{field}{suffix}", kind, f"Batched inference {field.replace('_', ' ')}",
+               [({'model': name}, batcher[field]) for name, batcher in batchers])
+
+
+class Instrumentation:
+    """
+    Request, SQL and processing-stage metrics for a Flask application,
+    served in the Prometheus text format.
+
+    Every request's latency is recorded per endpoint (the URL rule, so ids in
+    paths don't create new series) together with the number and duration of
+    the SQL statements it ran, counted through SQLAlchemy engine events. The
+    stage timings recorded by ``metrics.record_stage`` (PDF extraction, model
+    inference) and the extraction cache and model registry statistics are
+    exported alongside. With PROFILE_SLOW_REQUESTS set, requests slower than
+    PROFILE_THRESHOLD_MS are profiled by ``SlowRequestProfiler``.
+
+    Metrics are per process; with several server processes each one has to
+    be scraped.
+
+    Usage:
+        instrumentation = Instrumentation(app)
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.profiler = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Bind to a Flask application: adds the request hooks, the SQL event
+        listeners and the metrics endpoint.
+
+        :param app: Flask application instance
+        """
+        app.config.setdefault('METRICS_PATH', '/metrics')
+        app.config.setdefault('PROFILE_SLOW_REQUESTS', False)
+        app.config.setdefault('PROFILE_THRESHOLD_MS', 1000)
+        app.config.setdefault('PROFILE_INTERVAL_MS', 5)
+        app.config.setdefault('PROFILE_DIR', os.path.join(app.root_path, 'profiles'))
+        self.app = app
+
+        metrics.counter('http_requests_total', 'Requests served', ('method', 'endpoint', 'status'))
+        metrics.histogram('http_request_duration_seconds', 'Request latency', ('method', 'endpoint'))
+        metrics.histogram('http_request_db_queries', 'SQL statements run per request', ('endpoint',),
+                          buckets=QUERY_COUNT_BUCKETS)
+        metrics.histogram('http_request_db_seconds', 'Time per request spent in SQL statements', ('endpoint',))
+        metrics.histogram('db_query_duration_seconds', 'SQL statement latency', ('operation',),
+                          buckets=QUERY_BUCKETS)
+        metrics.add_collector(extraction_cache_metrics)
+        metrics.add_collector(model_registry_metrics)
+
+        if app.config['PROFILE_SLOW_REQUESTS']:
+            self.profiler = SlowRequestProfiler(
+                app.config['PROFILE_DIR'],
+                threshold=app.config['PROFILE_THRESHOLD_MS'] / 1000,
+                interval=app.config['PROFILE_INTERVAL_MS'] / 1000
+            )
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        app.add_url_rule(app.config['METRICS_PATH'], 'metrics', self.metrics_view)
+        # Engine-wide, so engines created after this (e.g. by Flask-SQLAlchemy on first use) are covered
+        if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        app.extensions['instrumentation'] = self
+
+    def metrics_view(self):
+        return Response(metrics.render(), content_type=CONTENT_TYPE)
+
+    def _before_request(self):
+        _request_state.set({'started': time.perf_counter(), 'queries': 0, 'query_seconds': 0.0})
+        if self.profiler is not None:
+            self.profiler.start_request()
+
+    def _after_request(self, response):
+        state = _request_state.get()
+        if state is None:
+            return response
+        _request_state.set(None)
+        seconds = time.perf_counter() - state['started']
+        method = request.method
+        endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+        metrics.inc('http_requests_total', method=method, endpoint=endpoint, status=response.status_code)
+        metrics.observe('http_request_duration_seconds', seconds, method=method, endpoint=endpoint)
+        metrics.observe('http_request_db_queries', state['queries'], endpoint=endpoint)
+        metrics.observe('http_request_db_seconds', state['query_seconds'], endpoint=endpoint)
+
+        if self.profiler is not None:
+            path = self.profiler.finish_request(f"{method} {endpoint}", seconds)
+            if path is not None:
+                logger.warning(f"Slow request {method} {request.path} took {seconds * 1000:.0f}ms "
+                               f"({state['queries']} SQL statements, {state['query_seconds'] * 1000:.0f}ms); "
+                               f"profile written to {path}")
+        return response
+
+    def _teardown_request(self, exc):
+        # Requests that never reached after_request still have to stop being sampled
+        if _request_state.get() is not None:
+            _request_state.set(None)
+            if self.profiler is not None:
+                self.profiler.finish_request('', 0.0)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the execution context, so a statement that raises leaves nothing behind
+    if context is not None:
+        context._instrumentation_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_instrumentation_started', None)
+    if started is None:
+        return
+    seconds = time.perf_counter() - started
+    # Every labelled operation is six letters long
+    operation = statement.lstrip()[:6].upper()
+    metrics.observe('db_query_duration_seconds', seconds,
+                    operation=operation if operation in SQL_OPERATIONS else 'other')
+    state = _request_state.get()
+    if state is not None:
+        state['queries'] += 1
+        state['query_seconds'] += seconds
@@ -0,0 +1,275 @@
+import logging
+import os
+import queue
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta, timezone
+
+from database import db, Job
+from metrics import metrics, record_stage, run_instrumented
+
+logger = logging.getLogger(__name__)
+
+JOB_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600)
+
+metrics.histogram('job_duration_seconds', 'Seconds from a job being submitted to a worker to its completion',
+                  ('kind', 'status'), buckets=JOB_BUCKETS)
+metrics.histogram('job_stage_seconds', 'Seconds a job spent in each processing stage', ('kind', 'stage'),
+                  buckets=JOB_BUCKETS)
+
+
+class JobQueue:
+    """
+    Local background job queue backed by the application's own database.
+
+    Jobs are rows in the ``jobs`` table, so no outside broker is needed. A
+    dispatcher thread claims queued rows, runs their handler in a process
+    pool and writes the outcome back through the handler's completion hook.
+
+    Usage:
+        job_queue = JobQueue()
+        job_queue.init_app(app)
+        job_queue.register('flashcards', handler, on_complete=hook)
+        job = job_queue.enqueue('flashcards', {'file_path': path}, user_id=1)
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._handlers = {}
+        self._executor = None
+        self._dispatcher = None
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._done = queue.Queue()
+        self._in_flight = 0
+        self._running = set()
+        self._owner = None
+        self._last_heartbeat = 0.0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Bind the queue to a Flask application and read its settings.
+
+        :param app: Flask application instance
+        """
+        app.config.setdefault('JOB_WORKERS', max(1, (os.cpu_count() or 1) // 4))
+        app.config.setdefault('JOB_POLL_INTERVAL', 1.0)
+        # A running job's dispatcher renews its lease every JOB_HEARTBEAT_INTERVAL seconds;
+        # jobs whose lease is older than JOB_LEASE_TIMEOUT belonged to a process that died
+        app.config.setdefault('JOB_HEARTBEAT_INTERVAL', 30)
+        app.config.setdefault('JOB_LEASE_TIMEOUT', timedelta(minutes=5))
+        # Processes that only queue jobs (e.g. CLI commands) leave them to the server's dispatcher
+        app.config.setdefault('JOB_AUTOSTART', True)
+        self.app = app
+        app.extensions['job_queue'] = self
+        app.before_request(self._autostart)
+
+    def register(self, kind, handler, on_complete=None):
+        """
+        Register a handler for a kind of job.
+
+        :param kind: Name stored in ``Job.kind``
+        :param handler: Picklable top-level function run in a worker process
+            with the job payload as keyword arguments
+        :param on_complete: Optional function ``(job, result)`` called in the
+            dispatcher thread, inside an app context, when the handler returns
+        """
+        self._handlers[kind] = (handler, on_complete)
+
+    def enqueue(self, kind, payload, user_id, subject_id=None):
+        """
+        Add a job to the queue and wake the dispatcher.
+
+        The job is added to the current session and committed by the caller,
+        so it is only visible to the dispatcher once the surrounding request
+        has committed.
+
+        :return: The new Job instance
+        """
+        if kind not in self._handlers:
+            raise ValueError(f"No handler registered for job kind: {kind}")
+
+        job = Job(
+            id=uuid.uuid4().hex,
+            kind=kind,
+            status='queued',
+            payload=payload,
+            user_id=user_id,
+            subject_id=subject_id
+        )
+        db.session.add(job)
+        if self.app.config['JOB_AUTOSTART']:
+            self.start()
+        return job
+
+    def _autostart(self):
+        # A serving process starts its dispatcher by its first request at the latest, so jobs
+        # queued before a restart or by the CLI don't wait for this process to enqueue one.
+        # Servers that know when they have booted (see gunicorn.conf.py) start it earlier.
+        if self._dispatcher is None and not self._stopping.is_set() and self.app.config['JOB_AUTOSTART']:
+            self.start()
+
+    def notify(self):
+        """Wake the dispatcher after a commit instead of waiting for the next poll."""
+        self._wakeup.set()
+
+    def start(self):
+        """Start the worker pool and dispatcher thread if they are not running yet."""
+        with self._lock:
+            if self._dispatcher is not None and self._dispatcher.is_alive():
+                return
+            self._stopping.clear()
+            # Set here rather than in __init__ so a forked server worker gets its own pid
+            self._owner = f"{socket.gethostname()}:{os.getpid()}"
+            self._executor = ProcessPoolExecutor(max_workers=self.app.config['JOB_WORKERS'])
+            self._dispatcher = threading.Thread(target=self._run, name='job-dispatcher', daemon=True)
+            self._dispatcher.start()
+
+    def shutdown(self, wait=True):
+        """Stop the dispatcher and the worker pool."""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._dispatcher is not None:
+            self._dispatcher.join()
+            self._dispatcher = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+    def _run(self):
+        with self.app.app_context():
+            while not self._stopping.is_set():
+                try:
+                    self._drain_done()
+                    self._heartbeat()
+                    self._claim_and_submit()
+                except Exception:
+                    logger.exception("Job dispatcher iteration failed")
+                    db.session.rollback()
+                finally:
+                    db.session.remove()
+                self._wakeup.wait(self.app.config['JOB_POLL_INTERVAL'])
+                self._wakeup.clear()
+            self._drain_done()
+
+    def _heartbeat(self):
+        if time.monotonic() - self._last_heartbeat < self.app.config['JOB_HEARTBEAT_INTERVAL']:
+            return
+        now = datetime.now(timezone.utc)
+        if self._running:
+            Job.query.filter(
+                Job.id.in_(self._running), Job.status == 'running', Job.owner == self._owner
+            ).update({'heartbeat_at': now}, synchronize_session=False)
+        # Jobs left "running" by a process that died have stopped renewing their lease
+        # and are picked up again; jobs of live dispatchers are never touched
+        Job.query.filter(
+            Job.status == 'running', Job.heartbeat_at < now - self.app.config['JOB_LEASE_TIMEOUT']
+        ).update({'status': 'queued', 'started_at': None, 'owner': None, 'heartbeat_at': None},
+                 synchronize_session=False)
+        db.session.commit()
+        self._last_heartbeat = time.monotonic()
+
+    def _claim_and_submit(self):
+        free = self.app.config['JOB_WORKERS'] - self._in_flight
+        if free <= 0:
+            return
+
+        jobs = (
+            Job.query
+            .filter_by(status='queued')
+            .order_by(Job.created_at)
+            .limit(free)
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+        now = datetime.now(timezone.utc)
+        submitted = []
+        for job in jobs:
+            # Only jobs a worker has actually accepted are marked as running
+            handler, _ = self._handlers[job.kind]
+            try:
+                future = self._submit(run_instrumented, handler, job.payload)
+            except Exception as e:
+                logger.error(f"Job {job.id} could not be submitted: {e}")
+                job.status = 'failed'
+                job.error = str(e)
+                job.finished_at = now
+                continue
+            job.status = 'running'
+            job.started_at = now
+            job.owner = self._owner
+            job.heartbeat_at = now
+            submitted.append((job.id, future))
+        db.session.commit()
+
+        for job_id, future in submitted:
+            self._in_flight += 1
+            self._running.add(job_id)
+            started = time.perf_counter()
+            future.add_done_callback(
+                lambda f, job_id=job_id, started=started: self._on_done(job_id, f, started)
+            )
+
+    def _submit(self, fn, *args):
+        # A worker that dies (e.g. killed for memory) breaks the whole pool and every later
+        # submit raises, so the pool is replaced and the submit retried once
+        try:
+            return self._executor.submit(fn, *args)
+        except BrokenProcessPool:
+            logger.warning("Job process pool is broken; starting a new one")
+            self._executor.shutdown(wait=False)
+            self._executor = ProcessPoolExecutor(max_workers=self.app.config['JOB_WORKERS'])
+            return self._executor.submit(fn, *args)
+
+    def _on_done(self, job_id, future, submitted):
+        # Runs in the executor's management thread; the DB write happens in
+        # the dispatcher so sessions are never shared between threads.
+        self._done.put((job_id, future, time.perf_counter() - submitted))
+        self._wakeup.set()
+
+    def _drain_done(self):
+        while True:
+            try:
+                job_id, future, seconds = self._done.get_nowait()
+            except queue.Empty:
+                return
+            self._in_flight -= 1
+            self._running.discard(job_id)
+            self._finish(job_id, future, seconds)
+
+    def _finish(self, job_id, future, seconds):
+        job = db.session.get(Job, job_id)
+        if job is None:
+            return
+        if job.status != 'running' or job.owner != self._owner:
+            # Our lease lapsed and another dispatcher has the job now
+            logger.warning(f"Job {job_id} finished here but is now owned by {job.owner}; result dropped")
+            db.session.rollback()
+            return
+
+        kind = job.kind
+        try:
+            result, stages = future.result()
+            # The worker's stage timings are only visible here, in the process that serves /metrics
+            for stage, stage_seconds in stages.items():
+                record_stage(stage, stage_seconds)
+                metrics.observe('job_stage_seconds', stage_seconds, kind=kind, stage=stage)
+            _, on_complete = self._handlers[job.kind]
+            job.result = on_complete(job, result) if on_complete else None
+            job.status = 'finished'
+        except Exception as e:
+            db.session.rollback()
+            job = db.session.get(Job, job_id)
+            logger.error(f"Job {job_id} failed: {e}")
+            job.status = 'failed'
+            job.error = str(e)
+        job.finished_at = datetime.now(timezone.utc)
+        db.session.commit()
+        metrics.observe('job_duration_seconds', seconds, kind=kind, status=job.status)
@@ -0,0 +1,184 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the latency histogram buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metrics:
+    """
+    In-process counters and histograms, rendered in the Prometheus text
+    exposition format.
+
+    Metrics are declared once with their label names and then updated with
+    label values as keyword arguments. Collectors add values computed at
+    scrape time (cache sizes, loaded models) without being stored here.
+    Every process has its own values; a scrape sees the process that
+    answered it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._families = {}
+        self._values = {}
+        self._collectors = []
+
+    def _declare(self, name, kind, help_text, labels, buckets=None):
+        with self._lock:
+            if name not in self._families:
+                self._families[name] = (kind, help_text, tuple(labels), buckets)
+                self._values[name] = {}
+
+    def counter(self, name, help_text, labels=()):
+        """Declares a counter (a total that only goes up)."""
+        self._declare(name, 'counter', help_text, labels)
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        """Declares a histogram with the given bucket upper bounds."""
+        self._declare(name, 'histogram', help_text, labels, tuple(sorted(buckets)))
+
+    def _key(self, name, labels):
+        return tuple([str(labels[label]) for label in self._families[name][2]])
+
+    def inc(self, name, amount=1, **labels):
+        """Adds ``amount`` to a counter."""
+        key = self._key(name, labels)
+        with self._lock:
+            values = self._values[name]
+            values[key] = values.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        """Records one observation in a histogram."""
+        key = self._key(name, labels)
+        buckets = self._families[name][3]
+        with self._lock:
+            state = self._values[name].get(key)
+            if state is None:
+                # Per-bucket counts (the last one is +Inf), then sum
+                state = self._values[name][key] = [0] * (len(buckets) + 1) + [0.0]
+            state[bisect.bisect_left(buckets, value)] += 1
+            state[-1] += value
+
+    def value(self, name, **labels):
+        """Returns the current value of a counter (0 if never incremented)."""
+        key = self._key(name, labels)
+        with self._lock:
+            return self._values[name].get(key, 0)
+
+    def counter_values(self, name):
+        """Returns a counter's values as a dictionary keyed by label-value tuples."""
+        with self._lock:
+            return dict(self._values[name])
+
+    def add_collector(self, collector):
+        """
+        Registers a function called on every render.
+
+        :param collector: Callable returning an iterable of
+            (name, kind, help text, [(labels dict, value), ...]) tuples
+        """
+        self._collectors.append(collector)
+
+    def render(self):
+        """Returns every metric in the Prometheus text format."""
+        lines = []
+        with self._lock:
+            families = [(name, family, dict(self._values[name])) for name, family in self._families.items()]
+        for name, (kind, help_text, label_names, buckets), values in families:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for key, value in sorted(values.items()):
+                if kind == 'histogram':
+                    cumulative = 0
+                    for bound, count in zip(buckets + (float('inf'),), value[:-1]):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_labels(label_names, key, [('le', _number(bound))])} "
+                                     f"{cumulative}")
+                    lines.append(f"{name}_sum{_labels(label_names, key)} {_number(value[-1])}")
+                    lines.append(f"{name}_count{_labels(label_names, key)} {cumulative}")
+                else:
+                    lines.append(f"{name}{_labels(label_names, key)} {_number(value)}")
+        for collector in self._collectors:
+            for name, kind, help_text, samples in collector():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    if value is None:
+                        continue
+                    lines.append(f"{name}{_labels(labels.keys(), labels.values())} {_number(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+metrics.counter('stage_seconds_total', 'Seconds spent in each processing stage', ('stage',))
+
+
+def record_stage(stage, seconds):
+    """Adds time spent in a processing stage (e.g. pdf_extraction, model_inference)."""
+    metrics.inc('stage_seconds_total', seconds, stage=stage)
+
+
+@contextmanager
+def timed_stage(stage):
+    """Context manager that records the time spent in its block as ``stage``."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - started)
+
+
+def timed_iter(stage, iterable):
+    """
+    Yields from ``iterable``, recording the time spent producing each item as
+    ``stage``. Time the consumer spends between items is not counted.
+    """
+    iterator = iter(iterable)
+    while True:
+        started = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            record_stage(stage, time.perf_counter() - started)
+            return
+        record_stage(stage, time.perf_counter() - started)
+        yield item
+
+
+def run_instrumented(handler, payload):
+    """
+    Runs a job handler and measures the stage time it adds.
+
+    Job handlers run in worker processes, whose metrics are never scraped;
+    the stage seconds are returned with the result so the dispatcher can
+    add them to the web process's metrics.
+
+    :param handler: Job handler
+    :param payload: Keyword arguments for the handler
+    :return: Tuple of (handler result, {stage: seconds})
+    """
+    before = metrics.counter_values('stage_seconds_total')
+    result = handler(**payload)
+    after = metrics.counter_values('stage_seconds_total')
+    stages = {key[0]: seconds - before.get(key, 0.0) for key, seconds in after.items()}
+    return result, {stage: seconds for stage, seconds in stages.items() if seconds > 0}
@@ -0,0 +1,108 @@
+"""move flashcards from subjects.flashcards JSON into a flashcards table
+
+Revision ID: 8b1e4d2f6c90
+Revises: 3f9c2b7e1a4d
+Create Date: 2026-10-18 11:40:03.512977
+
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b1e4d2f6c90'
+down_revision = '3f9c2b7e1a4d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('flashcards',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('subject_id', sa.Integer(), nullable=False),
+    sa.Column('position', sa.Integer(), nullable=False),
+    sa.Column('question', sa.Text(), nullable=False),
+    sa.Column('answer', sa.Text(), nullable=False),
+    sa.Column('completed', sa.Boolean(), nullable=False, server_default=sa.false()),
+    sa.Column('repetitions', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('ease_factor', sa.Float(), nullable=False, server_default='2.5'),
+    sa.Column('interval_days', sa.Float(), nullable=False, server_default='0'),
+    sa.Column('due_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('last_reviewed_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['subject_id'], ['subjects.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('subject_id', 'position', name='uq_flashcards_subject_id_position')
+    )
+
+    # Copy every card in one statement. Subject progress has always been a
+    # count of cards studied in order, so the first completed_flashcards
+    # cards of each subject are marked completed.
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        op.execute("""
+            INSERT INTO flashcards (subject_id, position, question, answer, completed)
+            SELECT s.id,
+                   card.ordinality - 1,
+                   COALESCE(card.value ->> 'question', ''),
+                   COALESCE(card.value ->> 'answer', ''),
+                   card.ordinality <= s.completed_flashcards
+            FROM subjects s
+            CROSS JOIN LATERAL json_array_elements(s.flashcards::json) WITH ORDINALITY AS card(value, ordinality)
+            WHERE s.flashcards IS NOT NULL AND json_typeof(s.flashcards::json) = 'array'
+        """)
+    else:
+        subjects = bind.execute(sa.text(
+            "SELECT id, flashcards, completed_flashcards FROM subjects WHERE flashcards IS NOT NULL"
+        )).fetchall()
+        flashcards = sa.table('flashcards',
+            sa.column('subject_id', sa.Integer), sa.column('position', sa.Integer),
+            sa.column('question', sa.Text), sa.column('answer', sa.Text),
+            sa.column('completed', sa.Boolean))
+        rows = []
+        for subject_id, cards, completed in subjects:
+            if isinstance(cards, str):
+                cards = json.loads(cards)
+            rows.extend({
+                'subject_id': subject_id,
+                'position': position,
+                'question': card.get('question', ''),
+                'answer': card.get('answer', ''),
+                'completed': position < completed,
+            } for position, card in enumerate(cards or []))
+        if rows:
+            op.bulk_insert(flashcards, rows)
+
+    with op.batch_alter_table('subjects', schema=None) as batch_op:
+        batch_op.drop_column('flashcards')
+
+
+def downgrade():
+    with op.batch_alter_table('subjects', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('flashcards', sa.JSON(), nullable=True))
+
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        op.execute("""
+            UPDATE subjects s
+            SET flashcards = cards.value
+            FROM (
+                SELECT subject_id,
+                       json_agg(json_build_object('question', question, 'answer', answer) ORDER BY position) AS value
+                FROM flashcards
+                GROUP BY subject_id
+            ) AS cards
+            WHERE cards.subject_id = s.id
+        """)
+    else:
+        cards = {}
+        for subject_id, question, answer in bind.execute(sa.text(
+            "SELECT subject_id, question, answer FROM flashcards ORDER BY subject_id, position"
+        )):
+            cards.setdefault(subject_id, []).append({'question': question, 'answer': answer})
+        for subject_id, value in cards.items():
+            bind.execute(sa.text("UPDATE subjects SET flashcards = :value WHERE id = :id"),
+                         {'value': json.dumps(value), 'id': subject_id})
+
+    op.drop_table('flashcards')
@@ -0,0 +1,123 @@
+"""add subject_pages and full-text search indexes
+
+Revision ID: a93d5c1f7e20
+Revises: f61b09c3d5e4
+Create Date: 2026-10-18 17:20:41.308215
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a93d5c1f7e20'
+down_revision = 'f61b09c3d5e4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('subject_pages',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('subject_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('page_number', sa.Integer(), nullable=False),
+    sa.Column('text', sa.Text(), nullable=False),
+    sa.ForeignKeyConstraint(['subject_id'], ['subjects.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('subject_id', 'page_number', name='uq_subject_pages_subject_id_page_number')
+    )
+
+    # Same statements as search_index.POSTGRES_DDL / SQLITE_DDL, which
+    # create_all runs for new databases
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        # Adding the generated columns computes the vectors of existing cards
+        op.execute("""
+            ALTER TABLE flashcards ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+                setweight(to_tsvector('english', question), 'A') ||
+                setweight(to_tsvector('english', answer), 'B')
+            ) STORED
+        """)
+        op.execute("CREATE INDEX ix_flashcards_search_vector ON flashcards USING GIN (search_vector)")
+        op.execute("""
+            ALTER TABLE subject_pages ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+                to_tsvector('english', text)
+            ) STORED
+        """)
+        op.execute("CREATE INDEX ix_subject_pages_search_vector ON subject_pages USING GIN (search_vector)")
+    elif dialect == 'sqlite':
+        op.execute("""
+            CREATE VIEW flashcards_search AS
+            SELECT id, question, answer, 'u' || user_id AS owner FROM flashcards
+        """)
+        op.execute("""
+            CREATE VIRTUAL TABLE flashcards_fts USING fts5(
+                question, answer, owner, content='flashcards_search', content_rowid='id', tokenize='porter unicode61'
+            )
+        """)
+        op.execute("""
+            CREATE TRIGGER flashcards_fts_insert AFTER INSERT ON flashcards BEGIN
+                INSERT INTO flashcards_fts (rowid, question, answer, owner)
+                VALUES (new.id, new.question, new.answer, 'u' || new.user_id);
+            END
+        """)
+        op.execute("""
+            CREATE TRIGGER flashcards_fts_delete AFTER DELETE ON flashcards BEGIN
+                INSERT INTO flashcards_fts (flashcards_fts, rowid, question, answer, owner)
+                VALUES ('delete', old.id, old.question, old.answer, 'u' || old.user_id);
+            END
+        """)
+        op.execute("""
+            CREATE TRIGGER flashcards_fts_update AFTER UPDATE OF question, answer, user_id ON flashcards BEGIN
+                INSERT INTO flashcards_fts (flashcards_fts, rowid, question, answer, owner)
+                VALUES ('delete', old.id, old.question, old.answer, 'u' || old.user_id);
+                INSERT INTO flashcards_fts (rowid, question, answer, owner)
+                VALUES (new.id, new.question, new.answer, 'u' || new.user_id);
+            END
+        """)
+        # Index the cards that already exist
+        op.execute("INSERT INTO flashcards_fts (flashcards_fts) VALUES ('rebuild')")
+        op.execute("""
+            CREATE VIEW subject_pages_search AS
+            SELECT id, text, 'u' || user_id AS owner FROM subject_pages
+        """)
+        op.execute("""
+            CREATE VIRTUAL TABLE subject_pages_fts USING fts5(
+                text, owner, content='subject_pages_search', content_rowid='id', tokenize='porter unicode61'
+            )
+        """)
+        op.execute("""
+            CREATE TRIGGER subject_pages_fts_insert AFTER INSERT ON subject_pages BEGIN
+                INSERT INTO subject_pages_fts (rowid, text, owner) VALUES (new.id, new.text, 'u' || new.user_id);
+            END
+        """)
+        op.execute("""
+            CREATE TRIGGER subject_pages_fts_delete AFTER DELETE ON subject_pages BEGIN
+                INSERT INTO subject_pages_fts (subject_pages_fts, rowid, text, owner)
+                VALUES ('delete', old.id, old.text, 'u' || old.user_id);
+            END
+        """)
+        op.execute("""
+            CREATE TRIGGER subject_pages_fts_update AFTER UPDATE OF text, user_id ON subject_pages BEGIN
+                INSERT INTO subject_pages_fts (subject_pages_fts, rowid, text, owner)
+                VALUES ('delete', old.id, old.text, 'u' || old.user_id);
+                INSERT INTO subject_pages_fts (rowid, text, owner) VALUES (new.id, new.text, 'u' || new.user_id);
+            END
+        """)
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute("DROP INDEX ix_flashcards_search_vector")
+        op.execute("ALTER TABLE flashcards DROP COLUMN search_vector")
+    elif dialect == 'sqlite':
+        for trigger in ('flashcards_fts_insert', 'flashcards_fts_delete', 'flashcards_fts_update'):
+            op.execute(f"DROP TRIGGER {trigger}")
+        op.execute("DROP TABLE flashcards_fts")
+        op.execute("DROP VIEW flashcards_search")
+        op.execute("DROP TABLE subject_pages_fts")
+        op.execute("DROP VIEW subject_pages_search")
+    op.drop_table('subject_pages')
@@ -0,0 +1,42 @@
+"""add flashcards.user_id and the (user_id, due_at) index
+
+Revision ID: c5a7e3d91b28
+Revises: 8b1e4d2f6c90
+Create Date: 2026-10-18 13:05:27.904118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5a7e3d91b28'
+down_revision = '8b1e4d2f6c90'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('flashcards', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('user_id', sa.Integer(), nullable=True))
+
+    # Copy each card's owner from its subject; cards never reviewed are due now
+    op.execute("""
+        UPDATE flashcards
+        SET user_id = (SELECT subjects.user_id FROM subjects WHERE subjects.id = flashcards.subject_id)
+    """)
+    op.execute("UPDATE flashcards SET due_at = CURRENT_TIMESTAMP WHERE due_at IS NULL")
+
+    with op.batch_alter_table('flashcards', schema=None) as batch_op:
+        batch_op.alter_column('user_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.alter_column('due_at', existing_type=sa.DateTime(timezone=True), nullable=False)
+        batch_op.create_foreign_key('flashcards_user_id_fkey', 'users', ['user_id'], ['id'])
+        batch_op.create_index('ix_flashcards_user_id_due_at', ['user_id', 'due_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('flashcards', schema=None) as batch_op:
+        batch_op.drop_index('ix_flashcards_user_id_due_at')
+        batch_op.drop_constraint('flashcards_user_id_fkey', type_='foreignkey')
+        batch_op.alter_column('due_at', existing_type=sa.DateTime(timezone=True), nullable=True)
+        batch_op.drop_column('user_id')
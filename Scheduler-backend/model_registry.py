@@ -0,0 +1,161 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class ModelRegistry:
+    """
+    Process-wide registry of lazily loaded models.
+
+    A model is registered with a loader function and only loaded the first
+    time it is requested, so importing a module that uses a model costs
+    nothing. Every thread gets the same loaded instance. Models can be warmed
+    up in the background and are unloaded after sitting idle for
+    ``idle_timeout`` seconds once the reaper is running.
+
+    Usage:
+        registry.register('t5_qa', load_t5_qa, close=lambda g: g.close())
+        generator = registry.get('t5_qa')
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._reaper = None
+        self._stop_reaper = threading.Event()
+
+    def register(self, name, loader, close=None):
+        """
+        Registers a model under a name without loading it.
+
+        :param name: Name used to look the model up
+        :param loader: Function with no arguments that returns the loaded model
+        :param close: Optional function called with the model when it is unloaded
+        """
+        with self._lock:
+            if name in self._entries:
+                return
+            self._entries[name] = {
+                'loader': loader,
+                'close': close,
+                'model': None,
+                'lock': threading.Lock(),
+                'last_used': 0.0,
+                'load_seconds': None,
+            }
+
+    def get(self, name):
+        """
+        Returns the loaded model, loading it first if necessary.
+
+        Concurrent first calls wait for a single load instead of each loading
+        their own copy.
+
+        :param name: Registered model name
+        :return: The loaded model
+        """
+        entry = self._entries[name]
+        model = entry['model']
+        if model is None:
+            with entry['lock']:
+                model = entry['model']
+                if model is None:
+                    started = time.perf_counter()
+                    model = entry['loader']()
+                    entry['load_seconds'] = time.perf_counter() - started
+                    entry['model'] = model
+                    logger.info(f"Loaded model {name} in {entry['load_seconds']:.2f}s")
+        entry['last_used'] = time.monotonic()
+        return model
+
+    def is_loaded(self, name):
+        """Returns True if the model is currently in memory."""
+        return self._entries[name]['model'] is not None
+
+    def warm_up(self, *names):
+        """
+        Loads models in a background thread so the first request doesn't wait.
+
+        :param names: Registered model names; all models if none are given
+        :return: The started thread
+        """
+        names = names or tuple(self._entries)
+
+        def load():
+            for name in names:
+                try:
+                    self.get(name)
+                except Exception:
+                    logger.exception(f"Failed to warm up model {name}")
+
+        thread = threading.Thread(target=load, name='model-warmup', daemon=True)
+        thread.start()
+        return thread
+
+    def unload(self, name):
+        """Drops the loaded model so its memory can be reclaimed."""
+        entry = self._entries[name]
+        with entry['lock']:
+            model, entry['model'] = entry['model'], None
+        if model is not None:
+            if entry['close'] is not None:
+                entry['close'](model)
+            logger.info(f"Unloaded model {name}")
+
+    def unload_idle(self, idle_timeout):
+        """Unloads every model that hasn't been used for ``idle_timeout`` seconds."""
+        now = time.monotonic()
+        for name, entry in list(self._entries.items()):
+            if entry['model'] is not None and now - entry['last_used'] > idle_timeout:
+                self.unload(name)
+
+    def start_reaper(self, idle_timeout, interval=None):
+        """
+        Starts a background thread that periodically unloads idle models.
+
+        :param idle_timeout: Seconds a model may go unused before it is unloaded
+        :param interval: Seconds between checks; defaults to a quarter of the timeout
+        """
+        interval = interval or max(idle_timeout / 4, 1)
+        with self._lock:
+            if self._reaper is not None and self._reaper.is_alive():
+                return
+            self._stop_reaper.clear()
+
+            def reap():
+                while not self._stop_reaper.wait(interval):
+                    self.unload_idle(idle_timeout)
+
+            self._reaper = threading.Thread(target=reap, name='model-reaper', daemon=True)
+            self._reaper.start()
+
+    def stop_reaper(self):
+        """Stops the idle-model reaper thread."""
+        self._stop_reaper.set()
+
+    def peek(self, name):
+        """
+        Returns a model if it is loaded, without loading it or counting as a use.
+
+        :param name: Registered model name
+        :return: The model, or None
+        """
+        entry = self._entries.get(name)
+        return entry['model'] if entry is not None else None
+
+    def stats(self):
+        """Returns per-model load state, load time and seconds since last use."""
+        now = time.monotonic()
+        return {
+            name: {
+                'loaded': entry['model'] is not None,
+                'load_seconds': entry['load_seconds'],
+                'idle_seconds': now - entry['last_used'] if entry['model'] is not None else None,
+            }
+            for name, entry in self._entries.items()
+        }
+
+
+registry = ModelRegistry()
@@ -0,0 +1,99 @@
+import json
+import os
+
+import numpy as np
+
+
+class OnnxSeq2SeqGenerator:
+    """
+    Greedy T5 generation with ONNX Runtime, using the graphs written by
+    ``t5_qa_trainer/export.py``.
+
+    The model is split into three graphs: the encoder, a first decoder step
+    that also returns the cross-attention keys/values, and a decoder step
+    that takes the self- and cross-attention cache and returns only the new
+    self-attention entries. The encoder runs once per batch and every
+    decoding step only processes the newest token.
+
+    The object stands in for the PyTorch model in ``BatchedGenerator``: it
+    takes NumPy inputs (``tensor_type``) and ``generate`` returns token ids
+    that start with the decoder start token, like ``transformers`` does.
+
+    Args:
+        model_dir (str): Export directory containing onnx_config.json.
+        num_threads (int): ONNX Runtime intra-op threads; None lets it decide.
+    """
+
+    tensor_type = "np"
+
+    def __init__(self, model_dir, num_threads=None):
+        import onnxruntime as ort
+
+        with open(os.path.join(model_dir, "onnx_config.json")) as f:
+            self.config = json.load(f)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+
+        def session(name):
+            path = os.path.join(model_dir, self.config["files"][name])
+            return ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+
+        self.encoder = session("encoder")
+        self.decoder_init = session("decoder_init")
+        self.decoder = session("decoder")
+        self.num_layers = self.config["num_layers"]
+        # Graph inputs the exporter kept (unused inputs are pruned from the graph)
+        self._decoder_inputs = {i.name for i in self.decoder.get_inputs()}
+
+    def generate(self, input_ids, attention_mask, max_length=128, **kwargs):
+        """
+        Generates output token ids greedily.
+
+        :param input_ids: int64 array of shape (batch, input length)
+        :param attention_mask: int64 array of the same shape
+        :param max_length: Longest output, decoder start token included
+        :return: int64 array of shape (batch, output length)
+        """
+        input_ids = np.asarray(input_ids, dtype=np.int64)
+        attention_mask = np.asarray(attention_mask, dtype=np.int64)
+        batch_size = input_ids.shape[0]
+        pad_token_id = self.config["pad_token_id"]
+        eos_token_id = self.config["eos_token_id"]
+
+        hidden = self.encoder.run(None, {"input_ids": input_ids, "attention_mask": attention_mask})[0]
+
+        tokens = np.full((batch_size, 1), self.config["decoder_start_token_id"], dtype=np.int64)
+        logits, *present = self.decoder_init.run(None, {
+            "decoder_input_ids": tokens,
+            "encoder_attention_mask": attention_mask,
+            "encoder_hidden_states": hidden,
+        })
+        # present holds (self key, self value, cross key, cross value) per layer;
+        # the cross-attention entries never change, so they are kept as they are
+        self_cache = [t for i, t in enumerate(present) if i % 4 < 2]
+        cross_cache = [t for i, t in enumerate(present) if i % 4 >= 2]
+
+        finished = np.zeros(batch_size, dtype=bool)
+        while True:
+            next_tokens = logits[:, -1].argmax(axis=-1)
+            next_tokens = np.where(finished, pad_token_id, next_tokens)
+            tokens = np.concatenate([tokens, next_tokens[:, None]], axis=1)
+            finished |= next_tokens == eos_token_id
+            if finished.all() or tokens.shape[1] >= max_length:
+                return tokens
+
+            feed = {
+                "decoder_input_ids": next_tokens[:, None],
+                "encoder_attention_mask": attention_mask,
+                "encoder_hidden_states": hidden,
+            }
+            for layer in range(self.num_layers):
+                feed[f"past.{layer}.self_key"] = self_cache[2 * layer]
+                feed[f"past.{layer}.self_value"] = self_cache[2 * layer + 1]
+                feed[f"past.{layer}.cross_key"] = cross_cache[2 * layer]
+                feed[f"past.{layer}.cross_value"] = cross_cache[2 * layer + 1]
+            feed = {name: value for name, value in feed.items() if name in self._decoder_inputs}
+            logits, *self_cache = self.decoder.run(None, feed)
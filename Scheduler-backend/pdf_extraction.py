@@ -0,0 +1,128 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import PyPDF2
+
+from extraction_cache import get_cache
+from metrics import timed_iter
+
+# Pages handed to a worker at a time; small enough to keep each result short,
+# large enough that reopening the PDF in the worker is amortised.
+DEFAULT_CHUNK_PAGES = 8
+
+# Page text is held for the cache only up to this many characters; longer
+# documents are streamed without being cached, so memory stays bounded.
+MAX_CACHED_PAGE_CHARS = 16 * 1024 * 1024
+
+
+def count_pages(file_path):
+    """
+    Returns the number of pages in a PDF without extracting any text.
+
+    :param file_path: Path to the PDF file
+    :return: Integer page count
+    """
+    with open(file_path, 'rb') as file:
+        return len(PyPDF2.PdfReader(file).pages)
+
+
+def extract_page_range(file_path, start, stop):
+    """
+    Extracts the text of pages ``start`` (inclusive) to ``stop`` (exclusive).
+
+    Runs inside a worker process, so it opens its own reader.
+
+    :param file_path: Path to the PDF file
+    :param start: First page index
+    :param stop: Page index to stop before
+    :return: List of page texts, in page order
+    """
+    with open(file_path, 'rb') as file:
+        pdf_reader = PyPDF2.PdfReader(file)
+        return [pdf_reader.pages[i].extract_text() or '' for i in range(start, stop)]
+
+
+def iter_page_text_cached(file_path, content_hash, workers=None, chunk_pages=DEFAULT_CHUNK_PAGES):
+    """
+    Like ``iter_page_text`` but reuses page text cached under the file's hash.
+
+    On a miss the pages are extracted, streamed to the caller and stored in
+    the extraction cache once the whole document has been read, unless their
+    text exceeds ``MAX_CACHED_PAGE_CHARS``.
+
+    :param file_path: Path to the PDF file
+    :param content_hash: SHA-256 hex digest of the file's bytes
+    :param workers: Number of worker processes (defaults to the CPU count)
+    :param chunk_pages: Number of pages extracted per task
+    :return: Generator of page text strings
+    """
+    cache = get_cache()
+    pages = cache.get('pages', content_hash)
+    if pages is not None:
+        yield from pages
+        return
+
+    pages = []
+    size = 0
+    for text in iter_page_text(file_path, workers=workers, chunk_pages=chunk_pages):
+        if pages is not None:
+            size += len(text)
+            if size > MAX_CACHED_PAGE_CHARS:
+                pages = None
+            else:
+                pages.append(text)
+        yield text
+    if pages is not None:
+        cache.set('pages', content_hash, pages)
+
+
+def iter_page_text(file_path, workers=None, chunk_pages=DEFAULT_CHUNK_PAGES):
+    """
+    Yields the text of every page of a PDF, in page order.
+
+    The page range is split into chunks that are extracted in a process pool.
+    At most ``2 * workers`` chunks are in flight at once and each chunk is
+    released as soon as it has been yielded, so memory stays bounded by the
+    chunk size rather than the document size.
+
+    :param file_path: Path to the PDF file
+    :param workers: Number of worker processes (defaults to the CPU count)
+    :param chunk_pages: Number of pages extracted per task
+    :return: Generator of page text strings
+    """
+    # Only the time spent waiting for pages counts as extraction, not the consumer's work
+    return timed_iter('pdf_extraction', _iter_page_text(file_path, workers, chunk_pages))
+
+
+def _iter_page_text(file_path, workers, chunk_pages):
+    workers = workers or os.cpu_count() or 1
+    total = count_pages(file_path)
+    ranges = [(start, min(start + chunk_pages, total)) for start in range(0, total, chunk_pages)]
+
+    # Not worth starting processes for a short document
+    if workers == 1 or len(ranges) <= 1:
+        for start, stop in ranges:
+            yield from extract_page_range(file_path, start, stop)
+        return
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(ranges))) as executor:
+        pending = deque()
+        next_range = iter(ranges)
+        for start, stop in next_range:
+            pending.append(executor.submit(extract_page_range, file_path, start, stop))
+            if len(pending) >= 2 * workers:
+                break
+
+        try:
+            while pending:
+                pages = pending.popleft().result()
+                for start, stop in next_range:
+                    pending.append(executor.submit(extract_page_range, file_path, start, stop))
+                    break
+                yield from pages
+                del pages
+        finally:
+            # The consumer may stop early; don't extract pages nobody will read
+            for future in pending:
+                future.cancel()
@@ -57,11 +57,12 @@ def populate_user_data():
                 total_flashcards=len(subject_data["flashcards"]),
                 completed_flashcards=0,
                 progress=0,
-                flashcards=subject_data["flashcards"],
                 created_at=datetime.now(timezone.utc),
                 updated_at=datetime.now(timezone.utc)
             )
             db.session.add(subject)
+            db.session.flush()
+            subject.add_cards(subject_data["flashcards"])
 
         db.session.commit()
         print("User data populated successfully!")
@@ -0,0 +1,210 @@
+import re
+
+from sqlalchemy import DDL, event, text
+
+from database import db, Flashcard, SubjectPage
+
+# Text search configuration used for stemming and stop words on PostgreSQL
+SEARCH_CONFIG = 'english'
+
+# PostgreSQL: generated tsvector columns with GIN indexes. The vectors are
+# computed by the database on every INSERT/UPDATE, so new cards and pages are
+# searchable as soon as their transaction commits.
+POSTGRES_DDL = {
+    'flashcards': [
+        f"""ALTER TABLE flashcards ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+            setweight(to_tsvector('{SEARCH_CONFIG}', question), 'A') ||
+            setweight(to_tsvector('{SEARCH_CONFIG}', answer), 'B')
+        ) STORED""",
+        "CREATE INDEX IF NOT EXISTS ix_flashcards_search_vector ON flashcards USING GIN (search_vector)",
+    ],
+    'subject_pages': [
+        f"""ALTER TABLE subject_pages ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+            to_tsvector('{SEARCH_CONFIG}', text)
+        ) STORED""",
+        "CREATE INDEX IF NOT EXISTS ix_subject_pages_search_vector ON subject_pages USING GIN (search_vector)",
+    ],
+}
+
+# SQLite (local testing): external-content FTS5 tables kept in step with
+# their source tables by triggers. Each row also indexes an "owner" token
+# (u<user_id>), so the per-user filter is part of the full-text match rather
+# than a filter over every user's matches. The content tables are views that
+# add the token, for snippet() to read the indexed text back.
+SQLITE_DDL = {
+    'flashcards': [
+        """CREATE VIEW IF NOT EXISTS flashcards_search AS
+            SELECT id, question, answer, 'u' || user_id AS owner FROM flashcards""",
+        """CREATE VIRTUAL TABLE IF NOT EXISTS flashcards_fts USING fts5(
+            question, answer, owner, content='flashcards_search', content_rowid='id', tokenize='porter unicode61'
+        )""",
+        """CREATE TRIGGER IF NOT EXISTS flashcards_fts_insert AFTER INSERT ON flashcards BEGIN
+            INSERT INTO flashcards_fts (rowid, question, answer, owner)
+            VALUES (new.id, new.question, new.answer, 'u' || new.user_id);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS flashcards_fts_delete AFTER DELETE ON flashcards BEGIN
+            INSERT INTO flashcards_fts (flashcards_fts, rowid, question, answer, owner)
+            VALUES ('delete', old.id, old.question, old.answer, 'u' || old.user_id);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS flashcards_fts_update AFTER UPDATE OF question, answer, user_id ON flashcards
+        BEGIN
+            INSERT INTO flashcards_fts (flashcards_fts, rowid, question, answer, owner)
+            VALUES ('delete', old.id, old.question, old.answer, 'u' || old.user_id);
+            INSERT INTO flashcards_fts (rowid, question, answer, owner)
+            VALUES (new.id, new.question, new.answer, 'u' || new.user_id);
+        END""",
+    ],
+    'subject_pages': [
+        """CREATE VIEW IF NOT EXISTS subject_pages_search AS
+            SELECT id, text, 'u' || user_id AS owner FROM subject_pages""",
+        """CREATE VIRTUAL TABLE IF NOT EXISTS subject_pages_fts USING fts5(
+            text, owner, content='subject_pages_search', content_rowid='id', tokenize='porter unicode61'
+        )""",
+        """CREATE TRIGGER IF NOT EXISTS subject_pages_fts_insert AFTER INSERT ON subject_pages BEGIN
+            INSERT INTO subject_pages_fts (rowid, text, owner) VALUES (new.id, new.text, 'u' || new.user_id);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS subject_pages_fts_delete AFTER DELETE ON subject_pages BEGIN
+            INSERT INTO subject_pages_fts (subject_pages_fts, rowid, text, owner)
+            VALUES ('delete', old.id, old.text, 'u' || old.user_id);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS subject_pages_fts_update AFTER UPDATE OF text, user_id ON subject_pages BEGIN
+            INSERT INTO subject_pages_fts (subject_pages_fts, rowid, text, owner)
+            VALUES ('delete', old.id, old.text, 'u' || old.user_id);
+            INSERT INTO subject_pages_fts (rowid, text, owner) VALUES (new.id, new.text, 'u' || new.user_id);
+        END""",
+    ],
+}
+
+# The search DDL runs whenever create_all creates the tables; databases
+# managed by migrations get it from the add_full_text_search revision
+for table in (Flashcard.__table__, SubjectPage.__table__):
+    for statement in POSTGRES_DDL[table.name]:
+        event.listen(table, 'after_create', DDL(statement).execute_if(dialect='postgresql'))
+    for statement in SQLITE_DDL[table.name]:
+        event.listen(table, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+
+KINDS = ('card', 'page')
+
+_WORD = re.compile(r'\w+')
+
+_POSTGRES_HITS = {
+    'card': """
+        SELECT 'card' AS kind, f.id, f.subject_id, f.position, ts_rank(f.search_vector, q.query) AS score
+        FROM flashcards f, q
+        WHERE f.search_vector @@ q.query AND f.user_id = :user_id {subject_filter}
+    """,
+    'page': """
+        SELECT 'page' AS kind, p.id, p.subject_id, p.page_number AS position,
+               ts_rank(p.search_vector, q.query) AS score
+        FROM subject_pages p, q
+        WHERE p.search_vector @@ q.query AND p.user_id = :user_id {subject_filter}
+    """,
+}
+
+# ts_headline re-parses the document, so it only runs for the returned page of hits
+_POSTGRES_SEARCH = f"""
+    WITH q AS (SELECT websearch_to_tsquery('{SEARCH_CONFIG}', :query) AS query),
+    hits AS (
+        {{hits}}
+        ORDER BY score DESC, kind, id
+        LIMIT :limit OFFSET :offset
+    )
+    SELECT hits.kind, hits.id, hits.subject_id, hits.position, hits.score, f.question, f.answer,
+           ts_headline('{SEARCH_CONFIG}', COALESCE(f.question || ' ' || f.answer, p.text), q.query,
+                       'MaxFragments=1, MaxWords=30, MinWords=10') AS snippet
+    FROM hits
+    CROSS JOIN q
+    LEFT JOIN flashcards f ON hits.kind = 'card' AND f.id = hits.id
+    LEFT JOIN subject_pages p ON hits.kind = 'page' AND p.id = hits.id
+    ORDER BY hits.score DESC, hits.kind, hits.id
+"""
+
+# bm25() is lower-is-better, so it is negated to rank like ts_rank
+_SQLITE_HITS = {
+    'card': """
+        SELECT 'card' AS kind, f.id AS id, f.subject_id AS subject_id, f.position AS position,
+               -bm25(flashcards_fts, 2.0, 1.0, 0.0) AS score, f.question AS question, f.answer AS answer,
+               highlight(flashcards_fts, 0, '<b>', '</b>') || ' ' ||
+               highlight(flashcards_fts, 1, '<b>', '</b>') AS snippet
+        FROM flashcards_fts JOIN flashcards f ON f.id = flashcards_fts.rowid
+        WHERE flashcards_fts MATCH :query {subject_filter}
+    """,
+    'page': """
+        SELECT 'page' AS kind, p.id AS id, p.subject_id AS subject_id, p.page_number AS position,
+               -bm25(subject_pages_fts, 1.0, 0.0) AS score, NULL AS question, NULL AS answer,
+               snippet(subject_pages_fts, 0, '<b>', '</b>', '...', 30) AS snippet
+        FROM subject_pages_fts JOIN subject_pages p ON p.id = subject_pages_fts.rowid
+        WHERE subject_pages_fts MATCH :query {subject_filter}
+    """,
+}
+
+
+def fts5_query(user_id, query):
+    """
+    Turns free text into an FTS5 query matching a user's documents that
+    contain every word, or returns None if the text has no words.
+
+    The user is matched on the owner column and the words on every other
+    column. Each word is quoted, so operators and punctuation in user input
+    are never parsed as FTS5 syntax.
+    """
+    words = _WORD.findall(query)
+    if not words:
+        return None
+    terms = ' '.join(f'"{word}"' for word in words)
+    return f'owner : "u{int(user_id)}" AND - owner : ({terms})'
+
+
+def search_content(user_id, query, kinds=KINDS, subject_id=None, limit=20, offset=0):
+    """
+    Ranked full-text search over a user's flashcards and page text.
+
+    On PostgreSQL the query is parsed with ``websearch_to_tsquery`` (quoted
+    phrases, ``or`` and ``-word`` work), matched through the GIN indexes and
+    ranked with ``ts_rank``; question words weigh more than answer words.
+    On SQLite every word must match and results are ranked with BM25.
+
+    :param user_id: Owner whose cards and pages are searched
+    :param query: Search text
+    :param kinds: Any of "card" and "page"
+    :param subject_id: Restrict the search to one subject
+    :param limit: Maximum number of results
+    :param offset: Number of results to skip
+    :return: List of result dictionaries, best match first
+    """
+    params = {'user_id': user_id, 'limit': limit, 'offset': offset}
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        params['query'] = query
+        hits, template = _POSTGRES_HITS, _POSTGRES_SEARCH
+    elif dialect == 'sqlite':
+        params['query'] = fts5_query(user_id, query)
+        if params['query'] is None:
+            return []
+        hits = _SQLITE_HITS
+        template = "SELECT * FROM ({hits}) ORDER BY score DESC, kind, id LIMIT :limit OFFSET :offset"
+    else:
+        raise RuntimeError(f"Full-text search is not supported on {dialect}")
+
+    if subject_id is not None:
+        params['subject_id'] = subject_id
+    parts = []
+    for kind in kinds:
+        alias = 'f' if kind == 'card' else 'p'
+        subject_filter = f"AND {alias}.subject_id = :subject_id" if subject_id is not None else ''
+        parts.append(hits[kind].format(subject_filter=subject_filter))
+    sql = template.format(hits=' UNION ALL '.join(parts))
+
+    results = []
+    for row in db.session.execute(text(sql), params).mappings():
+        result = {
+            'kind': row['kind'],
+            'subject_id': row['subject_id'],
+            'position': row['position'],
+            'score': float(row['score']),
+            'snippet': row['snippet'],
+        }
+        if row['kind'] == 'card':
+            result.update(id=row['id'], question=row['question'], answer=row['answer'])
+        results.append(result)
+    return results
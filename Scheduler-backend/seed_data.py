@@ -0,0 +1,166 @@
+import csv
+import itertools
+import math
+import random
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func, insert
+from werkzeug.security import generate_password_hash
+
+from database import db, Flashcard, Subject, User
+from study_planner import DAYS_OF_WEEK
+
+# Spread (sigma of the underlying normal) of the lognormal size distributions:
+# most users, subjects and cards are near the mean, a few are several times larger
+SIZE_SIGMA = 0.6
+
+# Users whose rows are built and committed together, which bounds memory
+USERS_PER_BATCH = 200
+
+# Rows per executemany INSERT of flashcards
+CARDS_PER_INSERT = 10000
+
+
+def lognormal_count(rng, mean, sigma=SIZE_SIGMA, minimum=1):
+    """
+    Draws a positive integer from a lognormal distribution with the given mean.
+
+    :param rng: random.Random instance
+    :param mean: Mean of the distribution
+    :param sigma: Spread of the underlying normal distribution
+    :param minimum: Smallest value returned
+    :return: Integer of at least ``minimum``
+    """
+    if mean <= 0:
+        return 0
+    # E[lognormal] = exp(mu + sigma^2 / 2)
+    mu = math.log(mean) - sigma ** 2 / 2
+    return max(minimum, round(rng.lognormvariate(mu, sigma)))
+
+
+class TextGenerator:
+    """
+    Sentences of pseudo-words whose frequencies follow Zipf's law, so some
+    words are common to most cards and most are rare, as in real notes.
+
+    Args:
+        rng (random.Random): Source of randomness.
+        vocabulary (int): Number of distinct words.
+    """
+
+    def __init__(self, rng, vocabulary=20000):
+        self.rng = rng
+        syllables = ['ka', 'lo', 'mi', 'ne', 'ra', 'su', 'ti', 'vo', 'ze', 'an', 'el', 'or']
+        self.words = [
+            ''.join(rng.choice(syllables) for _ in range(rng.randint(1, 4))) + str(i % 97)
+            for i in range(vocabulary)
+        ]
+        self._cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(vocabulary)))
+        self._pool = []
+
+    def sentence(self, mean_words):
+        """Returns a capitalised sentence of about ``mean_words`` words (no final punctuation)."""
+        count = lognormal_count(self.rng, mean_words, sigma=0.4)
+        if len(self._pool) < count:
+            # Words are drawn in large batches, which is much faster than one choices() call per sentence
+            self._pool = self.rng.choices(self.words, cum_weights=self._cum_weights, k=100000)
+        words = self._pool[-count:]
+        del self._pool[-count:]
+        return ' '.join(words).capitalize()
+
+
+def seed_users(users, subjects=5, cards=200, password='loadtest', email_prefix='loadtest', seed=0,
+               progress=None):
+    """
+    Inserts synthetic users, each with a lognormally distributed number of
+    subjects around ``subjects`` and cards per subject around ``cards``.
+
+    Part of each subject has been studied: its first cards are completed
+    and due over the coming weeks, the rest are due now, and the subject's
+    progress columns agree with its cards. Rows are written with executemany
+    INSERTs and committed every USERS_PER_BATCH users. Every user gets the
+    same password, hashed once.
+
+    :param users: Number of users to create
+    :param subjects: Mean number of subjects per user
+    :param cards: Mean number of cards per subject
+    :param password: Password of every seeded user
+    :param email_prefix: Emails are ``<prefix><n>@example.com``, numbered above the largest user id
+    :param seed: Seed for the random sizes and text
+    :param progress: Optional callable ``(users done, users)`` called after each batch
+    :return: Dictionary with the (user id, email) pairs created and the numbers of subjects and cards
+    """
+    rng = random.Random(seed)
+    text = TextGenerator(rng)
+    password_hash = generate_password_hash(password)
+    now = datetime.now(timezone.utc)
+    created, subject_count, card_count = [], 0, 0
+
+    for start in range(0, users, USERS_PER_BATCH):
+        count = min(USERS_PER_BATCH, users - start)
+        # Emails are made unique by a running number above every existing id
+        first = (db.session.query(func.max(User.id)).scalar() or 0) + 1
+        emails = [f"{email_prefix}{first + i}@example.com" for i in range(count)]
+        user_ids = db.session.scalars(insert(User).returning(User.id, sort_by_parameter_order=True), [
+            {'name': f"Load Test {first + i}", 'email': email, 'password': password_hash,
+             'study_hours': rng.randint(1, 6), 'study_time': f"{rng.randint(7, 21):02d}:00"}
+            for i, email in enumerate(emails)
+        ]).all()
+        created.extend(zip(user_ids, emails))
+
+        subject_rows, subject_cards = [], []
+        for user_id in user_ids:
+            for _ in range(lognormal_count(rng, subjects)):
+                total = lognormal_count(rng, cards)
+                completed = int(total * rng.random() ** 2)
+                subject_rows.append({
+                    'name': text.sentence(3)[:100], 'allocated_day': rng.choice(DAYS_OF_WEEK),
+                    'deadline': (now + timedelta(days=rng.randint(7, 120))).date() if rng.random() < 0.5 else None,
+                    'user_id': user_id, 'total_flashcards': total, 'completed_flashcards': completed,
+                    'progress': int(100 * completed / total),
+                })
+                subject_cards.append((user_id, total, completed))
+        subject_ids = db.session.scalars(
+            insert(Subject).returning(Subject.id, sort_by_parameter_order=True), subject_rows
+        ).all() if subject_rows else []
+
+        rows = []
+        for subject_id, (user_id, total, completed) in zip(subject_ids, subject_cards):
+            for position in range(total):
+                studied = position < completed
+                repetitions = rng.randint(1, 6) if studied else 0
+                rows.append({
+                    'subject_id': subject_id, 'user_id': user_id, 'position': position,
+                    'question': text.sentence(10) + '?', 'answer': text.sentence(18) + '.',
+                    'completed': studied, 'repetitions': repetitions,
+                    'ease_factor': round(rng.uniform(1.3, 2.8), 2) if studied else 2.5,
+                    'interval_days': float(rng.randint(1, 30)) if studied else 0.0,
+                    'due_at': now + timedelta(hours=rng.randint(-48, 24 * 30)) if studied else now,
+                    'last_reviewed_at': now - timedelta(days=rng.randint(0, 30)) if studied else None,
+                })
+                if len(rows) >= CARDS_PER_INSERT:
+                    db.session.execute(Flashcard.__table__.insert(), rows)
+                    rows = []
+        if rows:
+            db.session.execute(Flashcard.__table__.insert(), rows)
+        db.session.commit()
+        subject_count += len(subject_ids)
+        card_count += sum(total for _, total, _ in subject_cards)
+        if progress is not None:
+            progress(start + count, users)
+    return {'users': created, 'subjects': subject_count, 'cards': card_count}
+
+
+def write_credentials(path, created, password):
+    """
+    Writes seeded logins as CSV (user_id, email, password) for load tests.
+
+    :param path: Output file
+    :param created: (user id, email) pairs created by seed_users
+    :param password: Password the users were seeded with
+    """
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['user_id', 'email', 'password'])
+        for user_id, email in created:
+            writer.writerow([user_id, email, password])
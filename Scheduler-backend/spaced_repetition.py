@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta, timezone
+
+# SM-2 constants (https://super-memory.com/english/ol/sm2.htm)
+MIN_EASE_FACTOR = 1.3
+PASSING_GRADE = 3
+MAX_GRADE = 5
+
+# A failed card comes back after ten minutes instead of a whole day
+RELEARN_INTERVAL_DAYS = 10 / (24 * 60)
+
+
+def schedule(repetitions, ease_factor, interval_days, grade):
+    """
+    Computes a card's next review state with the SM-2 algorithm.
+
+    :param repetitions: Number of successful reviews in a row so far
+    :param ease_factor: Current ease factor (2.5 for a new card)
+    :param interval_days: Current interval in days
+    :param grade: Recall quality from 0 (blackout) to 5 (perfect)
+    :return: Tuple of (repetitions, ease_factor, interval_days)
+    """
+    if not 0 <= grade <= MAX_GRADE:
+        raise ValueError(f"Grade must be between 0 and {MAX_GRADE}, got {grade}")
+
+    if grade < PASSING_GRADE:
+        repetitions = 0
+        interval_days = RELEARN_INTERVAL_DAYS
+    else:
+        if repetitions == 0:
+            interval_days = 1
+        elif repetitions == 1:
+            interval_days = 6
+        else:
+            interval_days = interval_days * ease_factor
+        repetitions += 1
+
+    ease_factor += 0.1 - (MAX_GRADE - grade) * (0.08 + (MAX_GRADE - grade) * 0.02)
+    return repetitions, max(ease_factor, MIN_EASE_FACTOR), interval_days
+
+
+def apply_review(card, grade, now=None):
+    """
+    Updates a Flashcard's review fields in place for one graded review.
+
+    :param card: Flashcard instance
+    :param grade: Recall quality from 0 to 5
+    :param now: Review time; defaults to the current UTC time
+    """
+    now = now or datetime.now(timezone.utc)
+    card.repetitions, card.ease_factor, card.interval_days = schedule(
+        card.repetitions, card.ease_factor, card.interval_days, grade
+    )
+    card.last_reviewed_at = now
+    card.due_at = now + timedelta(days=card.interval_days)
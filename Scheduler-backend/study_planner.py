@@ -0,0 +1,178 @@
+import heapq
+import math
+from datetime import datetime, timedelta
+
+DAYS_OF_WEEK = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+
+class WeeklyPlanner:
+    """
+    Time-blocking planner for one user's week of study.
+
+    Each of the seven days has a study window of ``study_hours`` starting at
+    ``study_time``, cut into blocks of ``block_minutes``. A subject needs a
+    number of blocks (derived from its card backlog) and is planned first on
+    its allocated day. Within a day, subjects are taken from a priority queue
+    ordered by sessions already given that day, then nearest deadline, then
+    largest demand, and each gets one session of up to ``max_session_blocks``
+    before the next subject's turn. Demand that doesn't fit carries over to
+    the next day; demand left after the last day, or past a subject's
+    deadline, is reported as unscheduled.
+
+    A day's plan depends only on the subjects allocated to it and on what
+    the previous day carried over, so results are kept per day. Changing one
+    subject only re-plans its day, plus following days for as long as the
+    carry-over differs from last time and up to the last changed day.
+
+    Args:
+        start_date (date): First day of the plan.
+        study_hours (float): Length of the daily study window in hours.
+        study_time (str): Start of the daily study window in HH:MM format.
+        block_minutes (int): Length of a scheduling block.
+        max_session_blocks (int): Longest uninterrupted session for one subject.
+    """
+
+    def __init__(self, start_date, study_hours, study_time, block_minutes=30, max_session_blocks=4):
+        self.start_date = start_date
+        self.block_minutes = block_minutes
+        self.max_session_blocks = max_session_blocks
+        self.capacity = int((study_hours or 0) * 60 // block_minutes)
+        hours, minutes = (study_time or '00:00').split(':')[:2]
+        self.day_start = timedelta(hours=int(hours), minutes=int(minutes))
+
+        # subject_id -> (name, day index, blocks needed, deadline day index or None)
+        self._subjects = {}
+        self._by_day = [set() for _ in range(7)]
+        # Per-day results: (carry-over in, sessions, carry-over out, dropped at deadline)
+        self._days = [None] * 7
+        self._dirty = set(range(7))
+        self.days_replanned = 0
+
+    def day_index(self, day_name):
+        """Returns the plan's index (0-6) of the next occurrence of a weekday name."""
+        weekday = DAYS_OF_WEEK.index(day_name.capitalize())
+        return (weekday - self.start_date.weekday()) % 7
+
+    def blocks_for(self, cards, minutes_per_card):
+        """Converts a card backlog into a number of study blocks."""
+        return math.ceil(cards * minutes_per_card / self.block_minutes)
+
+    def set_subject(self, subject_id, name, day, blocks, deadline_day=None):
+        """
+        Adds or updates a subject. Days are only marked for re-planning if
+        something about the subject actually changed.
+
+        :param subject_id: Subject identifier
+        :param name: Subject name, copied into sessions
+        :param day: Index (0-6) of the subject's allocated day
+        :param blocks: Number of blocks of study the subject needs this week
+        :param deadline_day: Last day index the subject may be studied, or None
+        """
+        entry = (name, day, blocks, deadline_day)
+        previous = self._subjects.get(subject_id)
+        if previous == entry:
+            return
+        if previous is not None:
+            self._by_day[previous[1]].discard(subject_id)
+            self._mark_dirty(previous[1])
+        self._subjects[subject_id] = entry
+        self._by_day[day].add(subject_id)
+        self._mark_dirty(day)
+
+    def remove_subject(self, subject_id):
+        """Removes a subject from the plan."""
+        previous = self._subjects.pop(subject_id, None)
+        if previous is not None:
+            self._by_day[previous[1]].discard(subject_id)
+            self._mark_dirty(previous[1])
+
+    def retain(self, subject_ids):
+        """Removes every subject that is not in ``subject_ids``."""
+        for subject_id in set(self._subjects) - set(subject_ids):
+            self.remove_subject(subject_id)
+
+    def _mark_dirty(self, day):
+        self._dirty.add(day)
+
+    def plan(self):
+        """
+        Brings the plan up to date and returns it.
+
+        :return: Dictionary with "sessions" (ordered by start time) and
+            "unscheduled" (subject id -> blocks that didn't fit)
+        """
+        if self._dirty:
+            first, last = min(self._dirty), max(self._dirty)
+            carry = self._days[first - 1][2] if first > 0 else ()
+            for day in range(first, 7):
+                cached = self._days[day]
+                if day not in self._dirty and cached is not None and cached[0] == carry:
+                    # Unchanged input: days after the last changed one are all still valid
+                    if day > last:
+                        break
+                    carry = cached[2]
+                    continue
+                sessions, carry_out, dropped = self._plan_day(day, carry)
+                self._days[day] = (carry, sessions, carry_out, dropped)
+                self.days_replanned += 1
+                carry = carry_out
+            self._dirty.clear()
+
+        sessions = []
+        unscheduled = {}
+        for _, day_sessions, _, dropped in self._days:
+            sessions.extend(day_sessions)
+            unscheduled.update(dropped)
+        unscheduled.update(self._days[6][2])
+        return {'sessions': sessions, 'unscheduled': unscheduled}
+
+    def _plan_day(self, day, carry):
+        # Remaining demand entering the day: carried-over subjects plus the
+        # subjects allocated to this day. Carry-over is a sorted tuple of
+        # (subject_id, blocks) so it can be compared with the cached input.
+        remaining = dict(carry)
+        for subject_id in self._by_day[day]:
+            remaining[subject_id] = remaining.get(subject_id, 0) + self._subjects[subject_id][2]
+
+        heap = []
+        dropped = {}
+        for subject_id, blocks in remaining.items():
+            deadline_day = self._subjects[subject_id][3]
+            if blocks <= 0:
+                continue
+            if deadline_day is not None and deadline_day < day:
+                dropped[subject_id] = blocks
+                continue
+            deadline = deadline_day if deadline_day is not None else 7
+            heapq.heappush(heap, (0, deadline, -blocks, subject_id))
+
+        sessions = []
+        used = 0
+        date = self.start_date + timedelta(days=day)
+        day_start = datetime.combine(date, datetime.min.time()) + self.day_start
+        while heap and used < self.capacity:
+            turn, deadline, _, subject_id = heapq.heappop(heap)
+            blocks = min(remaining[subject_id], self.max_session_blocks, self.capacity - used)
+            start = day_start + timedelta(minutes=used * self.block_minutes)
+            sessions.append({
+                'subject_id': subject_id,
+                'subject': self._subjects[subject_id][0],
+                'day': DAYS_OF_WEEK[date.weekday()],
+                'start': start.isoformat(),
+                'end': (start + timedelta(minutes=blocks * self.block_minutes)).isoformat(),
+                'blocks': blocks,
+            })
+            used += blocks
+            remaining[subject_id] -= blocks
+            if remaining[subject_id] > 0:
+                heapq.heappush(heap, (turn + 1, deadline, -remaining[subject_id], subject_id))
+
+        carry_out = []
+        for subject_id, blocks in remaining.items():
+            if blocks <= 0 or subject_id in dropped:
+                continue
+            if self._subjects[subject_id][3] == day:
+                dropped[subject_id] = blocks
+            else:
+                carry_out.append((subject_id, blocks))
+        return sessions, tuple(sorted(carry_out)), dropped
@@ -0,0 +1,116 @@
+import copy
+import glob
+import os
+import random
+import re
+import threading
+
+import numpy as np
+import torch
+
+
+def snapshot(value):
+    """
+    Deep-copies a (nested) state dict with every tensor cloned to CPU.
+
+    The copy is taken synchronously so training can keep updating the
+    originals while the snapshot is written in the background.
+    """
+    if isinstance(value, torch.Tensor):
+        return value.detach().to('cpu', copy=True)
+    if isinstance(value, dict):
+        return {key: snapshot(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(snapshot(item) for item in value)
+    return copy.deepcopy(value)
+
+
+def rng_state():
+    """Returns the Python, NumPy and torch random number generator states."""
+    state = {
+        'python': random.getstate(),
+        'numpy': np.random.get_state(),
+        'torch': torch.get_rng_state(),
+    }
+    if torch.cuda.is_available():
+        state['cuda'] = torch.cuda.get_rng_state_all()
+    return state
+
+
+def set_rng_state(state):
+    """Restores generator states saved by ``rng_state``."""
+    random.setstate(state['python'])
+    np.random.set_state(state['numpy'])
+    torch.set_rng_state(state['torch'])
+    if 'cuda' in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state['cuda'])
+
+
+class CheckpointManager:
+    """
+    Writes training checkpoints in a background thread and keeps the newest few.
+
+    ``save`` snapshots the state to CPU memory and returns; the file is written
+    to a temporary name and renamed into place, so a crash mid-write never
+    leaves a truncated checkpoint. Only one write runs at a time, and older
+    ``checkpoint-<step>.pt`` files beyond ``keep`` are deleted once a new one
+    is in place.
+
+    Args:
+        directory (str): Directory for checkpoint files.
+        keep (int): Number of step checkpoints to keep. Defaults to 3.
+    """
+
+    def __init__(self, directory, keep=3):
+        self.directory = directory
+        self.keep = keep
+        self._writer = None
+        os.makedirs(directory, exist_ok=True)
+
+    def save(self, state, step):
+        """
+        Saves a checkpoint for ``step`` asynchronously.
+
+        Args:
+            state (dict): Checkpoint contents (state dicts, counters, RNG state).
+            step (int): Global optimizer step, used in the file name.
+        """
+        self._write_async(snapshot(state), os.path.join(self.directory, f'checkpoint-{step}.pt'), rotate=True)
+
+    def save_file(self, state, filename):
+        """Saves ``state`` asynchronously under a fixed name (e.g. the best model)."""
+        self._write_async(snapshot(state), os.path.join(self.directory, filename), rotate=False)
+
+    def _write_async(self, state, path, rotate):
+        self.wait()
+        self._writer = threading.Thread(target=self._write, args=(state, path, rotate), daemon=False)
+        self._writer.start()
+
+    def _write(self, state, path, rotate):
+        tmp_path = f'{path}.tmp'
+        torch.save(state, tmp_path)
+        os.replace(tmp_path, path)
+        if rotate:
+            for old in self.checkpoints()[:-self.keep]:
+                os.remove(old)
+
+    def wait(self):
+        """Blocks until the checkpoint being written (if any) is on disk."""
+        if self._writer is not None:
+            self._writer.join()
+            self._writer = None
+
+    def checkpoints(self):
+        """Returns step checkpoint paths, oldest first."""
+        paths = glob.glob(os.path.join(self.directory, 'checkpoint-*.pt'))
+        return sorted(paths, key=lambda path: int(re.search(r'checkpoint-(\d+)\.pt$', path).group(1)))
+
+    def latest(self):
+        """Returns the newest step checkpoint path, or None if there is none."""
+        paths = self.checkpoints()
+        return paths[-1] if paths else None
+
+    @staticmethod
+    def load(path, map_location='cpu'):
+        """Loads a checkpoint written by ``save``."""
+        return torch.load(path, map_location=map_location, weights_only=False)
@@ -1,6 +1,37 @@
+import json
+import os
+from multiprocessing import Pool
+
+import numpy as np
 import torch
 from torch.utils.data import Dataset
 
+# Label value ignored by the loss, so padding doesn't count towards it
+IGNORE_INDEX = -100
+
+
+def format_example(item):
+    """
+    Builds the model input and target text for one SQuAD record.
+
+    Args:
+        item (dict): Record with 'context', 'question' and 'answers'.
+
+    Returns:
+        tuple: (input_text, target_text)
+    """
+    context = item['context']
+    question = item['question']
+    answer = item['answers']['text'][0]
+
+    # Combine context and question into input_text
+    input_text = f"context: {context} question: {question}"
+
+    # Prepare target_text with question and answer separated by <sep>
+    target_text = f"{question} <sep> {answer}"
+    return input_text, target_text
+
+
 class PreprocessDataset(Dataset):
     """
     Custom dataset class for preprocessing data for T5 model training.
@@ -30,16 +61,7 @@ class PreprocessDataset(Dataset):
         Returns:
             dict: Dictionary containing 'input_ids', 'attention_mask', and 'labels'.
         """
-        item = self.dataset[idx]
-        context = item['context']
-        question = item['question']
-        answer = item['answers']['text'][0]
-
-        # Combine context and question into input_text
-        input_text = f"context: {context} question: {question}"
-
-        # Prepare target_text with question and answer separated by <sep>
-        target_text = f"{question} <sep> {answer}"
+        input_text, target_text = format_example(self.dataset[idx])
 
         # Encode input_text
         inputs = self.tokenizer.encode_plus(
@@ -65,3 +87,177 @@ class PreprocessDataset(Dataset):
             'attention_mask': inputs['attention_mask'].squeeze(),
             'labels': targets['input_ids'].squeeze()
         }
+
+
+# Worker state for tokenize_to_memmap; set once per process by _init_worker
+_worker = {}
+
+
+def _init_worker(dataset, tokenizer, max_length, format_fn):
+    _worker.update(dataset=dataset, tokenizer=tokenizer, max_length=max_length, format_fn=format_fn)
+
+
+def _tokenize_range(bounds):
+    start, stop = bounds
+    dataset, tokenizer, max_length = _worker['dataset'], _worker['tokenizer'], _worker['max_length']
+    texts = [_worker['format_fn'](dataset[i]) for i in range(start, stop)]
+    inputs = tokenizer([t[0] for t in texts], max_length=max_length, truncation=True)['input_ids']
+    targets = tokenizer([t[1] for t in texts], max_length=max_length, truncation=True)['input_ids']
+
+    def pack(sequences):
+        lengths = np.fromiter((len(seq) for seq in sequences), dtype=np.int64, count=len(sequences))
+        flat = np.fromiter((token for seq in sequences for token in seq), dtype=np.int32, count=int(lengths.sum()))
+        return flat, lengths
+
+    return pack(inputs), pack(targets)
+
+
+def tokenize_to_memmap(dataset, tokenizer, output_dir, max_length=512, num_workers=None, chunk_size=1000,
+                       format_fn=format_example):
+    """
+    Tokenizes a dataset once, in parallel, into flat int32 token files.
+
+    Each sequence is stored unpadded. Token ids are concatenated into
+    ``input_ids.bin`` and ``labels.bin``, and ``*_offsets.npy`` hold where
+    each sample starts, so a sample is just a slice of a memory-mapped file.
+
+    Args:
+        dataset (list or datasets.Dataset): Records with context, question and answers.
+        tokenizer (transformers.Tokenizer): Tokenizer object for encoding texts.
+        output_dir (str): Directory to write the token files to.
+        max_length (int): Sequences are truncated to this many tokens. Defaults to 512.
+        num_workers (int): Tokenizer processes. Defaults to the CPU count.
+        chunk_size (int): Samples tokenized per task. Defaults to 1000.
+        format_fn (callable): Picklable function mapping a record to (input_text, target_text).
+            Defaults to format_example (SQuAD records).
+
+    Returns:
+        MemmapDataset: Dataset reading the written files.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    ranges = [(start, min(start + chunk_size, len(dataset))) for start in range(0, len(dataset), chunk_size)]
+    offsets = {'input_ids': [0], 'labels': [0]}
+
+    with open(os.path.join(output_dir, 'input_ids.bin'), 'wb') as input_file, \
+            open(os.path.join(output_dir, 'labels.bin'), 'wb') as label_file, \
+            Pool(num_workers or os.cpu_count(), initializer=_init_worker,
+                 initargs=(dataset, tokenizer, max_length, format_fn)) as pool:
+        # imap keeps chunk order, so samples are written in dataset order
+        for (inputs, input_lengths), (labels, label_lengths) in pool.imap(_tokenize_range, ranges):
+            input_file.write(inputs.tobytes())
+            label_file.write(labels.tobytes())
+            offsets['input_ids'].extend(offsets['input_ids'][-1] + np.cumsum(input_lengths))
+            offsets['labels'].extend(offsets['labels'][-1] + np.cumsum(label_lengths))
+
+    for name, values in offsets.items():
+        np.save(os.path.join(output_dir, f'{name}_offsets.npy'), np.asarray(values, dtype=np.int64))
+    with open(os.path.join(output_dir, 'meta.json'), 'w') as f:
+        json.dump({
+            'num_samples': len(dataset),
+            'max_length': max_length,
+            'pad_token_id': tokenizer.pad_token_id,
+            'tokenizer': getattr(tokenizer, 'name_or_path', None),
+        }, f)
+    return MemmapDataset(output_dir)
+
+
+def load_or_tokenize(dataset, tokenizer, output_dir, max_length=512, num_workers=None, format_fn=format_example):
+    """
+    Returns the MemmapDataset in ``output_dir``, tokenizing ``dataset`` first
+    if it hasn't been written yet (or was written with a different setup).
+    """
+    meta_path = os.path.join(output_dir, 'meta.json')
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if (meta['num_samples'] == len(dataset) and meta['max_length'] == max_length
+                and meta['pad_token_id'] == tokenizer.pad_token_id):
+            return MemmapDataset(output_dir)
+    return tokenize_to_memmap(dataset, tokenizer, output_dir, max_length, num_workers, format_fn=format_fn)
+
+
+class MemmapDataset(Dataset):
+    """
+    Dataset over token files written by ``tokenize_to_memmap``.
+
+    Samples are returned as unpadded int32 tensors that share memory with the
+    mapped file, so reading one copies nothing; pad them per batch with
+    ``PadCollator``.
+
+    Args:
+        data_dir (str): Directory containing the token files.
+    """
+
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+        with open(os.path.join(data_dir, 'meta.json')) as f:
+            self.meta = json.load(f)
+        self.pad_token_id = self.meta['pad_token_id']
+        self.input_offsets = np.load(os.path.join(data_dir, 'input_ids_offsets.npy'))
+        self.label_offsets = np.load(os.path.join(data_dir, 'labels_offsets.npy'))
+        self._input_ids = None
+        self._labels = None
+
+    def _open(self):
+        # Mapped lazily so each DataLoader worker maps the files itself.
+        # Copy-on-write mode gives writable views without copying the file.
+        self._input_ids = np.memmap(os.path.join(self.data_dir, 'input_ids.bin'), dtype=np.int32, mode='c')
+        self._labels = np.memmap(os.path.join(self.data_dir, 'labels.bin'), dtype=np.int32, mode='c')
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_input_ids'] = state['_labels'] = None
+        return state
+
+    def __len__(self):
+        """Return the number of samples in the dataset."""
+        return len(self.input_offsets) - 1
+
+    def lengths(self):
+        """Returns the input length of every sample, without reading any tokens."""
+        return np.diff(self.input_offsets)
+
+    def __getitem__(self, idx):
+        """
+        Get a single sample from the dataset.
+
+        Args:
+            idx (int): Index of the sample.
+
+        Returns:
+            dict: Dictionary containing unpadded 'input_ids' and 'labels'.
+        """
+        if self._input_ids is None:
+            self._open()
+        return {
+            'input_ids': torch.from_numpy(self._input_ids[self.input_offsets[idx]:self.input_offsets[idx + 1]]),
+            'labels': torch.from_numpy(self._labels[self.label_offsets[idx]:self.label_offsets[idx + 1]]),
+        }
+
+
+class PadCollator:
+    """
+    Collate function that pads each batch to its own longest sample.
+
+    Inputs are padded with the tokenizer's pad id and labels with
+    ``IGNORE_INDEX`` so padding is excluded from the loss.
+
+    Args:
+        pad_token_id (int): Token id used to pad inputs.
+    """
+
+    def __init__(self, pad_token_id):
+        self.pad_token_id = pad_token_id
+
+    def __call__(self, batch):
+        input_width = max(len(item['input_ids']) for item in batch)
+        label_width = max(len(item['labels']) for item in batch)
+        input_ids = torch.full((len(batch), input_width), self.pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(batch), input_width), dtype=torch.long)
+        labels = torch.full((len(batch), label_width), IGNORE_INDEX, dtype=torch.long)
+        for row, item in enumerate(batch):
+            n = len(item['input_ids'])
+            input_ids[row, :n] = item['input_ids']
+            attention_mask[row, :n] = 1
+            labels[row, :len(item['labels'])] = item['labels']
+        return {'input_ids': input_ids, 'attention_mask': attention_mask, 'labels': labels}
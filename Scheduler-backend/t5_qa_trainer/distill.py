@@ -0,0 +1,249 @@
+import argparse
+import json
+import os
+import statistics
+import time
+from collections import Counter
+
+import torch
+from transformers import T5ForConditionalGeneration, T5Tokenizer
+from tqdm import tqdm
+
+from dataset import PadCollator, load_or_tokenize
+from export import load_trained_model
+from model import QAModel
+from train import train
+
+SEPARATOR = '<sep>'
+
+
+def unique_contexts(dataset, limit=None):
+    """
+    Returns the distinct contexts of a SQuAD split in their original order
+    (SQuAD repeats every context for each of its questions).
+    """
+    contexts = list(dict.fromkeys(item['context'] for item in dataset))
+    return contexts[:limit] if limit else contexts
+
+
+def split_pair(text):
+    """
+    Splits generated text into (question, answer), or returns None if it is
+    not a single question/answer pair.
+    """
+    parts = text.split(SEPARATOR)
+    if len(parts) != 2 or not parts[0].strip() or not parts[1].strip():
+        return None
+    return parts[0].strip(), parts[1].strip()
+
+
+def generate_texts(model, tokenizer, contexts, batch_size=16, max_length=128):
+    """
+    Greedy generation for many contexts, decoded with special tokens kept
+    except padding and end-of-sequence, so a "<sep>" added to the tokenizer
+    as a special token survives for ``parse_pair``.
+
+    Contexts are fed as they are, the same way generate_flashcards.py feeds
+    page text to the served model.
+    """
+    outputs = []
+    model.eval()
+    for start in range(0, len(contexts), batch_size):
+        inputs = tokenizer(contexts[start:start + batch_size], return_tensors='pt', padding=True, truncation=True,
+                           max_length=512)
+        with torch.inference_mode():
+            generated = model.generate(**inputs, max_length=max_length)
+        outputs.extend(
+            text.replace(tokenizer.pad_token, '').replace(tokenizer.eos_token, '').strip()
+            for text in tokenizer.batch_decode(generated, skip_special_tokens=False)
+        )
+    return outputs
+
+
+def generate_teacher_pairs(teacher, tokenizer, contexts, output_path, batch_size=16, max_length=128):
+    """
+    Labels contexts with the teacher's question/answer output.
+
+    Every output is appended to a JSON-lines file as soon as its batch is
+    done, so an interrupted run continues where it stopped.
+
+    Args:
+        teacher (T5ForConditionalGeneration): Teacher model.
+        tokenizer (T5Tokenizer): Tokenizer shared by teacher and student.
+        contexts (list): Contexts to label.
+        output_path (str): JSON-lines file of {"context", "output"} records.
+        batch_size (int): Contexts per generate call. Defaults to 16.
+        max_length (int): Maximum generated length. Defaults to 128.
+
+    Returns:
+        list: Records whose output is a usable pair, as {"context", "target"}.
+    """
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    done = 0
+    if os.path.exists(output_path):
+        with open(output_path) as f:
+            done = sum(1 for _ in f)
+
+    with open(output_path, 'a') as f:
+        for start in tqdm(range(done, len(contexts), batch_size), desc="Teacher labelling"):
+            batch = contexts[start:start + batch_size]
+            for context, output in zip(batch, generate_texts(teacher, tokenizer, batch, batch_size, max_length)):
+                f.write(json.dumps({'context': context, 'output': output}) + '\n')
+            f.flush()
+
+    pairs = []
+    with open(output_path) as f:
+        for line in f:
+            record = json.loads(line)
+            pair = split_pair(record['output'])
+            if pair is not None:
+                pairs.append({'context': record['context'], 'target': f"{pair[0]} {SEPARATOR} {pair[1]}"})
+    return pairs
+
+
+def format_pair(item):
+    """Model input and target for a teacher-labelled record (see format_example)."""
+    return item['context'], item['target']
+
+
+def model_memory_mb(model):
+    """Size of the model's parameters and buffers in MiB."""
+    tensors = list(model.parameters()) + list(model.buffers())
+    return sum(t.numel() * t.element_size() for t in tensors) / 2 ** 20
+
+
+def token_f1(prediction, reference):
+    prediction, reference = prediction.split(), reference.split()
+    common = sum((Counter(prediction) & Counter(reference)).values())
+    if not prediction or not reference or not common:
+        return float(prediction == reference)
+    precision, recall = common / len(prediction), common / len(reference)
+    return 2 * precision * recall / (precision + recall)
+
+
+def profile_model(model, tokenizer, contexts, references=None, batch_size=16, max_length=128):
+    """
+    Measures one model for the distillation report.
+
+    Args:
+        model (T5ForConditionalGeneration): Model to measure.
+        tokenizer (T5Tokenizer): Tokenizer.
+        contexts (list): Held-out contexts.
+        references (list): Teacher outputs to compare against; None for the teacher itself.
+        batch_size (int): Batch size for the throughput measurement.
+        max_length (int): Maximum generated length.
+
+    Returns:
+        tuple: (metrics dict, generated outputs)
+    """
+    generate_texts(model, tokenizer, contexts[:1], 1, max_length)
+
+    latencies = []
+    for context in contexts:
+        start = time.perf_counter()
+        generate_texts(model, tokenizer, [context], 1, max_length)
+        latencies.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    outputs = generate_texts(model, tokenizer, contexts, batch_size, max_length)
+    batched_seconds = time.perf_counter() - start
+
+    pairs = [split_pair(output) for output in outputs]
+    valid = [(context, pair) for context, pair in zip(contexts, pairs) if pair is not None]
+    references = references or outputs
+    latencies.sort()
+    metrics = {
+        'parameters_m': sum(p.numel() for p in model.parameters()) / 1e6,
+        'memory_mb': model_memory_mb(model),
+        'latency_p50_ms': statistics.median(latencies) * 1000,
+        'latency_p95_ms': latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))] * 1000,
+        'contexts_per_sec': len(contexts) / batched_seconds,
+        'valid_pairs': len(valid) / len(contexts),
+        # Share of answers that appear verbatim in their context
+        'answer_in_context': sum(a.lower() in c.lower() for c, (_, a) in valid) / len(valid) if valid else 0.0,
+        'exact_match_vs_teacher': sum(o == r for o, r in zip(outputs, references)) / len(outputs),
+        'token_f1_vs_teacher': statistics.mean(token_f1(o, r) for o, r in zip(outputs, references)),
+    }
+    return metrics, outputs
+
+
+def compare(teacher, student, tokenizer, contexts, batch_size=16, max_length=128):
+    """
+    Profiles teacher and student on the same contexts.
+
+    Returns:
+        dict: {"teacher": metrics, "student": metrics, "delta": student - teacher}
+    """
+    teacher_metrics, teacher_outputs = profile_model(teacher, tokenizer, contexts, None, batch_size, max_length)
+    student_metrics, _ = profile_model(student, tokenizer, contexts, teacher_outputs, batch_size, max_length)
+    delta = {key: student_metrics[key] - teacher_metrics[key] for key in teacher_metrics}
+    return {'teacher': teacher_metrics, 'student': student_metrics, 'delta': delta}
+
+
+def print_report(report):
+    print(f"{'metric':<24} {'teacher':>10} {'student':>10} {'delta':>10}")
+    for key in report['teacher']:
+        values = (report['teacher'][key], report['student'][key], report['delta'][key])
+        print(f"{key:<24} " + ' '.join(f"{value:>10.3f}" for value in values))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Distil the trained QA model into a smaller student for CPU serving. Stages: label SQuAD "
+                    "contexts with the teacher, train the student on those pairs, then compare both models.")
+    parser.add_argument('--teacher', default='trained_t5_qa', help="Teacher directory (save_custom_model output)")
+    parser.add_argument('--student', default='t5-small', help="Student base model, e.g. t5-small or t5-base")
+    parser.add_argument('--output-dir', default='distilled_t5_qa')
+    parser.add_argument('--max-contexts', type=int, default=None, help="Limit the training contexts labelled")
+    parser.add_argument('--report-contexts', type=int, default=200, help="Held-out contexts used for the report")
+    parser.add_argument('--num-epochs', type=int, default=3)
+    parser.add_argument('--batch-size', type=int, default=16)
+    parser.add_argument('--max-tokens', type=int, default=None, help="Token budget per training batch")
+    parser.add_argument('--lr', type=float, default=3e-4)
+    return parser.parse_args()
+
+
+def main():
+    from datasets import load_dataset
+
+    args = parse_args()
+    squad_dataset = load_dataset("rajpurkar/squad")
+
+    tokenizer = T5Tokenizer.from_pretrained(args.teacher)
+    teacher = load_trained_model(args.teacher)
+
+    # Stage 1: teacher labels (cached and resumable)
+    contexts = unique_contexts(squad_dataset['train'], args.max_contexts)
+    pairs = generate_teacher_pairs(teacher, tokenizer, contexts, os.path.join(args.output_dir, 'teacher_pairs.jsonl'),
+                                   batch_size=args.batch_size)
+    print(f"{len(pairs)} of {len(contexts)} contexts produced a usable teacher pair")
+
+    # Stage 2: train the student on the teacher's pairs, holding out 5% for validation
+    split = max(1, len(pairs) // 20)
+    train_dataset = load_or_tokenize(pairs[split:], tokenizer, os.path.join(args.output_dir, 'tokenized', 'train'),
+                                     format_fn=format_pair)
+    val_dataset = load_or_tokenize(pairs[:split], tokenizer, os.path.join(args.output_dir, 'tokenized', 'validation'),
+                                   format_fn=format_pair)
+    student = T5ForConditionalGeneration.from_pretrained(args.student)
+    if len(tokenizer) > student.get_input_embeddings().num_embeddings:
+        student.resize_token_embeddings(len(tokenizer))
+    train(QAModel(student), train_dataset, val_dataset, tokenizer, torch.device("cpu"), num_epochs=args.num_epochs,
+          batch_size=args.batch_size, lr=args.lr, max_tokens=args.max_tokens,
+          collate_fn=PadCollator(tokenizer.pad_token_id),
+          checkpoint_dir=os.path.join(args.output_dir, 'checkpoints'),
+          output_dir=os.path.join(args.output_dir, 'qa_model'))
+
+    # Same layout as T5_QA/, so generate_flashcards.py can load it through
+    # FLASHCARD_MODEL_PATH / FLASHCARD_TOKENIZER_PATH
+    student.save_pretrained(os.path.join(args.output_dir, 'model'))
+    tokenizer.save_pretrained(os.path.join(args.output_dir, 'tokenizer'))
+
+    # Stage 3: side-by-side report on held-out SQuAD validation contexts
+    report = compare(teacher, student.eval(), tokenizer,
+                     unique_contexts(squad_dataset['validation'], args.report_contexts), batch_size=args.batch_size)
+    print_report(report)
+    with open(os.path.join(args.output_dir, 'report.json'), 'w') as f:
+        json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
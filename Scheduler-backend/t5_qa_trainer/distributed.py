@@ -0,0 +1,136 @@
+import os
+from contextlib import contextmanager
+
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+
+
+def is_distributed():
+    """Returns True if this process is part of an initialized process group."""
+    return dist.is_available() and dist.is_initialized()
+
+
+def get_rank():
+    """Returns the global rank of this process (0 when not distributed)."""
+    return dist.get_rank() if is_distributed() else 0
+
+
+def get_world_size():
+    """Returns the number of processes taking part in training (1 when not distributed)."""
+    return dist.get_world_size() if is_distributed() else 1
+
+
+def is_main_process():
+    """Returns True on rank 0, the only rank that writes checkpoints and logs."""
+    return get_rank() == 0
+
+
+def barrier():
+    """Waits for every rank; does nothing when not distributed."""
+    if is_distributed():
+        dist.barrier()
+
+
+def init_distributed(backend='gloo'):
+    """
+    Joins the process group described by the environment, if there is one.
+
+    The launcher below and ``torchrun`` (for several hosts) both set RANK,
+    WORLD_SIZE, MASTER_ADDR and MASTER_PORT. Without WORLD_SIZE > 1 this is a
+    no-op, so single-process training is unchanged.
+
+    Args:
+        backend (str): torch.distributed backend. Defaults to 'gloo' (CPU).
+
+    Returns:
+        bool: True if training runs distributed.
+    """
+    if int(os.environ.get('WORLD_SIZE', 1)) > 1 and not is_distributed():
+        dist.init_process_group(backend)
+        # Ranks on one host share its cores instead of each starting a thread per core
+        local_world_size = int(os.environ.get('LOCAL_WORLD_SIZE', get_world_size()))
+        torch.set_num_threads(max(1, (os.cpu_count() or 1) // local_world_size))
+    return is_distributed()
+
+
+def cleanup_distributed():
+    """Leaves the process group."""
+    if is_distributed():
+        dist.destroy_process_group()
+
+
+@contextmanager
+def main_process_first():
+    """
+    Runs the enclosed block on rank 0 before the other ranks.
+
+    Used for work that writes shared files, e.g. tokenizing the dataset, so
+    the other ranks read the result instead of racing to create it.
+    """
+    if not is_main_process():
+        barrier()
+    yield
+    if is_main_process():
+        barrier()
+
+
+def all_reduce_sum(*values):
+    """
+    Sums numbers across ranks.
+
+    Args:
+        *values (float): Local values.
+
+    Returns:
+        list: The summed values (the local values when not distributed).
+    """
+    if not is_distributed():
+        return list(values)
+    tensor = torch.tensor(values, dtype=torch.float64)
+    dist.all_reduce(tensor)
+    return tensor.tolist()
+
+
+def all_gather_object(obj):
+    """Returns a list with ``obj`` from every rank, in rank order."""
+    if not is_distributed():
+        return [obj]
+    objects = [None] * get_world_size()
+    dist.all_gather_object(objects, obj)
+    return objects
+
+
+def _run_local_rank(local_rank, fn, nprocs, args, master_addr, master_port, backend):
+    os.environ.update({
+        'RANK': str(local_rank),
+        'LOCAL_RANK': str(local_rank),
+        'WORLD_SIZE': str(nprocs),
+        'LOCAL_WORLD_SIZE': str(nprocs),
+        'MASTER_ADDR': master_addr,
+        'MASTER_PORT': str(master_port),
+    })
+    init_distributed(backend)
+    try:
+        fn(*args)
+    finally:
+        cleanup_distributed()
+
+
+def launch(fn, nprocs, args=(), master_addr='127.0.0.1', master_port=29500, backend='gloo'):
+    """
+    Runs ``fn(*args)`` in ``nprocs`` local processes that form one process group.
+
+    This is the single-machine launcher; for several hosts run the script
+    with ``torchrun --nnodes ... --nproc-per-node ...`` instead, which sets
+    the same environment variables.
+
+    Args:
+        fn (callable): Picklable function to run on every rank.
+        nprocs (int): Number of ranks.
+        args (tuple): Arguments passed to fn.
+        master_addr (str): Address of rank 0. Defaults to localhost.
+        master_port (int): Free port on rank 0 for the rendezvous.
+        backend (str): torch.distributed backend. Defaults to 'gloo'.
+    """
+    mp.spawn(_run_local_rank, args=(fn, nprocs, args, master_addr, master_port, backend), nprocs=nprocs, join=True)
@@ -1,8 +1,7 @@
-import torch
-from tqdm import tqdm
-from torch.utils.data import DataLoader
+from sampler import build_dataloader
+from validate import average_loss
 
-def evaluate(model, val_dataset, device, batch_size=8):
+def evaluate(model, val_dataset, device, batch_size=8, collate_fn=None, max_tokens=None, num_workers=0):
     """
     Evaluate the model on validation dataset.
 
@@ -11,26 +10,18 @@ def evaluate(model, val_dataset, device, batch_size=8):
         val_dataset (Dataset): Validation dataset.
         device (torch.device): Device to move the model and data to.
         batch_size (int): Batch size for evaluation. Defaults to 8.
+        collate_fn (callable): Batch collate function. Defaults to None.
+        max_tokens (int): Token budget per batch instead of batch_size. Defaults to None.
+        num_workers (int): DataLoader worker processes. Defaults to 0.
 
     Returns:
-        float: Average loss on validation set.
+        float: Average loss per sample on validation set.
     """
-    val_loader = DataLoader(val_dataset, batch_size=batch_size, shuffle=False, num_workers=0)
+    val_loader = build_dataloader(val_dataset, batch_size=batch_size, max_tokens=max_tokens, shuffle=False,
+                                  num_workers=num_workers, collate_fn=collate_fn)
     model.to(device)
-    model.eval()
-
-    total_loss = 0
-    with torch.no_grad():
-        for batch in tqdm(val_loader, desc="Evaluating"):
-            input_ids = batch['input_ids'].to(device)
-            attention_mask = batch['attention_mask'].to(device)
-            labels = batch['labels'].to(device)
-
-            outputs = model(input_ids, attention_mask, labels=labels)
-            loss = outputs.loss
-            total_loss += loss.item()
-
-    avg_loss = total_loss / len(val_loader)
+    # Runs in a single process (rank 0 after distributed training), so no reduction
+    avg_loss = average_loss(model, val_loader, device, desc="Evaluating", reduce=False)
     print(f"Final Evaluation Loss: {avg_loss:.4f}")
     return avg_loss
 
@@ -0,0 +1,207 @@
+import argparse
+import json
+import os
+import tempfile
+
+import torch
+import torch.nn as nn
+from transformers import T5Config, T5ForConditionalGeneration, T5Tokenizer
+
+ONNX_FILES = {
+    'encoder': 'encoder.onnx',
+    'decoder_init': 'decoder_init.onnx',
+    'decoder': 'decoder.onnx',
+}
+
+
+def load_trained_model(model_dir):
+    """
+    Loads a T5 model saved by ``save_custom_model`` or by ``save_pretrained``.
+
+    ``save_custom_model`` stores the QAModel's state dict, whose keys carry a
+    ``t5_model.`` prefix, next to the T5 config.
+
+    Args:
+        model_dir (str): Model directory.
+
+    Returns:
+        T5ForConditionalGeneration: The model in eval mode.
+    """
+    if os.path.exists(os.path.join(model_dir, 'qa_model_config.json')):
+        model = T5ForConditionalGeneration(T5Config.from_pretrained(model_dir))
+        state_dict = torch.load(os.path.join(model_dir, 'pytorch_model.bin'), map_location='cpu')
+        state_dict = {key.removeprefix('t5_model.'): value for key, value in state_dict.items()}
+        model.load_state_dict(state_dict, strict=False)
+        model.tie_weights()
+    else:
+        model = T5ForConditionalGeneration.from_pretrained(model_dir)
+    return model.eval()
+
+
+class EncoderGraph(nn.Module):
+    """Encoder half of the model: token ids to hidden states."""
+
+    def __init__(self, model):
+        super().__init__()
+        self.encoder = model.get_encoder()
+
+    def forward(self, input_ids, attention_mask):
+        return self.encoder(input_ids=input_ids, attention_mask=attention_mask, return_dict=True).last_hidden_state
+
+
+class DecoderGraph(nn.Module):
+    """
+    One decoder step with the language-model head.
+
+    The first step (``with_past=False``) returns the self- and cross-attention
+    keys/values of every layer. Later steps take that cache as flat inputs
+    and return only the updated self-attention entries, because the
+    cross-attention keys/values depend only on the encoder output.
+    """
+
+    def __init__(self, model, with_past):
+        super().__init__()
+        self.decoder = model.get_decoder()
+        self.lm_head = model.lm_head
+        self.num_layers = model.config.num_decoder_layers
+        self.with_past = with_past
+        # T5 rescales the output before the tied lm_head (see T5ForConditionalGeneration.forward)
+        self.scale = model.config.d_model ** -0.5 if model.config.tie_word_embeddings else 1.0
+
+    def forward(self, decoder_input_ids, encoder_attention_mask, encoder_hidden_states, *past):
+        past_key_values = None
+        if self.with_past:
+            past_key_values = tuple(tuple(past[4 * i:4 * i + 4]) for i in range(self.num_layers))
+        outputs = self.decoder(
+            input_ids=decoder_input_ids,
+            encoder_hidden_states=encoder_hidden_states,
+            encoder_attention_mask=encoder_attention_mask,
+            past_key_values=past_key_values,
+            use_cache=True,
+            return_dict=True,
+        )
+        logits = self.lm_head(outputs.last_hidden_state * self.scale)
+        cache = []
+        for layer in outputs.past_key_values:
+            cache.extend(layer[:2] if self.with_past else layer)
+        return (logits, *cache)
+
+
+def cache_names(prefix, num_layers, kinds=('self_key', 'self_value', 'cross_key', 'cross_value')):
+    return [f'{prefix}.{layer}.{kind}' for layer in range(num_layers) for kind in kinds]
+
+
+def export_onnx(model, tokenizer, output_dir, quantize=True, opset=17):
+    """
+    Exports the model as encoder / first decoder step / decoder step ONNX
+    graphs, optionally with int8 dynamic quantization of the weights.
+
+    The graphs are written with dynamic batch and sequence axes next to the
+    tokenizer and an onnx_config.json read by ``OnnxSeq2SeqGenerator``.
+
+    Args:
+        model (T5ForConditionalGeneration): Model to export.
+        tokenizer (T5Tokenizer): Tokenizer saved with the graphs.
+        output_dir (str): Output directory.
+        quantize (bool): Quantize MatMul weights to int8. Defaults to True.
+        opset (int): ONNX opset version. Defaults to 17.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    num_layers = model.config.num_decoder_layers
+    present = cache_names('present', num_layers)
+    past = cache_names('past', num_layers)
+    present_self = cache_names('present', num_layers, kinds=('self_key', 'self_value'))
+
+    batch = {0: 'batch'}
+    encoder_axes = {0: 'batch', 1: 'encoder_length'}
+    inputs = tokenizer(["context: export example question: what is exported?"], return_tensors='pt')
+
+    # The exporter restores each wrapper's train/eval mode afterwards, which
+    # would switch the wrapped model to training mode if the wrappers weren't in eval
+    encoder = EncoderGraph(model).eval()
+    decoder_init = DecoderGraph(model, with_past=False).eval()
+    decoder = DecoderGraph(model, with_past=True).eval()
+
+    with tempfile.TemporaryDirectory() as fp32_dir, torch.no_grad():
+        fp32_dir = output_dir if not quantize else fp32_dir
+        hidden = encoder(inputs.input_ids, inputs.attention_mask)
+        start = torch.full((1, 1), model.config.decoder_start_token_id, dtype=torch.long)
+        first_outputs = decoder_init(start, inputs.attention_mask, hidden)
+
+        torch.onnx.export(
+            encoder, (inputs.input_ids, inputs.attention_mask),
+            os.path.join(fp32_dir, ONNX_FILES['encoder']),
+            input_names=['input_ids', 'attention_mask'], output_names=['hidden_states'],
+            dynamic_axes={'input_ids': encoder_axes, 'attention_mask': encoder_axes, 'hidden_states': encoder_axes},
+            opset_version=opset, dynamo=False,
+        )
+        torch.onnx.export(
+            decoder_init, (start, inputs.attention_mask, hidden),
+            os.path.join(fp32_dir, ONNX_FILES['decoder_init']),
+            input_names=['decoder_input_ids', 'encoder_attention_mask', 'encoder_hidden_states'],
+            output_names=['logits', *present],
+            dynamic_axes={
+                'decoder_input_ids': {0: 'batch', 1: 'decoder_length'},
+                'encoder_attention_mask': encoder_axes,
+                'encoder_hidden_states': encoder_axes,
+                'logits': {0: 'batch', 1: 'decoder_length'},
+                **{name: {0: 'batch', 2: 'decoder_length' if '.self_' in name else 'encoder_length'}
+                   for name in present},
+            },
+            opset_version=opset, dynamo=False,
+        )
+        torch.onnx.export(
+            decoder, (start, inputs.attention_mask, hidden, *first_outputs[1:]),
+            os.path.join(fp32_dir, ONNX_FILES['decoder']),
+            input_names=['decoder_input_ids', 'encoder_attention_mask', 'encoder_hidden_states', *past],
+            output_names=['logits', *present_self],
+            dynamic_axes={
+                'decoder_input_ids': batch,
+                'encoder_attention_mask': encoder_axes,
+                'encoder_hidden_states': encoder_axes,
+                'logits': batch,
+                **{name: {0: 'batch', 2: 'past_length' if '.self_' in name else 'encoder_length'} for name in past},
+                **{name: {0: 'batch', 2: 'past_length_plus_one'} for name in present_self},
+            },
+            opset_version=opset, dynamo=False,
+        )
+
+        if quantize:
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+
+            for filename in ONNX_FILES.values():
+                quantize_dynamic(os.path.join(fp32_dir, filename), os.path.join(output_dir, filename),
+                                 weight_type=QuantType.QInt8)
+
+    tokenizer.save_pretrained(output_dir)
+    with open(os.path.join(output_dir, 'onnx_config.json'), 'w') as f:
+        json.dump({
+            'files': ONNX_FILES,
+            'num_layers': num_layers,
+            'decoder_start_token_id': model.config.decoder_start_token_id,
+            'eos_token_id': model.config.eos_token_id,
+            'pad_token_id': model.config.pad_token_id,
+            'quantized': quantize,
+            'opset': opset,
+        }, f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a trained QA model to ONNX for CPU inference")
+    parser.add_argument('--model-dir', default='trained_t5_qa',
+                        help="Directory written by save_custom_model (or save_pretrained)")
+    parser.add_argument('--tokenizer-dir', default=None, help="Defaults to --model-dir")
+    parser.add_argument('--output-dir', default='onnx_t5_qa')
+    parser.add_argument('--no-quantize', action='store_true', help="Keep fp32 weights")
+    parser.add_argument('--opset', type=int, default=17)
+    args = parser.parse_args()
+
+    model = load_trained_model(args.model_dir)
+    tokenizer = T5Tokenizer.from_pretrained(args.tokenizer_dir or args.model_dir)
+    export_onnx(model, tokenizer, args.output_dir, quantize=not args.no_quantize, opset=args.opset)
+    size = sum(os.path.getsize(os.path.join(args.output_dir, f)) for f in ONNX_FILES.values())
+    print(f"Exported to {args.output_dir} ({size / 2 ** 20:.1f} MiB of graphs)")
+
+
+if __name__ == "__main__":
+    main()
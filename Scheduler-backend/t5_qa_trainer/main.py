@@ -1,39 +1,81 @@
+import argparse
 import torch
 from transformers import T5ForConditionalGeneration, T5Tokenizer
 from datasets import load_dataset
 from model import QAModel
-from dataset import preprocess
+from dataset import load_or_tokenize, PadCollator
 from train import train
 from evaluate import evaluate
 from test import test
+from distributed import init_distributed, cleanup_distributed, is_distributed, is_main_process, launch, \
+    main_process_first
 
-def main():
-    # Load the dataset
-    squad_dataset = load_dataset("rajpurkar/squad")
+def parse_args():
+    parser = argparse.ArgumentParser(description="Fine-tune T5 for question/answer generation on SQuAD")
+    parser.add_argument('--resume', nargs='?', const='latest', default=None,
+                        help="Resume from a checkpoint path (default: the latest in --checkpoint-dir)")
+    parser.add_argument('--checkpoint-dir', default='checkpoints')
+    parser.add_argument('--checkpoint-step', type=int, default=1000)
+    parser.add_argument('--accumulation-steps', type=int, default=1)
+    parser.add_argument('--bf16', action='store_true', help="Use bfloat16 autocast")
+    parser.add_argument('--val-sample-size', type=int, default=2000,
+                        help="Validation samples used between epochs (the full set runs at epoch end)")
+    parser.add_argument('--patience', type=int, default=5,
+                        help="Sampled validations without improvement before stopping early")
+    parser.add_argument('--nproc', type=int, default=1,
+                        help="Number of local data-parallel ranks (use torchrun for several hosts)")
+    parser.add_argument('--master-port', type=int, default=29500)
+    return parser.parse_args()
+
+def run(args):
+    # Rank 0 downloads and tokenizes first; the other ranks then reuse its files
+    with main_process_first():
+        # Load the dataset
+        squad_dataset = load_dataset("rajpurkar/squad")
+
+        # Tokenize once into memory-mapped token files (reused on later runs)
+        tokenizer = T5Tokenizer.from_pretrained("t5-large")
+        train_dataset = load_or_tokenize(squad_dataset['train'], tokenizer, 'tokenized/squad_train')
+        val_dataset = load_or_tokenize(squad_dataset['validation'], tokenizer, 'tokenized/squad_validation')
 
-    # Initialize the tokenizer and model
-    tokenizer = T5Tokenizer.from_pretrained("t5-large")
+    # Initialize the model
     model = T5ForConditionalGeneration.from_pretrained("t5-large")
 
     # Wrap the model in our custom QAModel
     qa_model = QAModel(model)
 
-    # Create datasets
-    train_dataset = preprocess(squad_dataset['train'], tokenizer)
-    val_dataset = preprocess(squad_dataset['validation'], tokenizer)
+    collate_fn = PadCollator(tokenizer.pad_token_id)
 
-    # Set device
-    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-    print(f"Using device: {device}")
+    # Set device; distributed training uses the gloo backend on CPU
+    device = torch.device("cuda" if torch.cuda.is_available() and not is_distributed() else "cpu")
+    if is_main_process():
+        print(f"Using device: {device}")
 
     # Train the model
-    train(qa_model, train_dataset, val_dataset, tokenizer, device)
+    train(qa_model, train_dataset, val_dataset, tokenizer, device, collate_fn=collate_fn,
+          accumulation_steps=args.accumulation_steps, bf16=args.bf16, checkpoint_dir=args.checkpoint_dir,
+          checkpoint_step=args.checkpoint_step, resume=args.resume, val_sample_size=args.val_sample_size,
+          patience=args.patience)
 
-    # Evaluate the model
-    evaluate(qa_model, val_dataset, device)
+    if is_main_process():
+        # Evaluate the model
+        evaluate(qa_model, val_dataset, device, collate_fn=collate_fn)
+
+        # Test the model
+        test(qa_model, tokenizer, device)
+
+def main():
+    args = parse_args()
+    if args.nproc > 1:
+        launch(run, args.nproc, args=(args,), master_port=args.master_port)
+        return
 
-    # Test the model
-    test(qa_model, tokenizer, device)
+    # A single process, or one rank started by torchrun
+    init_distributed()
+    try:
+        run(args)
+    finally:
+        cleanup_distributed()
 
 if __name__ == "__main__":
     main()
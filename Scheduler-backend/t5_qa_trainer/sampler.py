@@ -0,0 +1,158 @@
+import os
+import random
+
+from torch.utils.data import DataLoader, DistributedSampler, Sampler, Subset
+from distributed import get_rank, get_world_size
+
+
+class LengthBucketSampler(Sampler):
+    """
+    Batch sampler that groups samples of similar length.
+
+    Indices are shuffled, split into pools of ``pool_size`` samples, and each
+    pool is sorted by length before being cut into batches, so batches hold
+    similar lengths while the epoch order stays random. Batches are either a
+    fixed number of samples (``batch_size``) or as many samples as fit in
+    ``max_tokens`` padded input tokens (longest sample x batch size).
+
+    For distributed training every rank builds the same batch list and takes
+    every ``num_replicas``-th batch, starting at its ``rank``. With ``pad``
+    the list is padded by repeating batches from its start so every rank gets
+    the same number of batches (DDP needs the same number of steps on every
+    rank). Evaluation turns it off: ranks may then get one batch fewer, but no
+    sample is seen twice.
+
+    Args:
+        lengths (sequence of int): Input length of every sample.
+        batch_size (int): Samples per batch; ignored if max_tokens is given.
+        max_tokens (int): Token budget per batch. Defaults to None.
+        shuffle (bool): Shuffle samples and batch order each epoch. Defaults to True.
+        pool_size (int): Samples sorted together. Defaults to 100 batches' worth.
+        seed (int): Base random seed; combined with the epoch set by set_epoch.
+        num_replicas (int): Number of ranks sharing the data. Defaults to 1.
+        rank (int): This process's rank. Defaults to 0.
+        pad (bool): Repeat batches so every rank gets as many. Defaults to True.
+    """
+
+    def __init__(self, lengths, batch_size=8, max_tokens=None, shuffle=True, pool_size=None, seed=0,
+                 num_replicas=1, rank=0, pad=True):
+        if max_tokens is None and not batch_size:
+            raise ValueError("Either batch_size or max_tokens is required")
+        self.lengths = [int(length) for length in lengths]
+        self.batch_size = batch_size
+        self.max_tokens = max_tokens
+        self.shuffle = shuffle
+        self.pool_size = pool_size or 100 * (batch_size or 8)
+        self.seed = seed
+        self.num_replicas = num_replicas
+        self.rank = rank
+        self.pad = pad
+        self.epoch = 0
+        self.start = 0
+        self._batches = None
+
+    def set_epoch(self, epoch):
+        """Sets the epoch so each epoch gets a different, reproducible order."""
+        self.start = 0
+        if epoch != self.epoch:
+            self.epoch = epoch
+            self._batches = None
+
+    def skip(self, num_batches):
+        """Skips the first ``num_batches`` batches of the current epoch (used when resuming mid-epoch)."""
+        self.start = num_batches
+
+    def _make_batches(self):
+        rng = random.Random(self.seed + self.epoch)
+        indices = list(range(len(self.lengths)))
+        if self.shuffle:
+            rng.shuffle(indices)
+
+        batches = []
+        for start in range(0, len(indices), self.pool_size):
+            pool = sorted(indices[start:start + self.pool_size], key=self.lengths.__getitem__)
+            batches.extend(self._split(pool))
+
+        if self.shuffle:
+            rng.shuffle(batches)
+        if self.num_replicas > 1:
+            if self.pad and batches:
+                padding = -len(batches) % self.num_replicas
+                batches += (batches * (padding // len(batches) + 1))[:padding]
+            batches = batches[self.rank::self.num_replicas]
+        return batches
+
+    def _split(self, pool):
+        if self.max_tokens is None:
+            return [pool[i:i + self.batch_size] for i in range(0, len(pool), self.batch_size)]
+
+        batches, batch, longest = [], [], 0
+        for index in pool:
+            length = self.lengths[index]
+            # A sample longer than the budget still gets a batch of its own
+            if batch and max(longest, length) * (len(batch) + 1) > self.max_tokens:
+                batches.append(batch)
+                batch, longest = [], 0
+            batch.append(index)
+            longest = max(longest, length)
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def __iter__(self):
+        batches = self._batches if self._batches is not None else self._make_batches()
+        self._batches = None
+        return iter(batches[self.start:])
+
+    def __len__(self):
+        if self._batches is None:
+            self._batches = self._make_batches()
+        return len(self._batches)
+
+
+def build_dataloader(dataset, batch_size=8, max_tokens=None, shuffle=False, num_workers=0, collate_fn=None, seed=0,
+                     shard=False, pad_shards=True):
+    """
+    Builds a DataLoader that uses length bucketing when the dataset can report
+    its sample lengths (``MemmapDataset.lengths``), and a plain batched loader
+    otherwise. With ``shard`` each rank of a distributed run loads only its
+    share of the data: bucketed batches are split between ranks, plain
+    loaders use a DistributedSampler. Shards are padded to the same number of
+    batches for training; evaluation loaders pass ``pad_shards=False`` so
+    that the losses summed over ranks count every sample exactly once.
+
+    Args:
+        dataset (Dataset): Dataset to load from.
+        batch_size (int): Samples per batch (ignored with max_tokens).
+        max_tokens (int): Token budget per batch. Defaults to None.
+        shuffle (bool): Shuffle each epoch. Defaults to False.
+        num_workers (int): Loader worker processes. Defaults to 0.
+        collate_fn (callable): Batch collate function, e.g. PadCollator.
+        seed (int): Random seed for the bucketing sampler.
+        shard (bool): Split the data between distributed ranks. Defaults to False.
+        pad_shards (bool): Repeat data so every rank gets as many batches. Defaults to True.
+
+    Returns:
+        DataLoader: Loader whose batch_sampler (if bucketing) or sampler supports set_epoch.
+    """
+    num_workers = min(num_workers, os.cpu_count() or 1)
+    worker_args = {'num_workers': num_workers, 'persistent_workers': num_workers > 0}
+    if num_workers > 0:
+        worker_args['prefetch_factor'] = 4
+
+    num_replicas, rank = (get_world_size(), get_rank()) if shard else (1, 0)
+
+    if hasattr(dataset, 'lengths'):
+        sampler = LengthBucketSampler(dataset.lengths(), batch_size=batch_size, max_tokens=max_tokens,
+                                      shuffle=shuffle, seed=seed, num_replicas=num_replicas, rank=rank,
+                                      pad=pad_shards)
+        return DataLoader(dataset, batch_sampler=sampler, collate_fn=collate_fn, **worker_args)
+    if num_replicas > 1 and not pad_shards:
+        # DistributedSampler always pads, so take every num_replicas-th sample directly
+        shard_dataset = Subset(dataset, range(rank, len(dataset), num_replicas))
+        return DataLoader(shard_dataset, batch_size=batch_size, shuffle=shuffle, collate_fn=collate_fn,
+                          **worker_args)
+    if num_replicas > 1:
+        sampler = DistributedSampler(dataset, num_replicas=num_replicas, rank=rank, shuffle=shuffle, seed=seed)
+        return DataLoader(dataset, batch_size=batch_size, sampler=sampler, collate_fn=collate_fn, **worker_args)
+    return DataLoader(dataset, batch_size=batch_size, shuffle=shuffle, collate_fn=collate_fn, **worker_args)
@@ -1,15 +1,36 @@
+import itertools
 import json
+import math
 import os
+import time
+from contextlib import nullcontext
 import torch
-from torch.utils.data import DataLoader
+from torch.nn.parallel import DistributedDataParallel
 from torch.optim import AdamW
 from transformers import get_linear_schedule_with_warmup
 from tqdm import tqdm
-from validate import validate
+from validate import EarlyStopping, stratified_sample, validate
+from sampler import build_dataloader
+from checkpoint import CheckpointManager, rng_state, set_rng_state
+from distributed import all_gather_object, all_reduce_sum, barrier, get_rank, get_world_size, is_distributed, \
+    is_main_process
 
-def train(model, train_dataset, val_dataset, tokenizer, device, num_epochs=10, batch_size=1, lr=5e-5, valid_step=5000):
+def train(model, train_dataset, val_dataset, tokenizer, device, num_epochs=10, batch_size=8, lr=5e-5, valid_step=5000,
+          collate_fn=None, max_tokens=None, num_workers=2, accumulation_steps=1, bf16=False,
+          checkpoint_dir='checkpoints', checkpoint_step=1000, keep_checkpoints=3, resume=None,
+          val_sample_size=2000, patience=5, min_delta=0.0, output_dir='trained_t5_qa'):
     """
     Train the model on training dataset and validate on validation dataset.
+
+    Every ``valid_step`` steps the model is validated on a fixed, length-
+    stratified subsample of the validation set; that loss picks the best model
+    and drives early stopping. The full validation set is only run at the end
+    of each epoch. If training stops early, the best weights are restored
+    before the final model is saved.
+
+    When a process group has been initialized (see distributed.py) the model
+    is wrapped in DistributedDataParallel and every rank trains on its own
+    shard of the data. Only rank 0 writes checkpoints, logs and the final model.
     
     Args:
         model: PyTorch model to train
@@ -21,64 +42,214 @@ def train(model, train_dataset, val_dataset, tokenizer, device, num_epochs=10, b
         batch_size: Batch size for training
         lr: Learning rate
         valid_step: Frequency of validation steps
+        collate_fn: Batch collate function (e.g. PadCollator for MemmapDataset)
+        max_tokens: Token budget per batch; replaces batch_size when set
+        num_workers: DataLoader worker processes
+        accumulation_steps: Batches whose gradients are summed per optimizer step
+        bf16: Run the forward pass under bfloat16 autocast
+        checkpoint_dir: Directory for periodic checkpoints, the best model and the throughput log
+        checkpoint_step: Frequency (in optimizer steps) of checkpoints
+        keep_checkpoints: Number of most recent checkpoints to keep
+        resume: Checkpoint path to resume from, or 'latest' for the newest one in checkpoint_dir
+        val_sample_size: Validation samples used between epochs; None for the full set
+        patience: Sampled validations without improvement before stopping; None to never stop early
+        min_delta: Smallest loss decrease that counts as an improvement
+        output_dir: Directory the final model and tokenizer are saved to
     
     Returns:
         None
     """
     # Create data loaders for training and validation datasets
-    train_loader = DataLoader(train_dataset, batch_size=batch_size, shuffle=True, num_workers=0)
-    val_loader = DataLoader(val_dataset, batch_size=batch_size, shuffle=False, num_workers=0)
-
-    optimizer = AdamW(model.parameters(), lr=lr)
-    total_steps = len(train_loader) * num_epochs
-    scheduler = get_linear_schedule_with_warmup(optimizer, num_warmup_steps=0, num_training_steps=total_steps)
+    # Length-bucketed batches keep padding (and wasted compute) to a minimum
+    train_loader = build_dataloader(train_dataset, batch_size=batch_size, max_tokens=max_tokens, shuffle=True,
+                                    num_workers=num_workers, collate_fn=collate_fn, shard=True)
+    # Validation shards are not padded: a repeated batch would count twice in the loss summed over ranks
+    val_loader = build_dataloader(val_dataset, batch_size=batch_size, max_tokens=max_tokens, shuffle=False,
+                                  num_workers=num_workers, collate_fn=collate_fn, shard=True, pad_shards=False)
+    sample_loader = build_dataloader(stratified_sample(val_dataset, val_sample_size), batch_size=batch_size,
+                                     max_tokens=max_tokens, shuffle=False, num_workers=num_workers,
+                                     collate_fn=collate_fn, shard=True, pad_shards=False)
 
-    # Initialize optimizer and learning rate scheduler
+    # Move model to specified device and set to training mode
     model.to(device)
     model.train()
 
+    # Initialize optimizer and learning rate scheduler
+    optimizer = AdamW(model.parameters(), lr=lr)
+    steps_per_epoch = math.ceil(len(train_loader) / accumulation_steps)
+    total_steps = steps_per_epoch * num_epochs
+    scheduler = get_linear_schedule_with_warmup(optimizer, num_warmup_steps=0, num_training_steps=total_steps)
+
+    checkpoints = CheckpointManager(checkpoint_dir, keep=keep_checkpoints)
     global_step = 0
-    best_val_loss = float('inf')
+    start_epoch = 0
+    # Batches of the current epoch already consumed; skipped when resuming mid-epoch
+    batches_done = 0
+    early_stopping = EarlyStopping(patience, min_delta)
+    resume_rng = None
 
-    # Move model to specified device and set to training mode
-    for epoch in range(num_epochs):
-        print(f"Epoch {epoch + 1}/{num_epochs}")
-        for batch in tqdm(train_loader):
+    if resume == 'latest':
+        resume = checkpoints.latest()
+    if resume:
+        state = CheckpointManager.load(resume)
+        model.load_state_dict(state['model'])
+        optimizer.load_state_dict(state['optimizer'])
+        scheduler.load_state_dict(state['scheduler'])
+        global_step = state['global_step']
+        start_epoch = state['epoch']
+        batches_done = state['batches_done']
+        early_stopping.best_loss = state['best_val_loss']
+        early_stopping.stale = state['stale_validations']
+        # RNG states are saved per rank; a different world size reuses rank 0's
+        rng_states = state['rng']
+        resume_rng = rng_states[get_rank()] if len(rng_states) == get_world_size() else rng_states[0]
+        if is_main_process():
+            print(f"Resumed from {resume} at step {global_step} (epoch {start_epoch + 1}, batch {batches_done})")
+
+    # Wrapping broadcasts rank 0's weights, so every rank starts identical
+    ddp_model = DistributedDataParallel(model) if is_distributed() else model
+    throughput_log = open(os.path.join(checkpoint_dir, 'throughput.jsonl'), 'a') if is_main_process() else None
+    autocast = torch.autocast(device_type=device.type, dtype=torch.bfloat16, enabled=bf16)
+
+    stopped_early = False
+    for epoch in range(start_epoch, num_epochs):
+        if is_main_process():
+            print(f"Epoch {epoch + 1}/{num_epochs}")
+        batches = train_loader
+        if hasattr(train_loader.batch_sampler, 'set_epoch'):
+            train_loader.batch_sampler.set_epoch(epoch)
+            train_loader.batch_sampler.skip(batches_done)
+        else:
+            if hasattr(train_loader.sampler, 'set_epoch'):
+                train_loader.sampler.set_epoch(epoch)
+            if 0 < batches_done < len(train_loader):
+                # Plain loaders can't skip without loading, so drop the batches already seen
+                batches = itertools.islice(train_loader, batches_done, None)
+        if batches_done >= len(train_loader):
+            # Resumed after the epoch's last step, but before its full validation
+            batches = ()
+        batches = iter(batches)
+        # The epoch's last step accumulates fewer batches when accumulation_steps doesn't divide them
+        last_step_batches = len(train_loader) % accumulation_steps or accumulation_steps
+        if resume_rng is not None:
+            # Creating the loader iterator draws from the RNG, so restore it afterwards
+            set_rng_state(resume_rng)
+            resume_rng = None
+
+        step_tokens = 0
+        step_loss = 0.0
+        step_started = time.perf_counter()
+        optimizer.zero_grad()
+        for batch in tqdm(batches, total=len(train_loader), initial=batches_done, disable=not is_main_process()):
             # Prepare input data
             input_ids = batch['input_ids'].to(device)
             attention_mask = batch['attention_mask'].to(device)
             labels = batch['labels'].to(device)
 
-            outputs = model(input_ids, attention_mask, labels=labels)
-            loss = outputs.loss
+            batches_done += 1
+            step_end = batches_done % accumulation_steps == 0 or batches_done == len(train_loader)
+            in_last_step = batches_done > len(train_loader) - last_step_batches
+            # Gradients are only all-reduced between ranks on the last batch of a step
+            sync = nullcontext() if step_end or not is_distributed() else ddp_model.no_sync()
+            with sync:
+                with autocast:
+                    outputs = ddp_model(input_ids, attention_mask, labels=labels)
+                # Scale so the accumulated gradient is the mean over the step's batches
+                loss = outputs.loss / (last_step_batches if in_last_step else accumulation_steps)
+                loss.backward()
 
-            # Backward pass and optimization step
-            loss.backward()
+            step_loss += loss.item()
+            step_tokens += int(attention_mask.sum()) + int((labels != -100).sum())
+            if not step_end:
+                continue
+
+            # Optimization step once enough gradients have been accumulated
             optimizer.step()
             scheduler.step()
             optimizer.zero_grad()
-
             global_step += 1
 
-            # Validate model every 'valid_step' iterations
+            elapsed = time.perf_counter() - step_started
+            # Loss and tokens summed over ranks, so the log shows whole-job throughput
+            step_loss, step_tokens = all_reduce_sum(step_loss / get_world_size(), step_tokens)
+            if throughput_log is not None:
+                throughput_log.write(json.dumps({
+                    'step': global_step,
+                    'loss': step_loss,
+                    'tokens': int(step_tokens),
+                    'seconds': elapsed,
+                    'tokens_per_sec': step_tokens / elapsed if elapsed else 0.0,
+                    'lr': scheduler.get_last_lr()[0],
+                }) + '\n')
+            step_tokens = 0
+            step_loss = 0.0
+
+            # Validate model on the sampled subset every 'valid_step' iterations
             if global_step % valid_step == 0:
-                val_loss = validate(model, val_loader, device)
-                print(f"Step {global_step}: Validation Loss: {val_loss:.4f}")
+                val_loss = validate(model, sample_loader, device)
+                if is_main_process():
+                    print(f"Step {global_step}: Sampled Validation Loss: {val_loss:.4f}")
 
                 # Update best validation loss and save new best model
-                if val_loss < best_val_loss:
-                    best_val_loss = val_loss
-                    torch.save(model.state_dict(), 'best_model.pth')
-                    print(f"New best model saved with validation loss: {best_val_loss:.4f}")
+                if early_stopping.update(val_loss):
+                    if is_main_process():
+                        checkpoints.save_file(model.state_dict(), 'best_model.pth')
+                        print(f"New best model saved with validation loss: {val_loss:.4f}")
+                # The loss is reduced over ranks, so every rank stops at the same step
+                stopped_early = early_stopping.should_stop
 
                 model.train()
 
-    # Save final trained model and tokenizer
-    print("Saving the final model and tokenizer...")
-    save_custom_model(model, tokenizer, 'trained_t5_qa')
-    print("Final model and tokenizer saved in 'trained_t5_qa' directory")
+            # Checkpoint everything needed to continue from exactly this step. After an epoch's
+            # last step the position stays in that epoch, so a resumed run still validates it.
+            if global_step % checkpoint_step == 0:
+                rng_states = all_gather_object(rng_state())
+                if is_main_process():
+                    checkpoints.save({
+                        'model': model.state_dict(),
+                        'optimizer': optimizer.state_dict(),
+                        'scheduler': scheduler.state_dict(),
+                        'global_step': global_step,
+                        'epoch': epoch,
+                        'batches_done': batches_done,
+                        'best_val_loss': early_stopping.best_loss,
+                        'stale_validations': early_stopping.stale,
+                        'rng': rng_states,
+                    }, global_step)
+
+            if stopped_early:
+                break
+            step_started = time.perf_counter()
+        batches_done = 0
+
+        if stopped_early:
+            if is_main_process():
+                print(f"Stopping early: no improvement in {early_stopping.stale} validations "
+                      f"(best loss {early_stopping.best_loss:.4f})")
+            break
+
+        # Full validation pass once per epoch
+        val_loss = validate(model, val_loader, device)
+        if is_main_process():
+            print(f"Epoch {epoch + 1}: Validation Loss: {val_loss:.4f}")
+        model.train()
+
+    if is_main_process():
+        throughput_log.close()
+        checkpoints.wait()
+
+        best_model_path = os.path.join(checkpoint_dir, 'best_model.pth')
+        if stopped_early and os.path.exists(best_model_path):
+            model.load_state_dict(torch.load(best_model_path, map_location='cpu'))
+            print("Restored the best model weights")
+
+        # Save final trained model and tokenizer
+        print("Saving the final model and tokenizer...")
+        save_custom_model(model, tokenizer, output_dir)
+        print(f"Final model and tokenizer saved in '{output_dir}' directory")
 
-    print("Training completed!")
+        print("Training completed!")
+    barrier()
 
 def save_custom_model(model, tokenizer, save_dir):
     if not os.path.exists(save_dir):
@@ -1,78 +1,150 @@
+import random
+
 import torch
-from torch.utils.data import Dataset
+from torch.utils.data import Subset
 from tqdm import tqdm
+from distributed import all_reduce_sum, is_main_process
+
+
+class LengthSubset(Subset):
+    """
+    Subset that keeps reporting sample lengths, so loaders built from it
+    still use length bucketing.
+    """
 
-class PreprocessDataset(Dataset):
+    def lengths(self):
+        """Returns the input length of every sample in the subset."""
+        lengths = self.dataset.lengths()
+        return [lengths[index] for index in self.indices]
+
+
+def stratified_sample(dataset, size, num_strata=10, seed=0):
     """
-    Custom dataset class for preprocessing data for T5 model training.
-    
+    Picks a fixed subsample that keeps the dataset's mix of input lengths.
+
+    Samples are sorted by length, cut into ``num_strata`` equal strata and
+    the same fraction is drawn from each, so short and long contexts are
+    represented as in the full set. The same seed always gives the same
+    subsample, which keeps losses comparable between validation runs.
+
     Args:
-        dataset (list): List of dictionaries containing context, question, and answers.
-        tokenizer (transformers.Tokenizer): Tokenizer object for encoding texts.
-        max_length (int): Maximum length of input sequences. Defaults to 512.
+        dataset (Dataset): Dataset to sample from; stratified if it has lengths().
+        size (int): Number of samples to keep.
+        num_strata (int): Number of length strata. Defaults to 10.
+        seed (int): Random seed. Defaults to 0.
+
+    Returns:
+        Dataset: The subsample, or the dataset itself if it is not larger than size.
     """
+    if size is None or size >= len(dataset):
+        return dataset
+
+    rng = random.Random(seed)
+    if not hasattr(dataset, 'lengths'):
+        return Subset(dataset, sorted(rng.sample(range(len(dataset)), size)))
+
+    lengths = dataset.lengths()
+    by_length = sorted(range(len(dataset)), key=lengths.__getitem__)
+    indices = []
+    for stratum in range(num_strata):
+        members = by_length[stratum * len(by_length) // num_strata:(stratum + 1) * len(by_length) // num_strata]
+        # Spread the size over the strata; the rounding leftovers go to the last ones
+        quota = (stratum + 1) * size // num_strata - stratum * size // num_strata
+        indices.extend(rng.sample(members, min(quota, len(members))))
+    return LengthSubset(dataset, sorted(indices))
 
-    def __init__(self, dataset, tokenizer, max_length=512):
-        """
-        Initialize the PreprocessDataset with the dataset, tokenizer, and max_length.
-        
-        Args:
-            dataset (list): List of dictionaries containing context, question, and answers.
-            tokenizer (transformers.Tokenizer): Tokenizer object for encoding texts.
-            max_length (int): Maximum length of input sequences. Defaults to 512.
-        """
-        self.dataset = dataset
-        self.tokenizer = tokenizer
-        self.max_length = max_length
 
-    def __len__(self):
-        """Return the number of samples in the dataset."""
-        return len(self.dataset)
+def average_loss(model, loader, device, desc="Validating", reduce=True):
+    """
+    Batched, no-grad loss loop shared by validation and evaluation.
+
+    The loss is averaged over samples (each batch's mean loss weighted by its
+    size), so token-budget batches of different sizes count fairly. With
+    ``reduce`` in distributed training, each rank runs its own shard and the
+    sums are reduced over ranks, so every rank returns the same value.
 
-    def __getitem__(self, idx):
+    Args:
+        model (nn.Module): Model to run.
+        loader (DataLoader): Loader built with sampler.build_dataloader.
+        device (torch.device): Device to move the data to.
+        desc (str): Progress bar label.
+        reduce (bool): Sum over ranks; every rank must call it. Defaults to True.
+
+    Returns:
+        float: Average loss per sample.
+    """
+    model.eval()
+    total_loss = 0.0
+    num_samples = 0
+    with torch.no_grad():
+        for batch in tqdm(loader, desc=desc, disable=not is_main_process()):
+            input_ids = batch['input_ids'].to(device)
+            attention_mask = batch['attention_mask'].to(device)
+            labels = batch['labels'].to(device)
+
+            outputs = model(input_ids, attention_mask, labels=labels)
+            total_loss += outputs.loss.item() * len(input_ids)
+            num_samples += len(input_ids)
+
+    if reduce:
+        total_loss, num_samples = all_reduce_sum(total_loss, num_samples)
+    return total_loss / num_samples if num_samples else float('nan')
+
+
+def validate(model, val_loader, device):
+    """
+    Compute the average loss over a validation loader.
+
+    Args:
+        model (nn.Module): PyTorch model to validate.
+        val_loader (DataLoader): Loader built with sampler.build_dataloader (sharded when distributed).
+        device (torch.device): Device to move the data to.
+
+    Returns:
+        float: Average loss per sample.
+    """
+    return average_loss(model, val_loader, device, desc="Validating")
+
+
+class EarlyStopping:
+    """
+    Patience-based early stopping on validation loss.
+
+    A validation counts as an improvement if the loss drops below the best
+    so far by more than ``min_delta``. Training should stop once ``patience``
+    validations in a row haven't improved.
+
+    Args:
+        patience (int): Validations without improvement before stopping; None disables stopping.
+        min_delta (float): Smallest decrease that counts as an improvement. Defaults to 0.
+        best_loss (float): Best loss so far (when resuming). Defaults to infinity.
+        stale (int): Validations without improvement so far (when resuming). Defaults to 0.
+    """
+
+    def __init__(self, patience, min_delta=0.0, best_loss=float('inf'), stale=0):
+        self.patience = patience
+        self.min_delta = min_delta
+        self.best_loss = best_loss
+        self.stale = stale
+
+    def update(self, loss):
         """
-        Get a single sample from the dataset.
+        Records a validation loss.
 
         Args:
-            idx (int): Index of the sample.
+            loss (float): Latest validation loss.
 
         Returns:
-            dict: Dictionary containing 'input_ids', 'attention_mask', and 'labels'.
+            bool: True if the loss is a new best.
         """
-        item = self.dataset[idx]
-        context = item['context']
-        question = item['question']
-        answer = item['answers']['text'][0]
-
-        # Combine context and question into input_text
-        input_text = f"context: {context} question: {question}"
-
-        # Prepare target_text with question and answer separated by <sep>
-        target_text = f"{question} <sep> {answer}"
-
-        # Encode input_text
-        inputs = self.tokenizer.encode_plus(
-            input_text,
-            max_length=self.max_length,
-            padding='max_length',
-            truncation=True,
-            return_tensors='pt'
-        )
-
-        # Encode target_text
-        targets = self.tokenizer.encode_plus(
-            target_text,
-            max_length=self.max_length,
-            padding='max_length',
-            truncation=True,
-            return_tensors='pt'
-        )
-
-        # Return processed data as dictionary
-        return {
-            'input_ids': inputs['input_ids'].squeeze(),
-            'attention_mask': inputs['attention_mask'].squeeze(),
-            'labels': targets['input_ids'].squeeze()
-        }
-
+        if loss < self.best_loss - self.min_delta:
+            self.best_loss = loss
+            self.stale = 0
+            return True
+        self.stale += 1
+        return False
 
+    @property
+    def should_stop(self):
+        """True once ``patience`` validations in a row haven't improved."""
+        return self.patience is not None and self.stale >= self.patience
@@ -0,0 +1,164 @@
+import math
+import re
+from collections import deque
+
+# A run of sentence terminators, optionally followed by closing quotes or
+# brackets, that is followed by whitespace. Decimals ("3.14") and dotted
+# names ("example.com") never match because nothing separates the parts.
+# The first character after the whitespace is captured for _is_boundary.
+_TERMINATOR = re.compile(r'[.!?]+["\')\]’”]*(?=\s+(?P<next>\S)|\s)')
+
+# Lower-case words that end with a period without ending the sentence
+ABBREVIATIONS = frozenset({
+    'mr', 'mrs', 'ms', 'dr', 'prof', 'sr', 'jr', 'st', 'vs', 'etc', 'e.g', 'i.e', 'cf', 'al', 'approx',
+    'fig', 'figs', 'eq', 'eqs', 'no', 'nos', 'vol', 'p', 'pp', 'ch', 'sec', 'ed', 'eds', 'inc', 'ltd', 'co',
+    'corp', 'dept', 'est', 'jan', 'feb', 'mar', 'apr', 'jun', 'jul', 'aug', 'sep', 'sept', 'oct', 'nov', 'dec',
+})
+
+# Longest word looked at when checking for an abbreviation
+_MAX_ABBREVIATION_CHARS = 12
+
+# Text without any sentence boundary is emitted once it grows past this,
+# so the carry-over between pages (and the work per page) stays bounded
+MAX_SENTENCE_CHARS = 2000
+
+
+def _is_boundary(text, match):
+    """Decides whether a _TERMINATOR match ends a sentence."""
+    # A sentence doesn't continue in lower case ("approx. three")
+    following = match.group('next')
+    if following is not None and following.islower():
+        return False
+    start = match.start()
+    if text[start] == '.':
+        limit = max(0, start - _MAX_ABBREVIATION_CHARS)
+        word_start = max(text.rfind(' ', limit, start), text.rfind('\n', limit, start), limit - 1) + 1
+        word = text[word_start:start].lstrip('("\'')
+        # Known abbreviations and initials ("J. Smith")
+        if word.lower() in ABBREVIATIONS or (len(word) == 1 and word.isalpha()):
+            return False
+    return True
+
+
+def _normalise(text):
+    return ' '.join(text.split())
+
+
+def iter_sentences(pages, max_sentence_chars=MAX_SENTENCE_CHARS):
+    """
+    Splits a stream of page texts into sentences.
+
+    Pages are consumed one at a time, so a whole document is never held in
+    memory. Text after the last sentence boundary of a page is carried over
+    to the next page, so sentences that cross a page break come out whole; a
+    word hyphenated across the break is joined back together. Each page (and
+    the bounded carry-over) is scanned once, so the cost is linear in the
+    length of the text.
+
+    :param pages: Iterable of page texts
+    :param max_sentence_chars: Text without a boundary is cut at a space once it is this long
+    :return: Generator of whitespace-normalised sentences
+    """
+    carry = ''
+    for page in pages:
+        if not carry:
+            text = page
+        elif carry.endswith('-') and page.lstrip()[:1].islower():
+            text = carry[:-1] + page.lstrip()
+        else:
+            text = carry + '\n' + page
+
+        start = 0
+        for match in _TERMINATOR.finditer(text):
+            if _is_boundary(text, match):
+                end = match.end()
+                sentence = _normalise(text[start:end])
+                if sentence:
+                    yield sentence
+                start = end
+
+        # Keep the unfinished sentence, cutting it down if it has grown too long
+        while len(text) - start > max_sentence_chars:
+            cut = text.rfind(' ', start, start + max_sentence_chars)
+            if cut <= start:
+                cut = start + max_sentence_chars
+            sentence = _normalise(text[start:cut])
+            if sentence:
+                yield sentence
+            start = cut
+        carry = text[start:].rstrip()
+
+    sentence = _normalise(carry)
+    if sentence:
+        yield sentence
+
+
+def approx_token_count(text):
+    """Cheap token estimate (about four characters per subword token)."""
+    return (len(text) + 3) // 4
+
+
+def _split_long(text, tokens, count_tokens, max_tokens):
+    # Cut an over-long sentence into equal runs of words, and a word with no
+    # whitespace into runs of characters, until every piece fits the budget
+    words = text.split()
+    if len(words) > 1:
+        pieces = math.ceil(tokens / max_tokens)
+        size = math.ceil(len(words) / pieces)
+        parts = (' '.join(words[i:i + size]) for i in range(0, len(words), size))
+    elif len(text) > 1:
+        size = max(1, len(text) * max_tokens // tokens)
+        parts = (text[i:i + size] for i in range(0, len(text), size))
+    else:
+        yield text, tokens
+        return
+    for part in parts:
+        part_tokens = count_tokens(part)
+        if part_tokens <= max_tokens:
+            yield part, part_tokens
+        else:
+            yield from _split_long(part, part_tokens, count_tokens, max_tokens)
+
+
+def iter_context_windows(sentences, count_tokens=approx_token_count, max_tokens=512, overlap_tokens=64):
+    """
+    Packs consecutive sentences into context windows for the model.
+
+    Each window holds as many whole sentences as fit in ``max_tokens``. The
+    next window starts with the last sentences of the previous one, up to
+    ``overlap_tokens``, so a fact split over a window edge is seen whole at
+    least once. Every sentence is counted once and enters and leaves the
+    window once, so the cost is linear in the number of sentences.
+
+    :param sentences: Iterable of sentences (e.g. from ``iter_sentences``)
+    :param count_tokens: Function returning the number of tokens in a text
+    :param max_tokens: Token budget of a window
+    :param overlap_tokens: Tokens of trailing context repeated in the next window
+    :return: Generator of window texts
+    """
+    window = deque()
+    total = 0
+    # Whether the window holds a sentence that hasn't been emitted yet
+    pending = False
+
+    def pieces():
+        for sentence in sentences:
+            tokens = count_tokens(sentence)
+            if tokens <= max_tokens:
+                yield sentence, tokens
+            else:
+                yield from _split_long(sentence, tokens, count_tokens, max_tokens)
+
+    for sentence, tokens in pieces():
+        if total + tokens > max_tokens:
+            if pending:
+                yield ' '.join(text for text, _ in window)
+                pending = False
+            while window and (total > overlap_tokens or total + tokens > max_tokens):
+                total -= window.popleft()[1]
+        window.append((sentence, tokens))
+        total += tokens
+        pending = True
+
+    if pending:
+        yield ' '.join(text for text, _ in window)
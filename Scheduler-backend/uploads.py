@@ -0,0 +1,280 @@
+import fcntl
+import hashlib
+import json
+import os
+import re
+import time
+import uuid
+
+from flask import Request, current_app
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from extraction_cache import HASH_CHUNK_SIZE
+
+_UPLOAD_ID = re.compile(r'[0-9a-f]{32}')
+
+
+class UploadOffsetMismatch(ValueError):
+    """Raised when a chunk does not start where the stored upload ends."""
+
+    def __init__(self, offset):
+        super().__init__(f"Upload is at offset {offset}")
+        self.offset = offset
+
+
+class HashingFile:
+    """
+    Write-through file for multipart uploads.
+
+    Werkzeug's form parser writes each block of an uploaded file into the
+    stream it gets from ``Request._get_file_stream``. This one writes the
+    block straight to a temporary file in the upload folder and into a
+    SHA-256 digest, so the upload is hashed and on disk when parsing ends,
+    without a second copy, and it is rejected as soon as it passes
+    ``max_bytes``. Unless ``commit`` moves it into place, the temporary file
+    is removed when the request closes its files.
+
+    Args:
+        directory (str): Folder for the temporary file.
+        max_bytes (int): Largest accepted file; None for no limit.
+    """
+
+    def __init__(self, directory, max_bytes=None):
+        self.path = os.path.join(directory, f"{uuid.uuid4().hex}.part")
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._digest = hashlib.sha256()
+        self._file = open(self.path, 'w+b')
+        self._committed = False
+
+    def write(self, data):
+        self.size += len(data)
+        if self.max_bytes is not None and self.size > self.max_bytes:
+            raise RequestEntityTooLarge(f"Uploads are limited to {self.max_bytes} bytes")
+        self._digest.update(data)
+        return self._file.write(data)
+
+    def hexdigest(self):
+        """Returns the SHA-256 hex digest of the bytes written so far."""
+        return self._digest.hexdigest()
+
+    def commit(self, file_path):
+        """Moves the uploaded file to its final path."""
+        self._file.close()
+        os.replace(self.path, file_path)
+        self._committed = True
+
+    def close(self):
+        self._file.close()
+        if not self._committed and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __getattr__(self, name):
+        # read/seek/readline and friends come from the underlying file
+        return getattr(self._file, name)
+
+
+class StreamingRequest(Request):
+    """Request class whose uploaded files stream into a ``HashingFile``."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        stream = HashingFile(current_app.config['UPLOAD_FOLDER'], current_app.config.get('MAX_UPLOAD_BYTES'))
+        # Kept here too: a file rejected mid-parse never reaches request.files
+        self.__dict__.setdefault('_upload_streams', []).append(stream)
+        return stream
+
+    def close(self):
+        super().close()
+        for stream in self.__dict__.get('_upload_streams', ()):
+            stream.close()
+
+
+class ResumableUploads:
+    """
+    Uploads sent as a series of chunks across several requests.
+
+    Each upload is a ``<id>.part`` file that chunks are appended to, next to
+    a ``<id>.json`` file recording its owner, filename and declared size, so
+    every process sharing the folder can serve any chunk. The bytes received
+    so far are the size of the part file. A chunk has to name the offset it
+    starts at, so a client that lost a response can ask for the current
+    offset and resend from there. An interrupted chunk keeps the bytes that
+    arrived. Appends and finalisation of one upload are serialised with a
+    lock on its part file. Uploads not written to within ``ttl`` seconds are
+    removed when a new upload starts.
+
+    Args:
+        directory (str): Folder holding the unfinished uploads.
+        max_bytes (int): Largest accepted upload; None for no limit.
+        ttl (float): Seconds an idle upload is kept.
+    """
+
+    def __init__(self, directory, max_bytes=None, ttl=24 * 3600):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+    def _paths(self, upload_id):
+        if not _UPLOAD_ID.fullmatch(upload_id):
+            return None, None
+        base = os.path.join(self.directory, upload_id)
+        return f"{base}.part", f"{base}.json"
+
+    def _metadata(self, upload_id, user_id):
+        part_path, meta_path = self._paths(upload_id)
+        if part_path is None:
+            return None
+        try:
+            with open(meta_path) as f:
+                metadata = json.load(f)
+        except FileNotFoundError:
+            return None
+        return metadata if metadata['user_id'] == user_id else None
+
+    def create(self, user_id, filename, size=None):
+        """
+        Starts an upload.
+
+        :param user_id: Owner of the upload
+        :param filename: Name of the uploaded file
+        :param size: Total size in bytes, if known; finalize checks it
+        :return: Dictionary describing the upload
+        """
+        if size is not None and self.max_bytes is not None and size > self.max_bytes:
+            raise RequestEntityTooLarge(f"Uploads are limited to {self.max_bytes} bytes")
+        self.purge_stale()
+        upload_id = uuid.uuid4().hex
+        part_path, meta_path = self._paths(upload_id)
+        metadata = {'id': upload_id, 'user_id': user_id, 'filename': filename, 'size': size}
+        open(part_path, 'wb').close()
+        tmp_path = f"{meta_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(metadata, f)
+        os.replace(tmp_path, meta_path)
+        return dict(metadata, offset=0)
+
+    def status(self, upload_id, user_id):
+        """
+        Describes an unfinished upload of a user.
+
+        :return: Dictionary with the upload's offset, or None if there is no such upload
+        """
+        metadata = self._metadata(upload_id, user_id)
+        if metadata is None:
+            return None
+        part_path, _ = self._paths(upload_id)
+        return dict(metadata, offset=os.path.getsize(part_path))
+
+    def append(self, upload_id, user_id, offset, stream, chunk_size=HASH_CHUNK_SIZE):
+        """
+        Appends a chunk read from a stream in blocks of ``chunk_size`` bytes.
+
+        :param upload_id: Upload to append to
+        :param user_id: Owner of the upload
+        :param offset: Position the chunk starts at
+        :param stream: Readable binary stream (e.g. ``request.stream``)
+        :param chunk_size: Number of bytes read and written per block
+        :return: The new offset, or None if there is no such upload
+        :raises UploadOffsetMismatch: If offset is not the current end of the upload
+        :raises RequestEntityTooLarge: If the chunk passes the size limit; nothing is kept
+        """
+        part_path, _ = self._paths(upload_id)
+        if part_path is None:
+            return None
+        try:
+            out = open(part_path, 'r+b')
+        except FileNotFoundError:
+            return None
+        with out:
+            fcntl.flock(out, fcntl.LOCK_EX)
+            # Checked under the lock: a finalised upload has no metadata left
+            metadata = self._metadata(upload_id, user_id)
+            if metadata is None:
+                return None
+            current = out.seek(0, os.SEEK_END)
+            if offset != current:
+                raise UploadOffsetMismatch(current)
+            limits = [limit for limit in (metadata['size'], self.max_bytes) if limit is not None]
+            limit = min(limits) if limits else None
+            while True:
+                block = stream.read(chunk_size)
+                if not block:
+                    break
+                if limit is not None and current + len(block) > limit:
+                    out.truncate(offset)
+                    raise RequestEntityTooLarge(f"Upload is limited to {limit} bytes")
+                out.write(block)
+                current += len(block)
+        return current
+
+    def finalize(self, upload_id, user_id, directory, chunk_size=HASH_CHUNK_SIZE):
+        """
+        Completes an upload: hashes it and moves it to ``<hash>.pdf`` in a
+        directory, where identical uploads share one file.
+
+        :param upload_id: Upload to finish
+        :param user_id: Owner of the upload
+        :param directory: Destination folder
+        :param chunk_size: Number of bytes read per block while hashing
+        :return: Tuple of (SHA-256 hex digest, final path), or None if there is no such upload
+        :raises ValueError: If fewer bytes arrived than the declared size
+        """
+        part_path, meta_path = self._paths(upload_id)
+        if part_path is None:
+            return None
+        try:
+            part = open(part_path, 'rb')
+        except FileNotFoundError:
+            return None
+        with part:
+            fcntl.flock(part, fcntl.LOCK_EX)
+            metadata = self._metadata(upload_id, user_id)
+            if metadata is None:
+                return None
+            size = os.fstat(part.fileno()).st_size
+            if metadata['size'] is not None and size != metadata['size']:
+                raise ValueError(f"Upload has {size} of {metadata['size']} bytes")
+            # Chunks may come from different processes, so the digest is computed here in one pass
+            digest = hashlib.sha256()
+            for block in iter(lambda: part.read(chunk_size), b''):
+                digest.update(block)
+            content_hash = digest.hexdigest()
+            file_path = os.path.join(directory, f"{content_hash}.pdf")
+            os.replace(part_path, file_path)
+            os.remove(meta_path)
+        return content_hash, file_path
+
+    def discard(self, upload_id, user_id):
+        """
+        Deletes an unfinished upload.
+
+        :return: True if the upload existed
+        """
+        if self._metadata(upload_id, user_id) is None:
+            return False
+        for path in self._paths(upload_id):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        return True
+
+    def purge_stale(self):
+        """Removes uploads whose part file has not been written to within the TTL."""
+        cutoff = time.time() - self.ttl
+        for name in os.listdir(self.directory):
+            upload_id, ext = os.path.splitext(name)
+            if ext != '.json':
+                continue
+            part_path, meta_path = self._paths(upload_id)
+            try:
+                if part_path is None or os.path.getmtime(part_path) >= cutoff:
+                    continue
+                os.remove(part_path)
+            except FileNotFoundError:
+                pass
+            try:
+                os.remove(meta_path)
+            except FileNotFoundError:
+                pass
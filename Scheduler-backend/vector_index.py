@@ -0,0 +1,451 @@
+import fcntl
+import os
+import re
+import threading
+
+import numpy as np
+
+# Rows scored per matrix product when assigning vectors to lists
+_ASSIGN_CHUNK = 65536
+
+
+def normalize(vectors):
+    """Scales rows to unit length (zero rows are left as they are)."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def kmeans(vectors, k, iterations=10, seed=0):
+    """
+    Spherical k-means: centroids that maximise the cosine similarity of each
+    vector to its nearest centroid.
+
+    :param vectors: float32 array of unit-length rows
+    :param k: Number of centroids
+    :param iterations: Lloyd iterations
+    :param seed: Seed for the initial centroids
+    :return: float32 array of k unit-length centroids
+    """
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), size=k, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        # Per-cluster sums of the vectors, over runs of a sort by cluster
+        order = np.argsort(assignment, kind='stable')
+        clusters, starts = np.unique(assignment[order], return_index=True)
+        sums = vectors[rng.choice(len(vectors), size=k)]
+        # Empty clusters keep the random vectors above, which restarts them
+        sums[clusters] = np.add.reduceat(vectors[order], starts, axis=0)
+        centroids = normalize(sums)
+    return centroids
+
+
+class IVFIndex:
+    """
+    Inverted-file index for cosine-similarity search over float16 vectors.
+
+    Vectors are stored unit-length as float16 in one growing array (half the
+    memory of float32), next to their card id and owner. Once ``min_train``
+    vectors have been added, k-means splits the space into ``nlist`` cells,
+    and each vector belongs to the cell with the nearest centroid. A query
+    only scores the vectors of its ``nprobe`` nearest cells, so its cost
+    grows with nprobe / nlist of the index rather than its whole size. Below
+    ``min_train`` vectors every query is an exact scan. Cells are retrained
+    when the index has grown four-fold since the last training.
+
+    Searches restricted to one owner scan that owner's vectors exactly when
+    there are at most ``exact_limit`` of them, which is both exact and
+    faster than probing cells shared with every other owner.
+
+    Removed vectors are only marked (id and owner -1) and skipped by
+    searches; the arrays are compacted once more than half of the stored
+    vectors are removed ones.
+
+    Args:
+        dim (int): Vector dimension; taken from the first vectors added if None.
+        nlist (int): Number of cells; defaults to sqrt(size) at training time.
+        nprobe (int): Cells scanned per query.
+        min_train (int): Vectors needed before the cells are trained.
+        exact_limit (int): Largest per-owner set scanned exactly.
+    """
+
+    def __init__(self, dim=None, nlist=None, nprobe=16, min_train=10000, exact_limit=20000):
+        self.dim = dim
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_train = min_train
+        self.exact_limit = exact_limit
+        self.size = 0
+        self.removed = 0
+        self.trained_size = 0
+        self.centroids = None
+        self._vectors = np.empty((0, dim or 0), dtype=np.float16)
+        self._ids = np.empty(0, dtype=np.int64)
+        self._owners = np.empty(0, dtype=np.int64)
+        self._lists = np.empty(0, dtype=np.int32)
+        self._groups = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return self.size - self.removed
+
+    def _grow(self, extra):
+        # Capacity doubles so appending one subject at a time stays amortised O(1) per vector
+        capacity = len(self._ids)
+        if self.size + extra <= capacity:
+            return
+        capacity = max(self.size + extra, 2 * capacity, 1024)
+        for name, dtype, shape in (('_vectors', np.float16, (capacity, self.dim)), ('_ids', np.int64, capacity),
+                                   ('_owners', np.int64, capacity), ('_lists', np.int32, capacity)):
+            grown = np.empty(shape, dtype=dtype)
+            grown[:self.size] = getattr(self, name)[:self.size]
+            setattr(self, name, grown)
+
+    def _assign(self, vectors):
+        assignment = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), _ASSIGN_CHUNK):
+            chunk = vectors[start:start + _ASSIGN_CHUNK].astype(np.float32)
+            assignment[start:start + _ASSIGN_CHUNK] = np.argmax(chunk @ self.centroids.T, axis=1)
+        return assignment
+
+    def train(self, sample_size=None, seed=0):
+        """
+        Trains the cells on (a sample of) the stored vectors and reassigns
+        every vector to its nearest cell.
+
+        :param sample_size: Vectors used for k-means; defaults to 32 per cell
+        :param seed: Seed for sampling and initialisation
+        """
+        with self._lock:
+            live = np.flatnonzero(self._ids[:self.size] >= 0)
+            nlist = self.nlist or max(1, int(np.sqrt(len(live))))
+            nlist = min(nlist, len(live))
+            sample_size = min(len(live), sample_size or 32 * nlist)
+            rng = np.random.default_rng(seed)
+            sample = self._vectors[rng.choice(live, size=sample_size, replace=False)].astype(np.float32)
+            self.centroids = kmeans(sample, nlist, seed=seed)
+            self._lists[:self.size] = self._assign(self._vectors[:self.size])
+            self.trained_size = len(live)
+            self._groups = {}
+
+    def add(self, ids, owners, vectors):
+        """
+        Adds vectors for new ids. Ids already in the index get the new vector
+        and owner instead.
+
+        :param ids: Sequence of integer ids (e.g. Flashcard ids)
+        :param owners: Sequence of owner ids (e.g. user ids), one per vector
+        :param vectors: Array of shape (len(ids), dim); normalised on the way in
+        """
+        vectors = normalize(vectors).astype(np.float16)
+        ids = np.asarray(ids, dtype=np.int64)
+        owners = np.asarray(owners, dtype=np.int64)
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                self._vectors = np.empty((0, self.dim), dtype=np.float16)
+            if vectors.shape[1] != self.dim:
+                raise ValueError(f"Expected vectors of dimension {self.dim}, got {vectors.shape[1]}")
+
+            positions = self._positions(ids)
+            existing = positions >= 0
+            if existing.any():
+                updated = positions[existing]
+                self._vectors[updated] = vectors[existing]
+                self._owners[updated] = owners[existing]
+                if self.centroids is not None:
+                    self._lists[updated] = self._assign(vectors[existing])
+                self._groups = {}
+            ids, owners, vectors = ids[~existing], owners[~existing], vectors[~existing]
+
+            self._grow(len(ids))
+            start, end = self.size, self.size + len(ids)
+            self._vectors[start:end] = vectors
+            self._ids[start:end] = ids
+            self._owners[start:end] = owners
+            self._lists[start:end] = self._assign(vectors) if self.centroids is not None else 0
+            self.size = end
+            self._groups = {}
+
+            if len(self) >= self.min_train and (self.centroids is None or len(self) >= 4 * self.trained_size):
+                self.train()
+
+    def remove(self, ids):
+        """
+        Removes the vectors of ids from the index; ids not in it are ignored.
+
+        :param ids: Sequence of integer ids
+        :return: Number of vectors removed
+        """
+        with self._lock:
+            positions = self._positions(np.asarray(ids, dtype=np.int64))
+            positions = np.unique(positions[positions >= 0])
+            if not len(positions):
+                return 0
+            self._ids[positions] = -1
+            self._owners[positions] = -1
+            self.removed += len(positions)
+            self._groups = {}
+            if self.removed > self.size // 2:
+                self._compact()
+            return len(positions)
+
+    def _compact(self):
+        # Moves the live vectors to the front of the arrays, dropping the removed ones
+        live = np.flatnonzero(self._ids[:self.size] >= 0)
+        for name in ('_vectors', '_ids', '_owners', '_lists'):
+            array = getattr(self, name)
+            array[:len(live)] = array[live]
+        self.size = len(live)
+        self.removed = 0
+        self._groups = {}
+
+    def _positions(self, ids):
+        # Storage positions of ids (-1 where absent), through an id sort built on first use after a change
+        if not self.size:
+            return np.full(len(ids), -1, dtype=np.int64)
+        if 'ids' not in self._groups:
+            order = np.argsort(self._ids[:self.size], kind='stable')
+            self._groups['ids'] = order, self._ids[:self.size][order]
+        order, sorted_ids = self._groups['ids']
+        found = np.minimum(np.searchsorted(sorted_ids, ids), self.size - 1)
+        return np.where(sorted_ids[found] == ids, order[found], -1)
+
+    def get(self, id_):
+        """Returns the stored (unit-length) vector of an id, or None."""
+        with self._lock:
+            position = self._positions(np.array([id_], dtype=np.int64))[0]
+            return None if position < 0 else self._vectors[position].astype(np.float32)
+
+    def _members(self, key, values):
+        # Positions grouped by a key array (cell or owner), built on first use after a change
+        groups = self._groups.get(key)
+        if groups is None:
+            order = np.argsort(values[:self.size], kind='stable')
+            keys, starts = np.unique(values[:self.size][order], return_index=True)
+            ends = np.append(starts[1:], len(order))
+            groups = {int(k): order[s:e] for k, s, e in zip(keys, starts, ends)}
+            self._groups[key] = groups
+        return groups
+
+    def search(self, vector, k=10, owner=None, nprobe=None, exclude=()):
+        """
+        Finds the stored vectors most similar to a query vector.
+
+        :param vector: Query vector
+        :param k: Number of results
+        :param owner: Only return vectors of this owner
+        :param nprobe: Cells to scan; defaults to the index's nprobe
+        :param exclude: Ids left out of the results (e.g. the query card)
+        :return: List of (id, cosine similarity) pairs, most similar first
+        """
+        query = normalize(np.asarray(vector, dtype=np.float32)[None])[0]
+        exclude = set(int(id_) for id_ in exclude)
+        with self._lock:
+            if not self.size:
+                return []
+            if owner is not None:
+                candidates = self._members('owners', self._owners).get(int(owner))
+                if candidates is None:
+                    return []
+            else:
+                candidates = None
+            if self.centroids is not None and (candidates is None or len(candidates) > self.exact_limit):
+                cells = np.argsort(self.centroids @ query)[::-1][:nprobe or self.nprobe]
+                lists = self._members('lists', self._lists)
+                probed = np.concatenate([lists.get(int(cell), np.empty(0, dtype=np.int64)) for cell in cells])
+                if candidates is not None:
+                    probed = probed[self._owners[probed] == owner]
+                candidates = probed
+            elif candidates is None:
+                candidates = np.arange(self.size)
+            if self.removed and owner is None:
+                # Removed vectors have owner -1, so only unrestricted searches can reach them
+                candidates = candidates[self._ids[candidates] >= 0]
+
+            scores = self._vectors[candidates].astype(np.float32) @ query
+            wanted = min(len(candidates), k + len(exclude))
+            top = np.argpartition(-scores, wanted - 1)[:wanted] if wanted else np.empty(0, dtype=np.int64)
+            top = top[np.argsort(-scores[top])]
+            ids = self._ids[candidates[top]].tolist()
+        results = [(id_, float(score)) for id_, score in zip(ids, scores[top]) if id_ not in exclude]
+        return results[:k]
+
+    def save(self, path):
+        """Writes the index to an .npz file, atomically replacing any previous one."""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f"{path}.tmp.npz"
+        with self._lock:
+            if self.removed:
+                self._compact()
+            np.savez(
+                tmp_path,
+                vectors=self._vectors[:self.size], ids=self._ids[:self.size], owners=self._owners[:self.size],
+                lists=self._lists[:self.size],
+                centroids=self.centroids if self.centroids is not None else np.empty((0, self.dim or 0)),
+                config=np.array([self.dim or 0, self.nlist or 0, self.nprobe, self.min_train, self.exact_limit,
+                                 self.trained_size]),
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Reads an index written by ``save``."""
+        with np.load(path) as data:
+            dim, nlist, nprobe, min_train, exact_limit, trained_size = data['config'].tolist()
+            index = cls(dim or None, nlist or None, nprobe, min_train, exact_limit)
+            index.size = len(data['ids'])
+            index.trained_size = trained_size
+            index._vectors = data['vectors']
+            index._ids = data['ids']
+            index._owners = data['owners']
+            index._lists = data['lists']
+            if len(data['centroids']):
+                index.centroids = data['centroids'].astype(np.float32)
+        return index
+
+
+class ShardedVectorStore:
+    """
+    Vectors kept on disk in one shard file per group (e.g. per subject),
+    with an IVFIndex over all of them in memory.
+
+    Writing a group replaces its whole shard, so vectors of ids the group no
+    longer has disappear with it, and appends the group to a change log.
+    Every process keeps its own index and applies the log entries it has not
+    seen yet, re-reading only the shards of the groups they name; checking
+    for changes costs one stat of the log. Shards are replaced atomically
+    and logged afterwards, so readers never see a half-written shard, and
+    concurrent writers of the same group leave the shard of the last one.
+
+    Once the log has grown past ``COMPACT_AFTER_BYTES`` and to twice its size
+    after the last compaction, the writer replaces it with one line per
+    existing shard. Processes notice the new log by its inode and rebuild
+    their index from it, so the log, and the work of a process starting up,
+    stays proportional to the number of groups rather than of writes.
+
+    Args:
+        directory (str): Directory of the shards and the change log.
+        index_factory (callable): Returns the empty IVFIndex to fill.
+    """
+
+    # Vectors added to the index at once when applying many changed shards
+    LOAD_BATCH = 65536
+    # Log size before it is considered for compaction
+    COMPACT_AFTER_BYTES = 1024 * 1024
+
+    _SHARD_NAME = re.compile(r'^(\d+)\.npz$')
+
+    def __init__(self, directory, index_factory=IVFIndex):
+        self.directory = directory
+        self._index_factory = index_factory
+        self.index = index_factory()
+        self._log_path = os.path.join(directory, 'changes.log')
+        # Serialises appends with compaction across processes, so no append lands in a replaced log
+        self._log_lock_path = os.path.join(directory, 'changes.lock')
+        self._group_ids = {}
+        self._offset = 0
+        self._log_inode = None
+        self._compacted_size = 0
+        self._lock = threading.Lock()
+
+    def _shard_path(self, group):
+        return os.path.join(self.directory, f"{int(group)}.npz")
+
+    def refresh(self):
+        """
+        Applies the changes written (by any process) since the last refresh.
+
+        :return: The up-to-date IVFIndex
+        """
+        try:
+            stat = os.stat(self._log_path)
+        except FileNotFoundError:
+            return self.index
+        with self._lock:
+            if stat.st_ino == self._log_inode and stat.st_size <= self._offset:
+                return self.index
+            try:
+                log = open(self._log_path, 'rb')
+            except FileNotFoundError:
+                return self.index
+            with log:
+                stat = os.fstat(log.fileno())
+                if stat.st_ino != self._log_inode:
+                    # A new (compacted) log lists every shard; rebuild from it
+                    self.index = self._index_factory()
+                    self._group_ids = {}
+                    self._offset = 0
+                    self._log_inode = stat.st_ino
+                    self._compacted_size = stat.st_size
+                log.seek(self._offset)
+                changes = log.read(stat.st_size - self._offset)
+            # A line still being appended is applied by the next refresh
+            changes = changes[:changes.rfind(b'\n') + 1]
+            self._offset += len(changes)
+            groups = {int(group) for group in changes.split()}
+
+            stale = [self._group_ids.pop(group) for group in groups if group in self._group_ids]
+            if stale:
+                self.index.remove(np.concatenate(stale))
+            batch, batched = [], 0
+            for group in groups:
+                try:
+                    with np.load(self._shard_path(group)) as shard:
+                        ids, owners, vectors = shard['ids'], shard['owners'], shard['vectors']
+                except FileNotFoundError:
+                    continue
+                self._group_ids[group] = ids
+                batch.append((ids, owners, vectors))
+                batched += len(ids)
+                if batched >= self.LOAD_BATCH:
+                    self._add(batch)
+                    batch, batched = [], 0
+            self._add(batch)
+        return self.index
+
+    def _add(self, batch):
+        if batch:
+            ids, owners, vectors = zip(*batch)
+            self.index.add(np.concatenate(ids), np.concatenate(owners), np.concatenate(vectors))
+
+    def replace(self, group, ids, owners, vectors):
+        """
+        Replaces all of a group's vectors; with no ids, removes the group.
+
+        :param group: Integer group id (e.g. a subject id)
+        :param ids: Sequence of integer ids
+        :param owners: Sequence of owner ids, one per vector
+        :param vectors: Array of shape (len(ids), dim)
+        :return: The up-to-date IVFIndex
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._shard_path(group)
+        if len(ids):
+            tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+            np.savez(tmp_path, ids=np.asarray(ids, dtype=np.int64), owners=np.asarray(owners, dtype=np.int64),
+                     vectors=np.asarray(vectors, dtype=np.float16))
+            os.replace(tmp_path, path)
+        else:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        with open(self._log_lock_path, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            with open(self._log_path, 'a') as log:
+                log.write(f"{int(group)}\n")
+                size = log.tell()
+            if size > self.COMPACT_AFTER_BYTES and size > 2 * self._compacted_size:
+                self._compact()
+        return self.refresh()
+
+    def _compact(self):
+        # Called with the log lock held, so no append is lost between listing and replacing
+        groups = sorted(int(match.group(1)) for match in map(self._SHARD_NAME.match, os.listdir(self.directory))
+                        if match)
+        tmp_path = f"{self._log_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as log:
+            log.writelines(f"{group}\n" for group in groups)
+        os.replace(tmp_path, self._log_path)
@@ -0,0 +1,94 @@
+"""
+Production entry point for the API, served by gunicorn:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+With ``preload_app`` (see gunicorn.conf.py) this module is imported once in
+the gunicorn master, before the workers are forked. The models named in
+PRELOAD_MODELS (comma-separated registry names; when unset, every model
+the app registers and uses; none when empty) are loaded here so that the
+workers, and the job processes they fork, share their memory
+copy-on-write instead of each loading a copy.
+"""
+import fcntl
+import gc
+import logging
+import os
+import threading
+import time
+
+from app import app, db, job_queue
+from card_embeddings import EMBEDDER_NAME
+from model_registry import registry
+
+logger = logging.getLogger(__name__)
+
+# Held by the one worker that runs background jobs; released by the OS when it exits
+JOB_LOCK_FILE = os.environ.get('JOB_LOCK_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'jobs.lock'))
+JOB_LOCK_RETRY_SECONDS = 5
+
+
+def preload_models():
+    """Loads the models named in PRELOAD_MODELS, waiting for them to finish."""
+    names = os.environ.get('PRELOAD_MODELS')
+    if names is None:
+        # Every registered model, except the embedder when cards are not embedded
+        names = tuple(name for name in registry.stats()
+                      if name != EMBEDDER_NAME or app.config['CARD_EMBEDDINGS'])
+    else:
+        names = tuple(name.strip() for name in names.split(',') if name.strip())
+    if not names:
+        return
+    registry.warm_up(*names).join()
+    loaded = [name for name, stats in registry.stats().items() if stats['loaded']]
+    logger.info(f"Preloaded models: {', '.join(loaded) or 'none'}")
+
+
+def reset_after_fork():
+    """
+    Drops the database connections a worker inherited from the master.
+
+    A connection shared by two processes corrupts both sides' protocol
+    state, so each worker starts with an empty pool (the master's
+    connections are left for the master to close).
+    """
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+
+def start_job_dispatcher():
+    """
+    Runs the job dispatcher in this worker if no other worker runs one.
+
+    Workers compete for an exclusive lock on JOB_LOCK_FILE. The holder starts
+    its dispatcher, so queued jobs (including ones left from before a
+    restart) run without waiting for a request; the others only queue jobs
+    and keep retrying the lock in the background, so one of them takes over
+    when the holder exits.
+    """
+    if not app.config['JOB_AUTOSTART']:
+        return
+    # Until it holds the lock this worker leaves its jobs to the one that does
+    app.config['JOB_AUTOSTART'] = False
+    lock_file = open(JOB_LOCK_FILE, 'a')
+
+    def acquire():
+        while True:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                time.sleep(JOB_LOCK_RETRY_SECONDS)
+                continue
+            app.config['JOB_AUTOSTART'] = True
+            job_queue.start()
+            logger.info(f"Worker {os.getpid()} runs the background jobs")
+            return
+
+    threading.Thread(target=acquire, name='job-lock', daemon=True).start()
+
+
+preload_models()
+
+# Objects that exist now are never collected; without this the garbage collector
+# writes to their headers in every worker and the shared pages get copied anyway
+gc.freeze()